@@ -0,0 +1,66 @@
+"""Aho-Corasick automaton for finding many patterns in one pass over a text.
+
+Building takes time linear in the total length of the patterns; a search
+then visits each character of the text once (plus amortized failure
+transitions) however many patterns there are.  Transitions live in one dict
+keyed by ``node << 21 | code point`` rather than a dict per node, which
+takes about half the memory.
+"""
+from collections import deque
+
+_SHIFT = 21  # code points are below 2 ** 21
+
+class AhoCorasick:
+    def __init__(self, patterns):
+        """``patterns`` is an iterable of ``(string, value)`` pairs"""
+        goto = {}
+        children = [[]]
+        out = [()]
+        self.size = 0
+
+        for pattern, value in patterns:
+            if not pattern:
+                continue
+            node = 0
+            for char in pattern:
+                key = node << _SHIFT | ord(char)
+                child = goto.get(key)
+                if child is None:
+                    child = goto[key] = len(out)
+                    children[node].append((ord(char), child))
+                    children.append([])
+                    out.append(())
+                node = child
+            out[node] += ((len(pattern), value),)
+            self.size += 1
+
+        # Breadth first, so a node's failure target is complete before the node
+        fail = [0] * len(out)
+        queue = deque(child for _, child in children[0])
+        while queue:
+            node = queue.popleft()
+            for code, child in children[node]:
+                queue.append(child)
+                target = fail[node]
+                while target and (target << _SHIFT | code) not in goto:
+                    target = fail[target]
+                target = goto.get(target << _SHIFT | code, 0)
+                fail[child] = target
+                if out[target]:
+                    out[child] += out[target]
+
+        self._goto = goto
+        self._fail = fail
+        self._out = out
+
+    def finditer(self, text):
+        """Yield ``(start, end, value)`` for every pattern occurrence in ``text``"""
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for index, char in enumerate(text):
+            code = ord(char)
+            while node and (node << _SHIFT | code) not in goto:
+                node = fail[node]
+            node = goto.get(node << _SHIFT | code, 0)
+            for length, value in out[node]:
+                yield index + 1 - length, index + 1, value
@@ -0,0 +1,134 @@
+"""Minimal asyncio IMAP client for watching mailboxes with IDLE.
+
+Only what a watcher needs is implemented: login, SELECT and IDLE (RFC 2177).
+Message fetching stays in EmailMonitor; this client just tells the caller
+when a mailbox changed, so a single event loop can hold one idle connection
+for each of many mailboxes.
+"""
+import re
+import ssl
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+IMAP_SSL_PORT = 993
+
+# Servers drop IDLE after 30 minutes; RFC 2177 asks clients to re-issue it sooner
+IDLE_TIMEOUT = 25 * 60
+
+_LITERAL = re.compile(rb'\{(\d+)\}\r\n$')
+_EXISTS = re.compile(rb'^\* \d+ EXISTS', re.IGNORECASE)
+
+class IMAPError(Exception):
+    pass
+
+def _quote(value):
+    return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+class AsyncIMAPClient:
+    def __init__(self, host, port=IMAP_SSL_PORT, timeout=30):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.capabilities = set()
+        self._reader = None
+        self._writer = None
+        self._tag = 0
+
+    async def connect(self):
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, ssl=ssl.create_default_context()),
+            self.timeout
+        )
+        greeting = await self._readline()
+        if not greeting.startswith(b'* OK'):
+            raise IMAPError(f"Unexpected greeting: {greeting!r}")
+
+    async def _readline(self, timeout=None):
+        line = await asyncio.wait_for(self._reader.readline(), timeout or self.timeout)
+        if not line:
+            raise ConnectionError("IMAP server closed the connection")
+        # Literals are read along with their line; watchers never need them
+        literal = _LITERAL.search(line)
+        while literal:
+            line += await asyncio.wait_for(self._reader.readexactly(int(literal.group(1))), self.timeout)
+            rest = await asyncio.wait_for(self._reader.readline(), self.timeout)
+            line += rest
+            literal = _LITERAL.search(rest)
+        return line
+
+    async def _send(self, data):
+        self._writer.write(data.encode() + b'\r\n')
+        await self._writer.drain()
+
+    async def command(self, name, *args):
+        """Run a command; returns its untagged response lines"""
+        self._tag += 1
+        tag = f"A{self._tag:04d}".encode()
+        await self._send(' '.join((tag.decode(), name) + args))
+
+        untagged = []
+        while True:
+            line = await self._readline()
+            if line.startswith(tag + b' '):
+                status = line[len(tag) + 1:].split(b' ', 1)[0].upper()
+                if status != b'OK':
+                    raise IMAPError(f"{name} failed: {line.decode(errors='replace').strip()}")
+                return untagged
+            untagged.append(line)
+
+    async def login(self, username, password):
+        await self.command('LOGIN', _quote(username), _quote(password))
+        for line in await self.command('CAPABILITY'):
+            if line.upper().startswith(b'* CAPABILITY '):
+                self.capabilities = set(line[13:].decode().upper().split())
+
+    async def select(self, mailbox='INBOX'):
+        # Read-only: watching must not clear \Recent or other flags
+        await self.command('EXAMINE', _quote(mailbox))
+
+    async def idle(self, timeout=IDLE_TIMEOUT):
+        """Wait in IDLE until new mail arrives or ``timeout`` passes.
+
+        Returns True when the server reported new messages.
+        """
+        self._tag += 1
+        tag = f"A{self._tag:04d}".encode()
+        await self._send(f"{tag.decode()} IDLE")
+        line = await self._readline()
+        if not line.startswith(b'+'):
+            raise IMAPError(f"IDLE rejected: {line.decode(errors='replace').strip()}")
+
+        changed = False
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while not changed:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                line = await self._readline(timeout=remaining)
+            except asyncio.TimeoutError:
+                break
+            changed = bool(_EXISTS.match(line))
+
+        await self._send('DONE')
+        while True:
+            line = await self._readline()
+            if line.startswith(tag + b' '):
+                return changed
+            changed = changed or bool(_EXISTS.match(line))
+
+    async def logout(self):
+        try:
+            await self.command('LOGOUT')
+        except Exception:
+            pass
+        finally:
+            self.close()
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
@@ -1,16 +1,29 @@
 import os
-from flask import Flask, render_template, jsonify, request, redirect, url_for, make_response
-from email_utils import EmailMonitor
-from models.models import db, Email, Company, CompanyEmail
-from datetime import datetime
+import click
+from flask import Flask, Response, render_template, jsonify, request, redirect, url_for, make_response
+from company_resolver import COMPANY_VERSION, bump_company_version, company_resolver
+from db_health import DatabaseHealth
+from email_utils import normalize_email_address
+from events import EMAIL_VERSION, EmailEvents
+from http_cache import HttpCache, versioned
+from ingest_queue import requeue_dead_letters
+from pdf_cache import PDF_CACHE_VERSION, pdf_cache_stats
+from search import create_search_index, search_filter
+from single_flight import coalesced
+from stats import IMAP_POOL_VERSION, count_companies, imap_pool_stats, read_stats, recount_stats
+from models.models import db, Email, EmailPdfAddress, Company, CompanyEmail, MailboxAccount, MailboxSyncState, TableVersion
+from datetime import datetime, timedelta
 import json
-from sqlalchemy.sql import text
-from sqlalchemy.exc import OperationalError, SQLAlchemyError
+import re
 import time
+import base64
+from sqlalchemy.sql import text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy.orm.attributes import flag_modified
+from sqlalchemy import and_, or_, func
 import logging
 import pytz
-from sqlalchemy.orm import scoped_session, sessionmaker
-from sqlalchemy import create_engine
 from functools import wraps
 import sys
 from flask_migrate import Migrate
@@ -54,128 +67,110 @@ app.config['SQLALCHEMY_DATABASE_URI'] = database_url
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
     'pool_pre_ping': True,
-    'pool_recycle': 280,
-    'pool_size': int(os.environ.get('SQLALCHEMY_POOL_SIZE', '5')),
-    'max_overflow': int(os.environ.get('SQLALCHEMY_MAX_OVERFLOW', '10')),
-    'pool_timeout': int(os.environ.get('SQLALCHEMY_POOL_TIMEOUT', '30')),
+    'pool_recycle': int(os.environ.get('SQLALCHEMY_POOL_RECYCLE', '280')),
 }
-
-# Initialize Flask-SQLAlchemy
+if not database_url.startswith('sqlite'):
+    # SQLite uses a pool without size limits
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'].update({
+        'pool_size': int(os.environ.get('SQLALCHEMY_POOL_SIZE', '5')),
+        'max_overflow': int(os.environ.get('SQLALCHEMY_MAX_OVERFLOW', '10')),
+        'pool_timeout': int(os.environ.get('SQLALCHEMY_POOL_TIMEOUT', '30')),
+    })
+
+# Initialize Flask-SQLAlchemy; the engine is created on first use, so
+# importing the app never opens a database connection
 db.init_app(app)
 
 # Initialize Flask-Migrate
 migrate = Migrate(app, db)
 
-# Create engine and session factory with improved error handling
-def create_db_engine():
-    max_retries = 3
-    retry_delay = 1
-    last_error = None
-
-    for attempt in range(max_retries):
-        try:
-            engine = create_engine(
-                database_url,
-                **app.config['SQLALCHEMY_ENGINE_OPTIONS']
-            )
-            # Test connection
-            with engine.connect() as conn:
-                conn.execute(text('SELECT 1'))
-            return engine
-        except Exception as e:
-            last_error = str(e)
-            logger.error(f"Failed to create engine (attempt {attempt + 1}): {str(e)}")
-            if attempt < max_retries - 1:
-                time.sleep(retry_delay * (attempt + 1))
-                continue
-            raise OperationalError("Failed to create database engine", last_error)
-
-engine = create_db_engine()
-Session = scoped_session(sessionmaker(bind=engine))
-
-# Initialize email monitor with improved error handling
-def initialize_email_monitor():
-    required_env_vars = ['EMAIL_USERNAME', 'EMAIL_PASSWORD', 'EMAIL_SERVER']
-    missing_vars = [var for var in required_env_vars if not os.environ.get(var)]
-    
-    if missing_vars:
-        error_msg = f"Missing required environment variables: {', '.join(missing_vars)}"
-        logger.error(error_msg)
-        raise ValueError(error_msg)
-    
-    try:
-        monitor = EmailMonitor(
-            username=os.environ.get('EMAIL_USERNAME'),
-            password=os.environ.get('EMAIL_PASSWORD'),
-            server=os.environ.get('EMAIL_SERVER')
-        )
-        # Test connection
-        success, message = monitor.test_connection()
-        if not success:
-            raise Exception(f"Email connection test failed: {message}")
-        return monitor
-    except Exception as e:
-        logger.error(f"Failed to initialize email monitor: {str(e)}")
-        raise
-
-email_monitor = initialize_email_monitor()
+# Opt-in connection health checks: per-request round-trip counts and a
+# circuit breaker that fails fast with 503 while the database is down
+if os.environ.get('DB_HEALTH_CHECKS', '').lower() in ('1', 'true', 'yes'):
+    DatabaseHealth(
+        app,
+        failure_threshold=int(os.environ.get('DB_BREAKER_THRESHOLD', '3')),
+        reset_timeout=int(os.environ.get('DB_BREAKER_RESET_TIMEOUT', '30'))
+    )
+
+# Conditional GETs for versioned routes, compression of large JSON bodies
+HttpCache(app)
+
+# New-mail notifications for /api/events
+email_events = EmailEvents(app, db, poll_interval=float(os.environ.get('EVENTS_POLL_INTERVAL', '1')))
+
+# /api/events holds a worker thread per open tab, so it is enabled only where
+# the server has threads to spare (the gthread workers of the Procfile).  Sync
+# WSGI deployments leave it off and the dashboard polls /api/events/version.
+EVENTS_STREAM = os.environ.get('EVENTS_STREAM', '0').lower() in ('1', 'true', 'yes')
+# Seconds between version checks of dashboards without the stream
+EVENTS_CLIENT_POLL_INTERVAL = int(os.environ.get('EVENTS_CLIENT_POLL_INTERVAL', '30'))
+
+# Streams end after this many seconds; EventSource reconnects on its own
+EVENTS_STREAM_TTL = int(os.environ.get('EVENTS_STREAM_TTL', '300'))
+EVENTS_KEEPALIVE = 15
+
+# Concurrent /check-latest calls share one state lookup for this many seconds
+CHECK_LATEST_WINDOW = 2.0
+
+@app.cli.command('init-db')
+def init_db_command():
+    """Create missing database tables."""
+    db.create_all()
+    with db.engine.begin() as connection:
+        create_search_index(connection)
+    logger.info("Database tables created")
+
+@app.cli.command('recount-stats')
+def recount_stats_command():
+    """Rebuild the /api/stats counters from the tables."""
+    counts = recount_stats(db.session)
+    db.session.commit()
+    logger.info(f"Stats counters reset: {counts}")
+
+@app.cli.command('requeue-dead-letters')
+@click.option('--mailbox', default=None, help="Only requeue messages of this sync key, e.g. INBOX")
+def requeue_dead_letters_command(mailbox):
+    """Put messages that failed ingestion back on the queue."""
+    count = requeue_dead_letters(db.session, mailbox)
+    db.session.commit()
+    logger.info(f"Requeued {count} dead letter(s)")
+
+@app.cli.command('add-mailbox')
+@click.argument('name')
+@click.option('--server', required=True, help="IMAP server address")
+@click.option('--username', required=True, help="IMAP login")
+@click.option('--password', prompt=True, hide_input=True, help="IMAP password")
+@click.option('--mailbox', default='INBOX', show_default=True, help="Mailbox to watch")
+def add_mailbox_command(name, server, username, password, mailbox):
+    """Register a mailbox for mailbox_hub.py."""
+    account = MailboxAccount.query.filter_by(name=name).first() or MailboxAccount(name=name)
+    account.server = server
+    account.username = username
+    account.password = password
+    account.mailbox = mailbox
+    account.enabled = True
+    db.session.add(account)
+    db.session.commit()
+    logger.info(f"Mailbox {account.sync_key} registered")
+
+@app.cli.command('reencrypt-mailboxes')
+def reencrypt_mailboxes_command():
+    """Re-encrypt mailbox passwords with the first MAILBOX_ENCRYPTION_KEY."""
+    accounts = MailboxAccount.query.all()
+    for account in accounts:
+        # Written back even though unchanged, so it is encrypted with the current key
+        flag_modified(account, 'password')
+    db.session.commit()
+    logger.info(f"Re-encrypted the passwords of {len(accounts)} mailbox(es)")
 
 def get_db():
-    """Get database session with improved connection handling"""
-    max_retries = 3
-    retry_delay = 1
-    last_error = None
-    session = None
-    
-    for attempt in range(max_retries):
-        try:
-            session = Session()
-            # Test connection
-            session.execute(text('SELECT 1'))
-            return session
-        except Exception as e:
-            last_error = str(e)
-            logger.error(f"Database connection error (attempt {attempt + 1}): {str(e)}")
-            if session:
-                try:
-                    session.close()
-                except:
-                    pass
-            if attempt < max_retries - 1:
-                time.sleep(retry_delay * (attempt + 1))
-                try:
-                    Session.remove()
-                except:
-                    pass
-                continue
-            raise OperationalError("Failed to connect to database after multiple attempts", last_error)
-
-@app.before_request
-def before_request():
-    """Ensure database connection before each request"""
-    try:
-        session = get_db()
-        if session:
-            session.close()
-    except Exception as e:
-        logger.error(f"Database connection error: {str(e)}")
-        if request.path.startswith('/api/'):
-            response = jsonify({
-                'success': False,
-                'error': 'Database connection error',
-                'message': 'Unable to connect to database. Please try again later.'
-            })
-            response.headers['Content-Type'] = 'application/json'
-            return response, 503
-        return "Database connection error. Please try again later.", 503
+    """Get the request's database session.
 
-@app.teardown_appcontext
-def shutdown_session(exception=None):
-    """Properly cleanup database session"""
-    try:
-        Session.remove()
-    except Exception as e:
-        logger.error(f"Error during session cleanup: {str(e)}")
+    Stale pooled connections are replaced by pool_pre_ping on checkout, so no
+    separate liveness query is issued here.
+    """
+    return db.session
 
 # Security middleware
 def check_auth(username, password):
@@ -199,10 +194,25 @@ def requires_auth(f):
         return f(*args, **kwargs)
     return decorated
 
+@app.route('/health/ready')
+def ready():
+    """Readiness probe: the app is ready once the database answers"""
+    try:
+        db.session.execute(text('SELECT 1'))
+        data = {'success': True, 'status': 'ready'}
+        if 'db_health' in app.extensions:
+            data['database'] = app.extensions['db_health'].stats()
+        return jsonify(data)
+    except Exception as e:
+        logger.error(f"Readiness check failed: {str(e)}")
+        db.session.remove()
+        return jsonify({'success': False, 'status': 'unavailable', 'error': str(e)}), 503
+
 @app.route('/')
 @requires_auth
 def index():
-    return render_template('index.html')
+    return render_template('index.html', events_stream=EVENTS_STREAM,
+                           events_poll_interval=EVENTS_CLIENT_POLL_INTERVAL)
 
 @app.route('/companies')
 @requires_auth
@@ -211,18 +221,21 @@ def companies():
 
 @app.route('/api/companies', methods=['GET'])
 @requires_auth
+@versioned(COMPANY_VERSION)
 def get_companies():
     try:
         session = get_db()
-        companies = session.query(Company).all()
+        # Load all company emails in one extra query instead of one per company
+        companies = session.query(Company).options(selectinload(Company.emails)).all()
         
         company_list = []
         for company in companies:
+            emails = [e.email for e in company.emails]
             company_data = {
                 'id': company.id,
                 'name': company.name,
-                'emails': [e.email for e in company.emails],
-                'email_count': len(company.emails)
+                'emails': emails,
+                'email_count': len(emails)
             }
             company_list.append(company_data)
         
@@ -241,6 +254,51 @@ def get_companies():
         response.headers['Content-Type'] = 'application/json'
         return response, 500
 
+# Rows per batched company email INSERT or DELETE
+COMPANY_EMAIL_BATCH = 500
+
+# An address, or a whole domain written as *@acme.hu or @acme.hu
+COMPANY_ADDRESS_PATTERN = re.compile(r'(?:[a-z0-9._%+-]+|\*)?@[a-z0-9-]+(?:\.[a-z0-9-]+)+')
+
+def normalize_company_emails(emails):
+    """Lower-cased, de-duplicated company addresses in their original order.
+
+    Raises ValueError unless ``emails`` is a list of addresses or domain patterns.
+    """
+    if not isinstance(emails, list):
+        raise ValueError("emails must be a list of addresses")
+    normalized = []
+    for email in emails:
+        address = email.strip().lower() if isinstance(email, str) else None
+        if not address or not COMPANY_ADDRESS_PATTERN.fullmatch(address):
+            raise ValueError(f"Invalid address: {email!r}")
+        normalized.append(address)
+    return list(dict.fromkeys(normalized))
+
+def sync_company_emails(session, company_id, emails):
+    """Make a company's addresses equal ``emails`` by inserting and deleting only the difference.
+
+    Unchanged rows keep their ids and ``created_at``.  Returns the number of
+    rows added and removed; the caller commits.
+    """
+    wanted = normalize_company_emails(emails)
+    existing = dict(session.query(CompanyEmail.email, CompanyEmail.id).filter_by(company_id=company_id))
+    keep = set(wanted)
+    removed = [email_id for email, email_id in existing.items() if email not in keep]
+    added = [email for email in wanted if email not in existing]
+
+    for start in range(0, len(removed), COMPANY_EMAIL_BATCH):
+        session.query(CompanyEmail).filter(
+            CompanyEmail.id.in_(removed[start:start + COMPANY_EMAIL_BATCH])
+        ).delete(synchronize_session=False)
+    now = datetime.utcnow()
+    for start in range(0, len(added), COMPANY_EMAIL_BATCH):
+        session.bulk_insert_mappings(CompanyEmail, [
+            {'company_id': company_id, 'email': email, 'created_at': now}
+            for email in added[start:start + COMPANY_EMAIL_BATCH]
+        ])
+    return len(added), len(removed)
+
 @app.route('/api/companies', methods=['POST'])
 @requires_auth
 def create_company():
@@ -265,16 +323,28 @@ def create_company():
             })
             response.headers['Content-Type'] = 'application/json'
             return response, 400
+
+        try:
+            emails = normalize_company_emails(data.get('emails', []))
+        except ValueError as e:
+            response = jsonify({
+                'success': False,
+                'error': str(e),
+                'message': 'Érvénytelen e-mail cím'
+            })
+            response.headers['Content-Type'] = 'application/json'
+            return response, 400
             
         company = Company(name=data['name'])
         session.add(company)
+        count_companies(session, 1)
         
-        if data.get('emails'):
-            for email in data['emails']:
-                company_email = CompanyEmail(company=company, email=email)
-                session.add(company_email)
+        for email in emails:
+            session.add(CompanyEmail(company=company, email=email))
         
+        bump_company_version(session)
         session.commit()
+        company_resolver.invalidate()
         
         response = jsonify({
             'success': True,
@@ -301,20 +371,15 @@ def create_company():
 
 @app.route('/api/stats')
 @requires_auth
+@versioned(EMAIL_VERSION, COMPANY_VERSION, PDF_CACHE_VERSION, IMAP_POOL_VERSION)
 def get_stats():
     try:
         session = get_db()
-        companies_count = session.query(Company).count()
-        pdf_count = session.query(Email).filter_by(has_pdf=True).count()
-        email_count = session.query(Email).count()
-        
         response = jsonify({
             'success': True,
-            'stats': {
-                'companies': companies_count,
-                'pdfs': pdf_count,
-                'emails': email_count
-            }
+            'stats': read_stats(session),
+            'pdf_cache': pdf_cache_stats(session),
+            'imap_pool': imap_pool_stats(session)
         })
         response.headers['Content-Type'] = 'application/json'
         return response
@@ -338,23 +403,143 @@ def get_stats():
         response.headers['Content-Type'] = 'application/json'
         return response, 500
 
+EMAIL_PAGE_SIZE = 10
+EMAIL_PAGE_SIZE_MAX = 100
+# Filtered totals stop counting here and are reported as a lower bound
+EMAIL_TOTAL_CAP = 1000
+
+def encode_cursor(email):
+    """Encode the (date, id) keyset position of an email as an opaque cursor"""
+    raw = json.dumps([email.date.isoformat(), email.id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    """Decode a cursor from encode_cursor(); raises ValueError if malformed"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        date_str, email_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(date_str), int(email_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def parse_filter_date(value, end_of_day=False):
+    """Convert a Budapest calendar date (YYYY-MM-DD) to the naive UTC datetime
+    it starts at, or that the next day starts at when ``end_of_day`` is set.
+    Raises ValueError if malformed."""
+    if not value:
+        return None
+    day = datetime.fromisoformat(value.strip()).date()
+    if end_of_day:
+        day += timedelta(days=1)
+    start = datetime.combine(day, datetime.min.time())
+    if hasattr(budapest_tz, 'localize'):
+        start = budapest_tz.localize(start)
+    else:
+        start = start.replace(tzinfo=budapest_tz)
+    return start.astimezone(pytz.UTC).replace(tzinfo=None)
+
+def pdf_company_email_ids(session, company_id):
+    """Query of email ids whose PDFs mention one of a company's addresses.
+
+    Wildcard entries (``*@acme.hu``) match PDF addresses on that domain.
+    """
+    addresses = [normalize_email_address(e.email) for e in
+                 session.query(CompanyEmail).filter_by(company_id=company_id)]
+    exact = [address for address in addresses if address and not address.split('@', 1)[0] in ('', '*')]
+    domains = [address.split('@', 1)[1] for address in addresses if address.split('@', 1)[0] in ('', '*')]
+    return session.query(EmailPdfAddress.email_id).filter(or_(
+        EmailPdfAddress.address.in_(exact),
+        EmailPdfAddress.domain.in_(domains)
+    ))
+
+def get_email_total(session):
+    """Total email count from the incrementally maintained stats counter"""
+    return read_stats(session)['emails']
+
 @app.route('/api/emails')
 @requires_auth
+@versioned(EMAIL_VERSION, COMPANY_VERSION)
 def get_emails():
+    """List emails newest first using keyset pagination on (date, id)"""
     try:
-        page = request.args.get('page', 1, type=int)
-        per_page = 10
+        per_page = request.args.get('per_page', EMAIL_PAGE_SIZE, type=int)
+        per_page = max(1, min(per_page, EMAIL_PAGE_SIZE_MAX))
+        cursor = request.args.get('cursor')
         session = get_db()
-        
-        # Calculate offset
-        offset = (page - 1) * per_page
-        
-        # Get total count
-        total = session.query(Email).count()
-        
-        # Get emails for current page
-        emails = session.query(Email).order_by(Email.date.desc()).offset(offset).limit(per_page).all()
-        
+
+        query = session.query(Email).options(
+            joinedload(Email.company).selectinload(Company.emails),
+            selectinload(Email.pdf_addresses)
+        )
+
+        # Reverse lookups through the indexed email_pdf_address table
+        pdf_address = request.args.get('pdf_address')
+        if pdf_address:
+            query = query.filter(Email.id.in_(
+                session.query(EmailPdfAddress.email_id).filter(
+                    EmailPdfAddress.address == normalize_email_address(pdf_address)
+                )
+            ))
+        pdf_company = request.args.get('pdf_company', type=int)
+        if pdf_company:
+            query = query.filter(Email.id.in_(pdf_company_email_ids(session, pdf_company)))
+
+        # Search and filters from the email list
+        filtered = bool(pdf_address or pdf_company)
+        for term, sender_only in ((request.args.get('q', '').strip(), False),
+                                  (request.args.get('sender', '').strip(), True)):
+            clause = search_filter(session, term, sender_only=sender_only) if term else None
+            if clause is not None:
+                query = query.filter(clause)
+                filtered = True
+        company_id = request.args.get('company', type=int)
+        if company_id:
+            query = query.filter(Email.company_id == company_id)
+            filtered = True
+        has_pdf = request.args.get('has_pdf', '').lower()
+        if has_pdf in ('1', 'true', 'yes', '0', 'false', 'no'):
+            query = query.filter(Email.has_pdf.is_(has_pdf in ('1', 'true', 'yes')))
+            filtered = True
+        try:
+            date_from = parse_filter_date(request.args.get('date_from'))
+            date_to = parse_filter_date(request.args.get('date_to'), end_of_day=True)
+        except ValueError:
+            response = jsonify({
+                'success': False,
+                'error': 'Invalid date',
+                'message': 'date_from and date_to must be ISO dates (YYYY-MM-DD).'
+            })
+            response.headers['Content-Type'] = 'application/json'
+            return response, 400
+        if date_from:
+            query = query.filter(Email.date >= date_from)
+            filtered = True
+        if date_to:
+            query = query.filter(Email.date < date_to)
+            filtered = True
+        filtered_query = query if filtered else None
+
+        if cursor:
+            try:
+                cursor_date, cursor_id = decode_cursor(cursor)
+            except ValueError:
+                response = jsonify({
+                    'success': False,
+                    'error': 'Invalid cursor',
+                    'message': 'The pagination cursor is invalid.'
+                })
+                response.headers['Content-Type'] = 'application/json'
+                return response, 400
+            query = query.filter(or_(
+                Email.date < cursor_date,
+                and_(Email.date == cursor_date, Email.id < cursor_id)
+            ))
+
+        # Fetch one extra row to know whether another page exists
+        emails = query.order_by(Email.date.desc(), Email.id.desc()).limit(per_page + 1).all()
+        has_more = len(emails) > per_page
+        emails = emails[:per_page]
+
         # Prepare response data
         email_list = []
         for email in emails:
@@ -367,7 +552,7 @@ def get_emails():
                 'from': email.sender,
                 'date': display_date.isoformat(),
                 'has_pdf': email.has_pdf,
-                'pdf_emails': email.pdf_emails.split(',') if email.pdf_emails else []
+                'pdf_emails': email.pdf_emails
             }
             
             # Add company info if available
@@ -379,15 +564,24 @@ def get_emails():
             
             email_list.append(email_data)
         
+        pagination = {
+            'per_page': per_page,
+            'next_cursor': encode_cursor(emails[-1]) if has_more else None,
+            'has_more': has_more
+        }
+        if request.args.get('total', '').lower() in ('1', 'true', 'yes'):
+            if filtered_query is not None:
+                matches = filtered_query.with_entities(Email.id).limit(EMAIL_TOTAL_CAP + 1).subquery()
+                total = session.query(func.count()).select_from(matches).scalar()
+                pagination['total'] = min(total, EMAIL_TOTAL_CAP)
+                pagination['total_capped'] = total > EMAIL_TOTAL_CAP
+            else:
+                pagination['total'] = get_email_total(session)
+
         response = jsonify({
             'success': True,
             'data': email_list,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': total,
-                'pages': (total + per_page - 1) // per_page
-            }
+            'pagination': pagination
         })
         response.headers['Content-Type'] = 'application/json'
         return response
@@ -413,106 +607,28 @@ def get_emails():
 
 @app.route('/check-latest')
 @requires_auth
+@coalesced(window=CHECK_LATEST_WINDOW)
 def check_latest():
-    """Check latest email with improved error handling and logging"""
-    logger.info("Checking for latest email...")
+    """Report the latest state written by the ingestion worker"""
+    mailbox = request.args.get('mailbox', 'INBOX')
     try:
-        # Initialize/test email connection first
-        success, message = email_monitor.test_connection()
-        if not success:
-            logger.error(f"Email connection test failed: {message}")
-            response = jsonify({
-                'success': False,
-                'error': 'Email connection error',
-                'message': 'Failed to connect to email server. Please try again later.'
-            })
-            response.headers['Content-Type'] = 'application/json'
-            return response, 503
+        session = get_db()
+        state = session.query(MailboxSyncState).filter_by(mailbox=mailbox).first()
+
+        data = None
+        if state:
+            data = {
+                'mailbox': state.mailbox,
+                'last_uid': state.last_uid,
+                'last_checked_at': state.last_checked_at.isoformat() if state.last_checked_at else None,
+                'last_ingested_at': state.last_ingested_at.isoformat() if state.last_ingested_at else None,
+                'error': state.last_error
+            }
 
-        success, data = email_monitor.check_latest_email()
-        logger.info(f"Check result: success={success}, data={data}")
-        
-        if not success:
-            error_msg = data.get('error', 'Unknown error occurred')
-            logger.error(f"Failed to check latest email: {error_msg}")
-            response = jsonify({
-                'success': False,
-                'error': error_msg,
-                'message': 'Failed to check latest email. Please try again later.'
-            })
-            response.headers['Content-Type'] = 'application/json'
-            return response, 500
-            
-        if isinstance(data, dict) and not data.get('error'):
-            try:
-                session = get_db()
-                existing_email = session.query(Email).filter_by(
-                    sender=data['from'],
-                    subject=data.get('subject', '')
-                ).first()
-                
-                if existing_email:
-                    logger.info("Email already exists in database")
-                    response = jsonify({'success': True, 'data': None})
-                    response.headers['Content-Type'] = 'application/json'
-                    return response
-                
-                # Create new Email record with improved error handling
-                try:
-                    email_record = Email()
-                    email_record.sender = data['from']
-                    email_record.subject = data.get('subject', '')
-                    
-                    # Parse date with timezone handling
-                    if data.get('date'):
-                        try:
-                            email_date = datetime.strptime(str(data['date']), '%a, %d %b %Y %H:%M:%S %z')
-                            email_record.date = email_date.astimezone(pytz.UTC)
-                        except (ValueError, TypeError) as e:
-                            logger.error(f"Date parsing error: {str(e)}")
-                            email_record.date = datetime.now(pytz.UTC)
-                    else:
-                        email_record.date = datetime.now(pytz.UTC)
-                    
-                    email_record.has_pdf = data.get('has_pdf', False)
-                    if data.get('pdf_emails'):
-                        email_record.pdf_emails = ','.join(data['pdf_emails'])
-                    
-                    # Try to find matching company
-                    if data.get('from'):
-                        company = session.query(Company).join(CompanyEmail).filter(
-                            CompanyEmail.email == data['from']
-                        ).first()
-                        if company:
-                            email_record.company = company
-                    
-                    session.add(email_record)
-                    session.commit()
-                    logger.info("Successfully saved new email record")
-                    
-                    response = jsonify({'success': True, 'data': data})
-                    response.headers['Content-Type'] = 'application/json'
-                    return response
-                    
-                except Exception as e:
-                    session.rollback()
-                    logger.error(f"Error saving email record: {str(e)}")
-                    raise
-                    
-            except Exception as e:
-                logger.error(f"Database error processing email: {str(e)}")
-                response = jsonify({
-                    'success': False,
-                    'error': str(e),
-                    'message': 'Failed to process email data. Please try again later.'
-                })
-                response.headers['Content-Type'] = 'application/json'
-                return response, 500
-                
         response = jsonify({'success': True, 'data': data})
         response.headers['Content-Type'] = 'application/json'
         return response
-        
+
     except Exception as e:
         logger.error(f"Unexpected error in check_latest: {str(e)}")
         response = jsonify({
@@ -523,6 +639,68 @@ def check_latest():
         response.headers['Content-Type'] = 'application/json'
         return response, 500
 
+@app.route('/api/events')
+@requires_auth
+def events():
+    """Server-Sent Events stream announcing newly stored emails"""
+    if not EVENTS_STREAM:
+        response = jsonify({
+            'success': False,
+            'error': 'Event stream disabled',
+            'message': 'Poll /api/events/version instead.'
+        })
+        response.headers['Content-Type'] = 'application/json'
+        return response, 404
+
+    try:
+        last_event_id = request.headers.get('Last-Event-ID')
+        version = int(last_event_id) if last_event_id and last_event_id.isdigit() else email_events.version()
+    except Exception as e:
+        logger.error(f"Error opening event stream: {str(e)}")
+        response = jsonify({
+            'success': False,
+            'error': str(e),
+            'message': 'Unable to connect to database. Please try again later.'
+        })
+        response.headers['Content-Type'] = 'application/json'
+        return response, 503
+
+    def stream(version):
+        yield f"retry: 3000\nid: {version}\n\n"
+        deadline = time.monotonic() + EVENTS_STREAM_TTL
+        while time.monotonic() < deadline:
+            current = email_events.wait(version, timeout=min(EVENTS_KEEPALIVE, deadline - time.monotonic()))
+            if current != version:
+                version = current
+                yield f"id: {version}\nevent: emails\ndata: {json.dumps({'version': version})}\n\n"
+            else:
+                yield ": keepalive\n\n"
+
+    response = Response(stream(version), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Keep proxies from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/api/events/version')
+@requires_auth
+@versioned(EMAIL_VERSION)
+def events_version():
+    """Current email version, for dashboards polling instead of streaming"""
+    try:
+        response = jsonify({'success': True, 'version': TableVersion.get(get_db(), EMAIL_VERSION)})
+        response.headers['Content-Type'] = 'application/json'
+        return response
+    except Exception as e:
+        logger.error(f"Error reading email version: {str(e)}")
+        response = jsonify({
+            'success': False,
+            'error': str(e),
+            'message': 'Unable to connect to database. Please try again later.'
+        })
+        response.headers['Content-Type'] = 'application/json'
+        return response, 503
+
 @app.route('/api/companies/<int:id>', methods=['DELETE'])
 @requires_auth
 def delete_company(id):
@@ -533,7 +711,10 @@ def delete_company(id):
             return jsonify({'success': False, 'message': 'Cég nem található'}), 404
             
         session.delete(company)
+        count_companies(session, -1)
+        bump_company_version(session)
         session.commit()
+        company_resolver.invalidate()
         return jsonify({'success': True})
     except Exception as e:
         logger.error(f"Error deleting company: {str(e)}")
@@ -551,20 +732,22 @@ def update_company(id):
         data = request.get_json()
         if not data:
             return jsonify({'success': False, 'message': 'Invalid JSON data'}), 400
+        if 'emails' in data:
+            try:
+                normalize_company_emails(data['emails'])
+            except ValueError as e:
+                return jsonify({'success': False, 'error': str(e), 'message': 'Érvénytelen e-mail cím'}), 400
             
         company.name = data.get('name', company.name)
         
-        # Update emails
+        # Update emails, touching only the addresses that changed
         if 'emails' in data:
-            # Remove old emails
-            session.query(CompanyEmail).filter_by(company_id=company.id).delete()
-            
-            # Add new emails
-            for email in data['emails']:
-                company_email = CompanyEmail(company=company, email=email)
-                session.add(company_email)
-                
+            added, removed = sync_company_emails(session, company.id, data['emails'])
+            logger.info(f"Company {company.id}: {added} address(es) added, {removed} removed")
+
+        bump_company_version(session)
         session.commit()
+        company_resolver.invalidate()
         return jsonify({
             'success': True,
             'data': {
@@ -575,10 +758,12 @@ def update_company(id):
         })
     except Exception as e:
         logger.error(f"Error updating company: {str(e)}")
+        db.session.rollback()
         return jsonify({'success': False, 'message': 'Nem sikerült módosítani a céget'}), 500
 
 @app.route('/api/companies/<int:id>', methods=['GET'])
 @requires_auth
+@versioned(COMPANY_VERSION)
 def get_company(id):
     try:
         session = get_db()
@@ -630,7 +815,6 @@ def get_company(id):
 # Gunicorn configuration
 if 'gunicorn' in sys.argv:
     from gunicorn.app.base import BaseApplication
-    from gunicorn.workers.gevent import GeventWorker
 
     class FlaskApplication(BaseApplication):
         def __init__(self, app, options=None):
@@ -652,7 +836,9 @@ if 'gunicorn' in sys.argv:
     options = {
         'bind': '0.0.0.0:5000',
         'workers': int(os.environ.get('GUNICORN_WORKERS', '2')),
-        'worker_class': 'gunicorn.workers.gevent.GeventWorker',
+        # Same workers as the Procfile
+        'worker_class': 'gthread',
+        'threads': int(os.environ.get('WEB_THREADS', '16')),
         'timeout': int(os.environ.get('GUNICORN_TIMEOUT', '30')),
         'accesslog': '-',
         'errorlog': '-'
@@ -0,0 +1,214 @@
+"""Import the existing history of a mailbox.
+
+The ingestion worker only follows new mail.  This command walks the older
+UIDs in chunks: every chunk is fetched in a few IMAP round trips, its PDFs
+are downloaded a few messages at a time and parsed in parallel by the PDF
+pool as they arrive, and its rows are written with bulk inserts.  The
+highest imported UID is committed with each chunk, so an interrupted run
+resumes where it stopped:
+
+    python backfill.py                   # backfill INBOX
+    python backfill.py --chunk-size 1000
+"""
+import os
+import sys
+import time
+import signal
+import logging
+import argparse
+import threading
+
+from sqlalchemy.exc import IntegrityError
+
+from app import app
+from events import bump_email_version
+import ingest_queue
+from ingest import build_email_monitor, build_pdf_cache, build_pdf_pool, email_values, pdf_addresses, store_email
+from models.models import db, Email, EmailPdfAddress, MailboxSyncState
+from stats import count_emails
+
+logger = logging.getLogger(__name__)
+
+# Keeps IN lists below SQLite's bound parameter limit
+LOOKUP_BATCH = 500
+
+def _existing_message_ids(session, message_ids):
+    message_ids = list(message_ids)
+    existing = set()
+    for start in range(0, len(message_ids), LOOKUP_BATCH):
+        batch = message_ids[start:start + LOOKUP_BATCH]
+        existing.update(
+            message_id for (message_id,) in
+            session.query(Email.message_id).filter(Email.message_id.in_(batch))
+        )
+    return existing
+
+def _email_ids(session, message_ids):
+    ids = {}
+    for start in range(0, len(message_ids), LOOKUP_BATCH):
+        batch = message_ids[start:start + LOOKUP_BATCH]
+        ids.update((message_id, email_id) for email_id, message_id in
+                   session.query(Email.id, Email.message_id).filter(Email.message_id.in_(batch)))
+    return ids
+
+def bulk_store_emails(session, emails):
+    """Insert fetched email data with one bulk insert, skipping duplicates.
+
+    Returns the number of rows written.  The caller is responsible for
+    committing.
+    """
+    existing = _existing_message_ids(session, {data['message_id'] for data in emails if data.get('message_id')})
+    seen = set()
+    rows = []
+    for data in emails:
+        if data.get('message_id'):
+            key = data['message_id']
+            if key in existing:
+                continue
+        else:
+            key = (data['from'], data.get('subject', ''))
+            if key not in seen and session.query(Email.id).filter_by(sender=key[0], subject=key[1]).first():
+                continue
+        if key in seen:
+            continue
+        seen.add(key)
+        rows.append((email_values(session, data), pdf_addresses(data)))
+
+    if rows:
+        # return_defaults would make SQLAlchemy insert row by row, so the new
+        # ids are looked up by Message-ID afterwards instead
+        keyed = [(values, addresses) for values, addresses in rows if values['message_id']]
+        session.bulk_insert_mappings(Email, [values for values, _ in keyed])
+        ids = _email_ids(session, [values['message_id'] for values, addresses in keyed if addresses])
+        session.bulk_insert_mappings(EmailPdfAddress, [
+            {'email_id': ids[values['message_id']], 'address': address, 'domain': address.rsplit('@', 1)[-1]}
+            for values, addresses in keyed for address in addresses
+        ])
+        # The few messages without a Message-ID go through the ORM to learn their ids
+        for values, addresses in rows:
+            if not values['message_id']:
+                email_record = Email(**values)
+                email_record.pdf_addresses = [EmailPdfAddress.for_address(address) for address in addresses]
+                session.add(email_record)
+        count_emails(session, len(rows), with_pdf=sum(1 for values, _ in rows if values['has_pdf']))
+    return len(rows)
+
+def backfill_mailbox(session, monitor, mailbox='INBOX', chunk_size=500, stop=None):
+    """Import every message below the ingestion watermark, resuming from the checkpoint.
+
+    Returns ``(messages, inserted)`` counts for this run.
+    """
+    state = session.query(MailboxSyncState).filter_by(mailbox=mailbox).first()
+    if not state:
+        state = MailboxSyncState(mailbox=mailbox, last_uid=0, backfill_uid=0)
+        session.add(state)
+
+    uidvalidity, uidnext = monitor.mailbox_status(mailbox)
+    if state.uidvalidity != uidvalidity:
+        # Nothing synced under this UIDVALIDITY yet: the backfill covers the
+        # whole mailbox and the ingestion worker continues after it
+        logger.info(f"UIDVALIDITY for {mailbox} is {uidvalidity}, backfilling from the start")
+        ingest_queue.discard_stale(session, mailbox, uidvalidity)
+        state.uidvalidity = uidvalidity
+        state.last_uid = uidnext - 1
+        state.backfill_uid = 0
+    session.commit()
+
+    target_uid = state.last_uid
+    first_uid = (state.backfill_uid or 0) + 1
+    if first_uid > target_uid:
+        logger.info(f"Backfill of {mailbox} already complete (UID {target_uid})")
+        return 0, 0
+
+    logger.info(f"Backfilling {mailbox} UIDs {first_uid}-{target_uid} in chunks of {chunk_size}")
+    started = time.monotonic()
+    messages = inserted = 0
+
+    while first_uid <= target_uid and not (stop and stop.is_set()):
+        last_uid = min(first_uid + chunk_size - 1, target_uid)
+        success, data = monitor.fetch_uid_range(mailbox, first_uid, last_uid)
+        if not success:
+            raise RuntimeError(f"Failed to fetch UIDs {first_uid}-{last_uid}: {data.get('error')}")
+        if data['uidvalidity'] != uidvalidity:
+            raise RuntimeError(f"UIDVALIDITY of {mailbox} changed during the backfill, run it again")
+
+        try:
+            count = bulk_store_emails(session, data['emails'])
+        except IntegrityError:
+            # The ingestion worker stored one of these meanwhile; store the
+            # chunk row by row, each in a savepoint so a duplicate only skips itself
+            session.rollback()
+            count = 0
+            for email_data in data['emails']:
+                try:
+                    with session.begin_nested():
+                        stored = store_email(session, email_data)
+                except IntegrityError:
+                    logger.info(f"UID {email_data['uid']} was stored meanwhile, skipping it")
+                    continue
+                if stored:
+                    count += 1
+
+        state = session.query(MailboxSyncState).filter_by(mailbox=mailbox).one()
+        state.backfill_uid = last_uid
+        if count:
+            bump_email_version(session)
+        session.commit()
+        if monitor.pdf_cache is not None and monitor.pdf_cache.evict():
+            session.commit()
+
+        messages += len(data['emails'])
+        inserted += count
+        elapsed = time.monotonic() - started
+        logger.info(f"Backfilled UIDs up to {last_uid}/{target_uid}: {messages} messages, "
+                    f"{inserted} new, {messages / elapsed if elapsed else 0:.1f} msg/s")
+        first_uid = last_uid + 1
+
+    elapsed = time.monotonic() - started
+    logger.info(f"Backfill of {mailbox} stopped at UID {first_uid - 1}: {messages} messages in {elapsed:.1f}s "
+                f"({messages / elapsed if elapsed else 0:.1f} msg/s), {inserted} stored")
+    return messages, inserted
+
+def run(mailbox='INBOX', chunk_size=500):
+    pdf_pool = build_pdf_pool()
+    monitor = None
+    stop = threading.Event()
+
+    def handle_signal(signum, frame):
+        logger.info(f"Received signal {signum}, stopping after the current chunk")
+        stop.set()
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+
+    try:
+        with app.app_context():
+            monitor = build_email_monitor(pdf_pool, build_pdf_cache())
+            try:
+                backfill_mailbox(db.session, monitor, mailbox, chunk_size, stop)
+            finally:
+                db.session.remove()
+    finally:
+        if monitor is not None:
+            monitor.close()
+        if pdf_pool is not None:
+            logger.info(f"PDF pool stats: {pdf_pool.stats()}")
+            pdf_pool.shutdown()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import the existing messages of an IMAP mailbox")
+    parser.add_argument('--mailbox', default='INBOX', help="Mailbox to backfill (default: INBOX)")
+    parser.add_argument('--chunk-size', type=int,
+                        default=int(os.environ.get('BACKFILL_CHUNK_SIZE', '500')),
+                        help="UIDs fetched and committed per chunk (default: BACKFILL_CHUNK_SIZE or 500)")
+    args = parser.parse_args(argv)
+
+    try:
+        run(mailbox=args.mailbox, chunk_size=args.chunk_size)
+    except Exception as e:
+        logger.error(f"Backfill failed: {str(e)}")
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
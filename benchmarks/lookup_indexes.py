@@ -0,0 +1,108 @@
+"""Time the ingestion and listing lookups with and without their indexes.
+
+Fills a scratch SQLite database with the app's schema at growing sizes and
+times the queries the indexes of the hot_lookup_indexes migration serve:
+the Message-ID and (sender, subject) dedup checks, the company address
+lookup, and the newest page of /api/emails.  Each size is measured twice,
+without the indexes ("before") and with them ("after").  With the indexes
+the times should stay flat as the table grows:
+
+    python benchmarks/lookup_indexes.py
+    python benchmarks/lookup_indexes.py --sizes 1000 1000000
+"""
+import os
+import sys
+import random
+import argparse
+import tempfile
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.schema import CreateIndex, DropIndex
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.models import db, Company, CompanyEmail, Email
+
+INDEXES = [
+    index for table in (Email.__table__, CompanyEmail.__table__) for index in table.indexes
+    if index.name in ('ux_email_message_id', 'ix_email_sender_subject', 'ix_email_date_id', 'ix_company_email_email')
+]
+
+INSERT_BATCH = 10000
+
+def fill(connection, size):
+    """Insert ``size`` emails and one company address per ten emails"""
+    connection.execute(Company.__table__.insert(), [{'id': 1, 'name': 'Benchmark'}])
+    started = datetime(2020, 1, 1)
+    for start in range(0, size, INSERT_BATCH):
+        numbers = range(start, min(start + INSERT_BATCH, size))
+        connection.execute(Email.__table__.insert(), [
+            {'message_id': f'<{number}@bench>', 'sender': f'sender{number % 5000}@example.com',
+             'subject': f'Invoice {number}', 'date': started + timedelta(minutes=number), 'has_pdf': False}
+            for number in numbers
+        ])
+        connection.execute(CompanyEmail.__table__.insert(), [
+            {'company_id': 1, 'email': f'user{number}@example.com'} for number in numbers if number % 10 == 0
+        ])
+
+def lookups(size):
+    """The timed queries, each a function of a random row number"""
+    emails = Email.__table__.c
+    addresses = CompanyEmail.__table__.c
+    return {
+        'message_id': lambda n: select(emails.id).where(emails.message_id == f'<{n}@bench>'),
+        'sender_subject': lambda n: select(emails.id).where(
+            emails.sender == f'sender{n % 5000}@example.com', emails.subject == f'Invoice {n}'),
+        'company_email': lambda n: select(addresses.company_id).where(
+            addresses.email == f'user{n - n % 10}@example.com'),
+        'newest_page': lambda n: select(emails.id).order_by(emails.date.desc(), emails.id.desc()).limit(11),
+    }
+
+def time_lookups(connection, size, repeat):
+    """Median milliseconds per lookup"""
+    results = {}
+    for name, query in lookups(size).items():
+        timings = []
+        for _ in range(repeat):
+            statement = query(random.randrange(size))
+            started = time.perf_counter()
+            connection.execute(statement).fetchall()
+            timings.append((time.perf_counter() - started) * 1000)
+        results[name] = statistics.median(timings)
+    return results
+
+def run(sizes, repeat):
+    names = list(lookups(1))
+    print(f"{'rows':>10} {'indexes':>8} " + ' '.join(f"{name:>15}" for name in names) + '  (median ms)')
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            engine = create_engine(f"sqlite:///{os.path.join(directory, 'bench.db')}")
+            db.metadata.create_all(engine)
+            with engine.begin() as connection:
+                for index in INDEXES:
+                    connection.execute(DropIndex(index))
+                fill(connection, size)
+            with engine.connect() as connection:
+                for label in ('before', 'after'):
+                    if label == 'after':
+                        for index in INDEXES:
+                            connection.execute(CreateIndex(index))
+                        connection.exec_driver_sql('ANALYZE')
+                    results = time_lookups(connection, size, repeat)
+                    print(f"{size:>10} {label:>8} " + ' '.join(f"{results[name]:>15.3f}" for name in names))
+            engine.dispose()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the hot lookup indexes")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help="Email row counts to measure (default: 1000 10000 100000)")
+    parser.add_argument('--repeat', type=int, default=200, help="Lookups timed per query (default: 200)")
+    args = parser.parse_args(argv)
+    run(args.sizes, args.repeat)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,122 @@
+"""In-memory company matching for incoming emails.
+
+Each process compiles every company address, and every wildcard domain
+(entries written as ``*@acme.hu``), into one Aho-Corasick automaton.  An
+email's sender and the addresses found in its PDF attachments are matched
+in a single pass over their text, however many companies there are.
+Company CRUD bumps the ``company`` TableVersion in the same transaction,
+and other processes rebuild their automaton once they see the new version.
+"""
+import time
+import bisect
+import logging
+import threading
+
+from aho_corasick import AhoCorasick
+from email_utils import normalize_email_address
+from models.models import CompanyEmail, TableVersion
+
+logger = logging.getLogger(__name__)
+
+COMPANY_VERSION = 'company'
+
+def bump_company_version(session):
+    """Mark company data as changed; call before committing company CRUD"""
+    TableVersion.bump(session, COMPANY_VERSION)
+
+# A sender match outweighs any number of PDF matches
+SENDER_WEIGHT = 1000
+
+# Separates the addresses being matched
+_SEPARATOR = '\n'
+
+class CompanyResolver:
+    def __init__(self, check_interval=5):
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._version = None
+        self._checked_at = 0
+        self._matcher = AhoCorasick([])
+
+    def invalidate(self):
+        """Force a version check on the next lookup"""
+        with self._lock:
+            self._version = None
+            self._checked_at = 0
+
+    def refresh(self, session, force=False):
+        """Rebuild the automaton if the company version changed"""
+        now = time.monotonic()
+        if not force and self._version is not None and now - self._checked_at < self.check_interval:
+            return
+
+        version = TableVersion.get(session, COMPANY_VERSION)
+        with self._lock:
+            self._checked_at = now
+            if version == self._version and not force:
+                return
+
+        # The first company listing an address or domain keeps it
+        by_address = {}
+        by_domain = {}
+        rows = session.query(CompanyEmail.email, CompanyEmail.company_id).order_by(CompanyEmail.id)
+        for address, company_id in rows:
+            address = normalize_email_address(address)
+            if address.startswith('*@') or address.startswith('@'):
+                by_domain.setdefault(address.split('@', 1)[1], company_id)
+            elif address:
+                by_address.setdefault(address, company_id)
+
+        matcher = AhoCorasick(
+            [(address, (True, company_id)) for address, company_id in by_address.items()] +
+            [(domain, (False, company_id)) for domain, company_id in by_domain.items() if domain]
+        )
+        with self._lock:
+            self._matcher = matcher
+            self._version = version
+        logger.info(f"Company resolver loaded {len(by_address)} address(es) and "
+                    f"{len(by_domain)} domain(s) at version {version}")
+
+    def match(self, session, sender, pdf_addresses=()):
+        """Return the id of the company best matching an email, or None.
+
+        Within each address an exact company address beats a wildcard domain,
+        and a longer domain (billing.acme.hu) beats a shorter one (acme.hu).
+        Each address then votes for its company; the sender's vote outweighs
+        those of the PDF addresses.
+        """
+        self.refresh(session)
+        addresses = [normalize_email_address(sender)]
+        addresses += [address for address in dict.fromkeys(normalize_email_address(a) for a in pdf_addresses)
+                      if address and address != addresses[0]]
+        addresses = [address.replace(_SEPARATOR, ' ') for address in addresses]
+        text = _SEPARATOR.join(addresses)
+        starts = []
+        offset = 0
+        for address in addresses:
+            starts.append(offset)
+            offset += len(address) + 1
+
+        best = {}  # address index -> ((exact, length), company id)
+        for start, end, (exact, company_id) in self._matcher.finditer(text):
+            if end < len(text) and text[end] != _SEPARATOR:
+                continue
+            index = bisect.bisect_right(starts, start) - 1
+            if exact:
+                if start != starts[index]:
+                    continue
+            elif start == starts[index] or text[start - 1] not in '@.':
+                # A domain only matches whole labels after the @
+                continue
+            rank = (exact, end - start)
+            if index not in best or rank > best[index][0]:
+                best[index] = (rank, company_id)
+
+        votes = {}
+        for index, (_, company_id) in sorted(best.items()):
+            votes[company_id] = votes.get(company_id, 0) + (SENDER_WEIGHT if index == 0 else 1)
+        if not votes:
+            return None
+        return max(votes, key=votes.get)
+
+company_resolver = CompanyResolver()
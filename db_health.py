@@ -0,0 +1,131 @@
+"""Opt-in database connection health tracking.
+
+Counts database round trips per request (reported in the X-DB-Round-Trips
+response header) and runs a circuit breaker: once the database has failed
+``failure_threshold`` times in a row, requests fail fast with 503 for
+``reset_timeout`` seconds instead of each waiting on a dead server.  After
+that one trial request is let through; its outcome closes or re-opens the
+breaker.  Stale pooled connections are handled by ``pool_pre_ping``.
+"""
+import time
+import logging
+import threading
+
+from flask import g, jsonify, request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DisconnectionError, OperationalError
+
+logger = logging.getLogger(__name__)
+
+class CircuitBreaker:
+    """Thread-safe closed/open/half-open circuit breaker"""
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=3, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self._opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow_request(self):
+        """Return the state a request was admitted under, or None if rejected"""
+        with self._lock:
+            state = self._state()
+            if state == self.CLOSED:
+                return state
+            if state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return state
+            return None
+
+    def record_success(self):
+        with self._lock:
+            if self._opened_at is not None:
+                logger.info("Database reachable again, closing circuit breaker")
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def release_trial(self):
+        """Let another trial through if the last one never touched the database"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._failures >= self.failure_threshold or self._opened_at is not None:
+                if self._opened_at is None:
+                    logger.error(f"Database failed {self._failures} times, opening circuit breaker")
+                self._opened_at = time.monotonic()
+
+class DatabaseHealth:
+    """Wires round-trip counting and the circuit breaker into a Flask app"""
+    def __init__(self, app=None, failure_threshold=3, reset_timeout=30):
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['db_health'] = self
+        event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+        event.listen(Engine, 'handle_error', self._handle_error)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.breaker.record_success()
+        if has_request_context():
+            g.db_round_trips = g.get('db_round_trips', 0) + 1
+
+    def _handle_error(self, context):
+        if context.is_disconnect or isinstance(context.sqlalchemy_exception, (OperationalError, DisconnectionError)):
+            self.breaker.record_failure()
+
+    def _before_request(self):
+        g.db_round_trips = 0
+        if request.endpoint == 'static':
+            return None
+        admitted = self.breaker.allow_request()
+        g.db_breaker_trial = admitted == CircuitBreaker.HALF_OPEN
+        if admitted:
+            return None
+
+        logger.warning(f"Circuit breaker open, rejecting {request.path}")
+        if request.path.startswith('/api/'):
+            response = jsonify({
+                'success': False,
+                'error': 'Database connection error',
+                'message': 'Unable to connect to database. Please try again later.'
+            })
+            response.headers['Content-Type'] = 'application/json'
+            response.headers['Retry-After'] = str(self.breaker.reset_timeout)
+            return response, 503
+        return "Database connection error. Please try again later.", 503, {'Retry-After': str(self.breaker.reset_timeout)}
+
+    def _after_request(self, response):
+        if g.get('db_breaker_trial'):
+            self.breaker.release_trial()
+        response.headers['X-DB-Round-Trips'] = str(g.get('db_round_trips', 0))
+        return response
+
+    def stats(self):
+        return {'circuit': self.breaker.state}
@@ -3,99 +3,416 @@ import email
 import re
 import PyPDF2
 import io
+import hashlib
+import os
 import ssl
+import select
+import threading
+from contextlib import contextmanager
 from email.header import decode_header
 from datetime import datetime
 import logging
-from email.utils import parsedate_to_datetime
+from email.utils import parsedate_to_datetime, parseaddr
 import pytz
 import time
 
+from imap_fetch import (PDF_CONTENT_TYPES, decode_part, fetch_item, find_pdf_parts, format_uid_set,
+                        parse_fetch_response)
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s: %(message)s')
 logger = logging.getLogger(__name__)
 
+def normalize_email_address(address):
+    """Return the bare, lower-cased address from an address or From header"""
+    if not address:
+        return ""
+    _, addr = parseaddr(address)
+    return (addr or address).strip().lower()
+
+EMAIL_PATTERN = re.compile(r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}')
+
+# Limits for a single PDF attachment
+PDF_MAX_PAGES = 50
+PDF_MAX_BYTES = 20 * 1024 * 1024
+PDF_TIME_BUDGET = 10  # seconds
+
+def extract_pdf_emails(pdf_bytes, max_pages=PDF_MAX_PAGES, max_bytes=PDF_MAX_BYTES, time_budget=PDF_TIME_BUDGET):
+    """Extract email addresses from PDF bytes one page at a time.
+
+    Each page is scanned as soon as its text is extracted, so memory stays
+    bounded by a single page.  Extraction stops after ``max_pages`` pages or
+    once ``time_budget`` seconds have passed; attachments larger than
+    ``max_bytes`` are skipped.  Returns a dict with the ``emails`` found,
+    the number of ``pages`` read, the attachment ``size``, the elapsed time in
+    ``elapsed_ms`` and whether extraction was ``truncated``.
+    """
+    started = time.monotonic()
+    result = {'emails': [], 'pages': 0, 'size': len(pdf_bytes or b''), 'elapsed_ms': 0, 'truncated': False}
+
+    if not pdf_bytes:
+        logger.warning("Empty PDF content")
+        return result
+    if len(pdf_bytes) > max_bytes:
+        logger.warning(f"Skipping PDF of {len(pdf_bytes)} bytes (limit {max_bytes})")
+        result['truncated'] = True
+        return result
+
+    emails = {}
+    try:
+        with io.BytesIO(pdf_bytes) as pdf_file:
+            pdf_reader = PyPDF2.PdfReader(pdf_file)
+            for page_num, page in enumerate(pdf_reader.pages):
+                if page_num >= max_pages or time.monotonic() - started > time_budget:
+                    result['truncated'] = True
+                    break
+                try:
+                    text = page.extract_text() or ""
+                except Exception as e:
+                    logger.error(f"Error extracting text from PDF page {page_num}: {str(e)}")
+                    continue
+                result['pages'] += 1
+                emails.update(dict.fromkeys(EMAIL_PATTERN.findall(text)))
+    except Exception as e:
+        logger.error(f"Error processing PDF: {str(e)}")
+
+    result['emails'] = list(emails)
+    result['elapsed_ms'] = round((time.monotonic() - started) * 1000, 1)
+    logger.info(f"Found {len(emails)} email(s) in PDF ({result['pages']} page(s), {result['elapsed_ms']} ms"
+                f"{', truncated' if result['truncated'] else ''})")
+    return result
+
+# Servers drop IDLE after 30 minutes; RFC 2177 asks clients to re-issue it sooner
+IDLE_TIMEOUT = 25 * 60
+
+_EXISTS = re.compile(rb'^\* \d+ EXISTS', re.IGNORECASE)
+
+# Header fields fetched for each new message
+HEADER_FIELDS = 'SUBJECT FROM DATE MESSAGE-ID'
+
+# Messages whose PDF parts are downloaded, and then extracted, per UID FETCH
+PDF_FETCH_BATCH = 10
+
+# Seconds a keepalive NOOP may take before the session is given up
+KEEPALIVE_TIMEOUT = 5
+
+# Bytes requested from the socket per read
+_RECV_SIZE = 65536
+
+class _SocketReader:
+    """Replacement for imaplib's ``sock.makefile('rb')`` that shows what it has buffered.
+
+    A BufferedReader hides lines it has already pulled off the socket, so
+    ``select`` on the socket cannot tell that an ``EXISTS`` is waiting in it,
+    and a socket timeout leaves the file unusable.  IDLE needs both.
+    """
+    def __init__(self, sock):
+        self.sock = sock
+        self.buffer = bytearray()
+
+    def _fill(self):
+        data = self.sock.recv(_RECV_SIZE)
+        self.buffer += data
+        return bool(data)
+
+    def buffered(self):
+        """Whether data is available without waiting on the socket"""
+        return bool(self.buffer) or (isinstance(self.sock, ssl.SSLSocket) and self.sock.pending() > 0)
+
+    def readline(self, limit=-1):
+        while True:
+            end = self.buffer.find(b'\n')
+            if end >= 0 or (0 <= limit <= len(self.buffer)) or not self._fill():
+                break
+        size = end + 1 if end >= 0 else len(self.buffer)
+        if limit >= 0:
+            size = min(size, limit)
+        return self.read(size)
+
+    def read(self, size):
+        while len(self.buffer) < size and self._fill():
+            pass
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return data
+
+    def close(self):
+        pass
+
+class _IMAP4_SSL(imaplib.IMAP4_SSL):
+    """IMAP4_SSL reading through a ``_SocketReader``"""
+    def open(self, host='', port=imaplib.IMAP4_SSL_PORT, timeout=None):
+        super().open(host, port, timeout)
+        # Nothing has been read yet, the greeting is read after open()
+        self.file = _SocketReader(self.sock)
+
+class _PooledSession:
+    """Authenticated IMAP session tracked by IMAPConnectionPool"""
+    def __init__(self, imap):
+        self.imap = imap
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.mailbox = None
+
+class IMAPConnectionPool:
+    """Process-local pool of authenticated, already-selected IMAP sessions.
+
+    Each gunicorn/gevent worker process owns its own pool; sessions are never
+    shared between processes (the pool resets itself after a fork).  Within a
+    process the pool is safe for concurrent threads and greenlets.
+    """
+    def __init__(self, connect, max_size=2, max_age=300, keepalive_interval=60, acquire_timeout=30):
+        self._connect = connect
+        self.max_size = max_size
+        self.max_age = max_age
+        self.keepalive_interval = keepalive_interval
+        self.acquire_timeout = acquire_timeout
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_size)
+        self._idle = []
+        self._stats = {'hits': 0, 'misses': 0, 'reconnects': 0, 'evictions': 0}
+        self._reported = dict(self._stats)
+
+    def _check_fork(self):
+        """Drop sessions inherited from a parent process"""
+        if os.getpid() != self._pid:
+            logger.info("Process fork detected, resetting IMAP connection pool")
+            self._reset()
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    def _is_expired(self, session):
+        return time.monotonic() - session.created_at > self.max_age
+
+    def _is_alive(self, session, timeout=None):
+        sock = getattr(session.imap, 'sock', None)
+        previous = sock.gettimeout() if sock is not None else None
+        try:
+            if sock is not None and timeout is not None:
+                sock.settimeout(timeout)
+            status, _ = session.imap.noop()
+            return status == 'OK'
+        except Exception:
+            return False
+        finally:
+            if sock is not None and timeout is not None:
+                try:
+                    sock.settimeout(previous)
+                except Exception:
+                    pass
+
+    def _discard(self, session):
+        """Log out and forget a session"""
+        self._count('evictions')
+        try:
+            if session.mailbox:
+                session.imap.close()
+        except Exception:
+            pass
+        try:
+            session.imap.logout()
+        except Exception:
+            pass
+
+    def _checkout(self, mailbox):
+        with self._lock:
+            # Prefer a session that already has the mailbox selected
+            session = next((s for s in self._idle if s.mailbox == mailbox), None)
+            if session is None and self._idle:
+                session = self._idle[-1]
+            if session is not None:
+                self._idle.remove(session)
+
+        if session is not None:
+            idle_for = time.monotonic() - session.last_used
+            if self._is_expired(session) or (idle_for > self.keepalive_interval and not self._is_alive(session, KEEPALIVE_TIMEOUT)):
+                self._discard(session)
+                self._count('reconnects')
+                session = None
+
+        if session is not None:
+            self._count('hits')
+        else:
+            self._count('misses')
+            session = _PooledSession(self._connect())
+
+        if session.mailbox != mailbox:
+            try:
+                status, response = session.imap.select(mailbox)
+                if status != 'OK':
+                    raise imaplib.IMAP4.error(f"Failed to select {mailbox}: {response}")
+            except Exception:
+                self._discard(session)
+                raise
+            session.mailbox = mailbox
+        return session
+
+    @contextmanager
+    def connection(self, mailbox="INBOX"):
+        """Borrow a logged-in session with ``mailbox`` selected.
+
+        The session goes back to the pool when the block exits normally and is
+        evicted if the block raises.
+        """
+        self._check_fork()
+        slots = self._slots
+        if not slots.acquire(timeout=self.acquire_timeout):
+            raise TimeoutError("Timed out waiting for a free IMAP connection")
+        try:
+            session = self._checkout(mailbox)
+            try:
+                yield session.imap
+            except BaseException:
+                self._discard(session)
+                raise
+            session.last_used = time.monotonic()
+            with self._lock:
+                self._idle.append(session)
+        finally:
+            slots.release()
+
+    def keepalive(self, timeout=KEEPALIVE_TIMEOUT):
+        """NOOP sessions idle for over ``keepalive_interval`` and evict dead or expired ones.
+
+        Called from the workers' loops, so the server does not drop sessions
+        that sit in the pool between syncs.  A session whose NOOP takes over
+        ``timeout`` seconds is evicted.
+        """
+        self._check_fork()
+        with self._lock:
+            idle, self._idle = self._idle, []
+        alive = []
+        for session in idle:
+            if self._is_expired(session):
+                self._discard(session)
+            elif time.monotonic() - session.last_used <= self.keepalive_interval:
+                alive.append(session)
+            elif self._is_alive(session, timeout):
+                session.last_used = time.monotonic()
+                alive.append(session)
+            else:
+                self._discard(session)
+        with self._lock:
+            self._idle.extend(alive)
+        return len(alive)
+
+    def close_all(self):
+        """Log out every idle session"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for session in idle:
+            self._discard(session)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['idle'] = len(self._idle)
+        stats['max_size'] = self.max_size
+        return stats
+
+    def unreported_stats(self):
+        """Counter increases since the previous call, for adding to persisted totals"""
+        with self._lock:
+            delta = {key: value - self._reported[key] for key, value in self._stats.items()}
+            self._reported = dict(self._stats)
+        return delta
+
 class EmailMonitor:
-    def __init__(self, username, password, server):
+    def __init__(self, username, password, server, pool_size=2,
+                 pdf_max_pages=PDF_MAX_PAGES, pdf_max_bytes=PDF_MAX_BYTES, pdf_time_budget=PDF_TIME_BUDGET,
+                 pdf_pool=None, pdf_cache=None):
         """Initialize EmailMonitor with improved validation"""
         if not all([username, password, server]):
             raise ValueError("Email credentials are missing")
         self.username = username
         self.password = password
         self.server = server
-        self.imap = None
-        self.last_connection_time = None
         self.connection_timeout = 300  # 5 minutes timeout
+        self.pdf_max_pages = pdf_max_pages
+        self.pdf_max_bytes = pdf_max_bytes
+        self.pdf_time_budget = pdf_time_budget
+        self.pdf_pool = pdf_pool
+        self.pdf_cache = pdf_cache
+        self.pool = IMAPConnectionPool(
+            self._connect,
+            max_size=pool_size,
+            max_age=self.connection_timeout
+        )
+        # IDLE gets its own session: it would hold a pool slot for up to
+        # IDLE_TIMEOUT and outlive the pool's max_age every time
+        self._idler = None
+        self._idler_lock = threading.Lock()
         logger.info(f"EmailMonitor initialized with server: {server}")
 
-    def _check_connection_state(self):
-        """Check if the connection is active and in a valid state"""
-        if not self.imap:
-            return False
-        try:
-            status, _ = self.imap.noop()
-            return status == 'OK'
-        except:
-            return False
-
-    def _ensure_selected_state(self):
-        """Ensure mailbox is selected and connection is valid"""
-        if not self._check_connection_state():
-            success, _ = self._connect()
-            if not success:
-                return False
-        try:
-            status, _ = self.imap.select('INBOX')
-            return status == 'OK'
-        except:
-            return False
-
     def _connect(self):
-        """Establish IMAP connection with improved error handling and connection pooling"""
+        """Open a new authenticated IMAP connection"""
+        logger.info(f"Connecting to IMAP server: {self.server}")
+        imap = _IMAP4_SSL(self.server, timeout=30)
         try:
-            if self.imap:
-                try:
-                    self.imap.close()
-                    self.imap.logout()
-                except:
-                    pass
-
-            logger.info(f"Connecting to IMAP server: {self.server}")
-            self.imap = imaplib.IMAP4_SSL(self.server, timeout=30)
-            
             logger.info("Attempting login...")
-            status, response = self.imap.login(self.username, self.password)
+            status, response = imap.login(self.username, self.password)
             if status != 'OK':
                 raise imaplib.IMAP4.error(f"Login failed: {response[0].decode()}")
-            
-            self.last_connection_time = datetime.now()
-            logger.info("Successfully connected to IMAP server")
-            return True, None
+        except Exception:
+            try:
+                imap.logout()
+            except Exception:
+                pass
+            raise
 
-        except Exception as e:
-            self._disconnect()
-            return False, str(e)
+        logger.info("Successfully connected to IMAP server")
+        return imap
 
-    def _disconnect(self):
-        """Safely disconnect from IMAP server with improved cleanup"""
-        if not self.imap:
-            return
+    def close(self):
+        """Log out all pooled IMAP sessions and the IDLE session"""
+        self.pool.close_all()
+        with self._idler_lock:
+            self._close_idler()
 
-        try:
+    def _close_idler(self):
+        idler, self._idler = self._idler, None
+        if idler is not None:
             try:
-                self.imap.close()
-                logger.info("IMAP connection closed")
-            except Exception as e:
-                logger.warning(f"Error during IMAP close: {str(e)}")
+                idler[0].logout()
+            except Exception:
+                pass
 
+    def _idle_session(self, mailbox):
+        """The IDLE session with ``mailbox`` selected, connected on first use"""
+        if self._idler is not None and self._idler[1] != mailbox:
+            self._close_idler()
+        if self._idler is None:
+            imap = self._connect()
             try:
-                self.imap.logout()
-                logger.info("IMAP logout successful")
-            except Exception as e:
-                logger.warning(f"Error during IMAP logout: {str(e)}")
-        finally:
-            self.imap = None
-            self.last_connection_time = None
+                status, response = imap.select(mailbox)
+                if status != 'OK':
+                    raise imaplib.IMAP4.error(f"Failed to select {mailbox}: {response}")
+            except Exception:
+                try:
+                    imap.logout()
+                except Exception:
+                    pass
+                raise
+            self._idler = (imap, mailbox)
+        return self._idler[0]
+
+    def keepalive(self):
+        """Keep the pooled IMAP sessions alive between syncs"""
+        return self.pool.keepalive()
+
+    def pool_stats(self):
+        """Return IMAP connection pool metrics"""
+        return self.pool.stats()
+
+    def unreported_pool_stats(self):
+        """Return the pool counters' increases since the previous call"""
+        return self.pool.unreported_stats()
 
     def _decode_email_header(self, header_value):
         """Decode email header with improved encoding handling"""
@@ -118,131 +435,405 @@ class EmailMonitor:
             logger.error(f"Error decoding header: {str(e)}")
             return str(header_value).strip()
 
-    def extract_emails_from_pdf(self, part):
-        """Extract email addresses from PDF with improved error handling and memory management"""
+    def _pdf_payload(self, part):
         try:
-            pdf_bytes = part.get_payload(decode=True)
-            if not pdf_bytes:
-                logger.warning("Empty PDF content")
-                return []
-
-            # Use context manager for proper resource cleanup
-            with io.BytesIO(pdf_bytes) as pdf_file:
-                pdf_reader = PyPDF2.PdfReader(pdf_file)
-                
-                text = ""
-                for page_num, page in enumerate(pdf_reader.pages):
-                    try:
-                        text += page.extract_text() + "\n"
-                    except Exception as e:
-                        logger.error(f"Error extracting text from PDF page {page_num}: {str(e)}")
-                        continue
-                
-                email_pattern = r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}'
-                emails = set(re.findall(email_pattern, text))
-                logger.info(f"Found {len(emails)} email(s) in PDF")
-                return list(emails)
-
+            return part.get_payload(decode=True)
         except Exception as e:
-            logger.error(f"Error processing PDF: {str(e)}")
-            return []
+            logger.error(f"Error decoding PDF attachment: {str(e)}")
+            return None
 
-    def check_latest_email(self, mailbox="INBOX"):
-        """Check latest email with improved IMAP handling and error recovery"""
-        max_retries = 3
-        retry_delay = 2
-        
-        for attempt in range(max_retries):
+    def extract_emails_from_pdf_payloads(self, payloads):
+        """Extract email addresses from decoded PDF attachment bytes.
+
+        Attachments found in the PDF cache are not parsed again; the rest go
+        to the PDF process pool when one is configured, so they are parsed in
+        parallel outside this process.  Returns one extract_pdf_emails()
+        result dict per payload.
+        """
+        limits = {
+            'max_pages': self.pdf_max_pages,
+            'max_bytes': self.pdf_max_bytes,
+            'time_budget': self.pdf_time_budget
+        }
+
+        # Attachments seen before are answered from the content-hash cache
+        results = [None] * len(payloads)
+        digests = [None] * len(payloads)
+        if self.pdf_cache is not None:
+            for index, pdf_bytes in enumerate(payloads):
+                if pdf_bytes:
+                    digests[index] = hashlib.sha256(pdf_bytes).hexdigest()
+                    results[index] = self.pdf_cache.get(digests[index])
+
+        pending = [index for index, result in enumerate(results) if result is None]
+        pending_payloads = [payloads[index] for index in pending]
+        if self.pdf_pool is not None:
+            extracted = self.pdf_pool.map(pending_payloads, **limits)
+        else:
+            extracted = [extract_pdf_emails(pdf_bytes, **limits) for pdf_bytes in pending_payloads]
+
+        if self.pdf_cache is not None:
+            self.pdf_cache.flush()
+        for index, result in zip(pending, extracted):
+            results[index] = result
+            if digests[index] is not None:
+                self.pdf_cache.put(digests[index], result)
+        return results
+
+    def _parse_headers(self, message):
+        """Read the stored header fields from a parsed message"""
+        subject = self._decode_email_header(message["subject"])
+        sender = self._decode_email_header(message["from"])
+        message_id = (message["message-id"] or "").strip()[:255] or None
+
+        # Parse date with proper timezone handling
+        date_str = message["date"]
+        if date_str:
             try:
-                if not self._ensure_selected_state():
-                    raise Exception("Failed to select mailbox")
-                    
-                status, messages = self.imap.search(None, "ALL")
-                if status != 'OK':
-                    raise Exception(f"Failed to search messages: {messages}")
-                    
-                msg_nums = messages[0].split()
-                if not msg_nums:
-                    return True, {"message": "No emails found"}
-                    
-                latest_id = msg_nums[-1]
-                status, msg_data = self.imap.fetch(latest_id, "(RFC822)")
-                if status != 'OK':
-                    raise Exception("Failed to fetch message")
-
-                email_body = msg_data[0][1]
-                message = email.message_from_bytes(email_body)
-
-                # Parse email data
-                subject = self._decode_email_header(message["subject"])
-                sender = self._decode_email_header(message["from"])
-                
-                # Parse date with proper timezone handling
-                date_str = message["date"]
-                if date_str:
-                    try:
-                        parsed_date = parsedate_to_datetime(date_str)
-                        utc = pytz.UTC
-                        utc_date = parsed_date.astimezone(utc)
-                        date = utc_date.strftime('%a, %d %b %Y %H:%M:%S %z')
-                    except Exception as e:
-                        logger.error(f"Date parsing error: {str(e)}")
-                        date = datetime.now(pytz.UTC).strftime('%a, %d %b %Y %H:%M:%S %z')
-                else:
-                    date = datetime.now(pytz.UTC).strftime('%a, %d %b %Y %H:%M:%S %z')
+                parsed_date = parsedate_to_datetime(date_str)
+                utc = pytz.UTC
+                utc_date = parsed_date.astimezone(utc)
+                date = utc_date.strftime('%a, %d %b %Y %H:%M:%S %z')
+            except Exception as e:
+                logger.error(f"Date parsing error: {str(e)}")
+                date = datetime.now(pytz.UTC).strftime('%a, %d %b %Y %H:%M:%S %z')
+        else:
+            date = datetime.now(pytz.UTC).strftime('%a, %d %b %Y %H:%M:%S %z')
 
-                logger.info(f"Email details - Subject: {subject}, From: {sender}")
+        logger.info(f"Email details - Subject: {subject}, From: {sender}")
+        return {
+            "message_id": message_id,
+            "subject": subject,
+            "from": sender,
+            "date": date
+        }
 
-                # Process email content
-                has_pdf = False
-                pdf_emails = []
-                
-                for part in message.walk():
-                    if part.get_content_maintype() == 'multipart':
-                        continue
-                    if part.get('Content-Disposition') is None:
-                        continue
+    def _build_emails(self, messages):
+        """Build email data dicts for ``(headers, pdfs)`` pairs.
+
+        ``pdfs`` holds ``(filename, result)`` tuples, where ``result`` is the
+        extract_pdf_emails() result dict of the attachment.
+        """
+        emails = []
+        for headers, pdfs in messages:
+            pdf_emails = {}
+            pdf_attachments = []
+            for filename, result in pdfs:
+                pdf_emails.update(dict.fromkeys(result['emails']))
+                result['filename'] = filename
+                pdf_attachments.append(result)
+
+            email_data = dict(headers)
+            email_data.update({
+                "has_pdf": bool(pdfs),
+                "pdf_emails": list(pdf_emails),
+                "pdf_attachments": pdf_attachments
+            })
+            emails.append(email_data)
+        return emails
+
+    def _split_message(self, raw_message):
+        """Return the header fields and ``(filename, result)`` PDFs of a raw message"""
+        message = email.message_from_bytes(raw_message)
+        headers = self._parse_headers(message)
+
+        pdfs = []
+        for part in message.walk():
+            if part.get_content_maintype() == 'multipart':
+                continue
+            if part.get('Content-Disposition') is None:
+                continue
 
-                    filename = self._decode_email_header(part.get_filename())
-                    content_type = part.get_content_type()
+            filename = self._decode_email_header(part.get_filename())
+            content_type = part.get_content_type()
 
-                    is_pdf = (
-                        (filename and filename.lower().endswith('.pdf')) or
-                        content_type in ['application/pdf', 'application/x-pdf']
-                    )
+            is_pdf = (
+                (filename and filename.lower().endswith('.pdf')) or
+                content_type in PDF_CONTENT_TYPES
+            )
 
-                    if is_pdf:
-                        has_pdf = True
+            if is_pdf:
+                logger.info(f"Found PDF attachment: {filename}")
+                pdfs.append((filename, self._pdf_payload(part)))
+
+        results = self.extract_emails_from_pdf_payloads([pdf_bytes for _, pdf_bytes in pdfs])
+        return headers, [(filename, result) for (filename, _), result in zip(pdfs, results)]
+
+    def _mailbox_status(self, imap, mailbox):
+        """Return (UIDVALIDITY, UIDNEXT) for the selected mailbox.
+
+        STATUS must not be used on the selected mailbox (RFC 3501 6.3.10),
+        and servers may answer it with a stale UIDNEXT, so the mailbox is
+        selected again and the values are read from the SELECT response codes.
+        """
+        status, response = imap.select(mailbox)
+        if status != 'OK':
+            raise imaplib.IMAP4.error(f"Failed to select {mailbox}: {response}")
+        codes = {}
+        for code in ('UIDVALIDITY', 'UIDNEXT'):
+            _, values = imap.response(code)
+            value = values[-1] if values else None
+            if value is None:
+                raise Exception(f"SELECT {mailbox} did not report {code}")
+            codes[code] = int(value)
+        return codes['UIDVALIDITY'], codes['UIDNEXT']
+
+    def _fetch_uid_range(self, imap, first_uid, last_uid):
+        """Fetch the messages in a UID range; see _fetch_messages()"""
+        # "n:m" can return the newest message even if it is below n
+        return self._fetch_messages(imap, f"{first_uid}:{last_uid}", lambda uid: first_uid <= uid <= last_uid)
+
+    def _fetch_messages(self, imap, uid_set, wanted):
+        """Fetch the messages in a UID set without downloading them whole.
+
+        One UID FETCH reads the header fields and BODYSTRUCTURE of every
+        message; a second one per distinct set of part numbers downloads only
+        the PDF MIME parts, a few messages at a time; each batch of PDFs is
+        extracted as soon as it arrives, so only one batch of attachments is
+        held in memory.  Messages whose structure cannot be interpreted are
+        fetched as full RFC822.  Returns ``(uid, fetched)`` pairs for the UIDs
+        accepted by ``wanted``, where ``fetched`` holds either ``headers``
+        and ``(filename, result)`` ``pdfs`` or ``raw`` bytes.
+        """
+        status, msg_data = imap.uid(
+            'FETCH', uid_set,
+            f"(UID BODYSTRUCTURE BODY.PEEK[HEADER.FIELDS ({HEADER_FIELDS})])"
+        )
+        if status != 'OK':
+            raise Exception(f"Failed to fetch messages: {msg_data}")
+
+        fetched = {}
+        pdf_parts = {}
+        for item in parse_fetch_response(msg_data):
+            try:
+                uid = int(item['UID'])
+            except (KeyError, TypeError, ValueError):
+                continue
+            if not wanted(uid):
+                continue
+            try:
+                parts = find_pdf_parts(item['BODYSTRUCTURE'])
+            except (KeyError, IndexError, ValueError) as e:
+                logger.warning(f"Unreadable BODYSTRUCTURE for UID {uid}, fetching full message: {str(e)}")
+                fetched[uid] = {'raw': None}
+                continue
+            fetched[uid] = {'headers': bytes(fetch_item(item, 'BODY[HEADER') or b''), 'pdfs': []}
+            if parts:
+                pdf_parts[uid] = parts
+
+        # Download PDF parts, batching messages that need the same part numbers
+        by_sections = {}
+        for uid, parts in pdf_parts.items():
+            by_sections.setdefault(tuple(number for number, _, _ in parts), []).append(uid)
+        for sections, uids in by_sections.items():
+            items = ' '.join(f"BODY.PEEK[{number}]" for number in sections)
+            for start in range(0, len(uids), PDF_FETCH_BATCH):
+                batch = set(uids[start:start + PDF_FETCH_BATCH])
+                status, part_data = imap.uid('FETCH', format_uid_set(batch), f"(UID {items})")
+                if status != 'OK':
+                    raise Exception(f"Failed to fetch PDF parts: {part_data}")
+                pdfs = []
+                for item in parse_fetch_response(part_data):
+                    uid = int(item.get('UID') or 0)
+                    if uid not in batch:
+                        continue
+                    for number, filename, encoding in pdf_parts[uid]:
                         logger.info(f"Found PDF attachment: {filename}")
-                        pdf_emails = self.extract_emails_from_pdf(part)
-                        break
+                        try:
+                            pdf_bytes = decode_part(item.get(f"BODY[{number}]"), encoding)
+                        except Exception as e:
+                            logger.error(f"Error decoding PDF attachment: {str(e)}")
+                            pdf_bytes = None
+                        pdfs.append((uid, filename, pdf_bytes))
+                del part_data
+
+                results = self.extract_emails_from_pdf_payloads([pdf_bytes for _, _, pdf_bytes in pdfs])
+                for (uid, filename, _), result in zip(pdfs, results):
+                    fetched[uid]['pdfs'].append((filename, result))
+
+        raw_uids = [uid for uid, data in fetched.items() if 'raw' in data]
+        if raw_uids:
+            status, raw_data = imap.uid('FETCH', ','.join(str(uid) for uid in raw_uids), "(UID RFC822)")
+            if status != 'OK':
+                raise Exception(f"Failed to fetch messages: {raw_data}")
+            for item in parse_fetch_response(raw_data):
+                uid = int(item.get('UID') or 0)
+                if uid in fetched and item.get('RFC822') is not None:
+                    fetched[uid]['raw'] = bytes(item['RFC822'])
+
+        return sorted(fetched.items())
+
+    def _emails_from_fetched(self, messages):
+        """Build uid-tagged email data dicts from _fetch_uid_range() results.
+
+        Messages whose full RFC822 fetch returned nothing, e.g. because they
+        were expunged in between, are skipped.
+        """
+        parts = []
+        uids = []
+        for uid, fetched in messages:
+            if 'raw' in fetched:
+                if not fetched['raw']:
+                    logger.warning(f"No message body returned for UID {uid}, skipping it")
+                    continue
+                parts.append(self._split_message(fetched['raw']))
+            else:
+                headers = self._parse_headers(email.message_from_bytes(fetched['headers']))
+                parts.append((headers, fetched['pdfs']))
+            uids.append(uid)
+
+        emails = self._build_emails(parts)
+        for uid, email_data in zip(uids, emails):
+            email_data["uid"] = uid
+        return emails
 
-                email_data = {
-                    "subject": subject,
-                    "from": sender,
-                    "date": date,
-                    "has_pdf": has_pdf,
-                    "pdf_emails": pdf_emails
-                }
+    def search_new_uids(self, mailbox="INBOX", uidvalidity=None, last_uid=0):
+        """List the UIDs of messages that arrived after ``last_uid``.
 
-                return True, email_data
+        On the first sync, or when the server reports a different UIDVALIDITY,
+        the UID history is no longer meaningful and only the newest message is
+        listed.  Returns ``(uidvalidity, last_uid, uids)`` with the new
+        watermark.
+        """
+        with self.pool.connection(mailbox) as imap:
+            current_validity, uidnext = self._mailbox_status(imap, mailbox)
+            if uidvalidity != current_validity:
+                logger.info(f"UIDVALIDITY for {mailbox} is {current_validity}, resetting sync state")
+                last_uid = max(uidnext - 2, 0)
+            if uidnext - 1 <= last_uid:
+                return current_validity, last_uid, []
+
+            status, data = imap.uid('SEARCH', f"UID {last_uid + 1}:*")
+            if status != 'OK':
+                raise Exception(f"Failed to search messages: {data}")
+            # "n:*" returns the newest message even if it is below n
+            uids = sorted(uid for uid in (int(token) for token in b' '.join(data or []).split()) if uid > last_uid)
+            return current_validity, max(uids, default=last_uid), uids
+
+    def fetch_uids(self, mailbox, uids, uidvalidity=None):
+        """Fetch the messages with the given UIDs.
+
+        Returns ``(success, result)`` where ``result`` carries the server's
+        ``uidvalidity``, the parsed ``emails``, each tagged with its ``uid``,
+        and ``errors``, a ``{uid: error}`` dict of messages that could not be
+        fetched whole or parsed.  UIDs no longer on the server appear in neither.  Nothing is
+        fetched if the server's UIDVALIDITY differs from ``uidvalidity``.
+        Failures are not retried here; the ingestion queue schedules that.
+        """
+        try:
+            with self.pool.connection(mailbox) as imap:
+                current_validity, _ = self._mailbox_status(imap, mailbox)
+                messages = []
+                if uids and uidvalidity in (None, current_validity):
+                    wanted = set(uids)
+                    messages = self._fetch_messages(imap, format_uid_set(wanted), wanted.__contains__)
+        except Exception as e:
+            logger.error(f"Error fetching messages from {mailbox}: {str(e)}")
+            return False, {"error": str(e)}
+
+        # Retried by the queue, and dead-lettered if the body never comes back
+        errors = {uid: "No message body returned" for uid, fetched in messages
+                  if 'raw' in fetched and not fetched['raw']}
+        try:
+            emails = self._emails_from_fetched(messages)
+        except Exception:
+            # Parse one at a time so a single bad message does not fail the rest
+            emails = []
+            for message in messages:
+                try:
+                    emails.extend(self._emails_from_fetched([message]))
+                except Exception as e:
+                    logger.error(f"Error parsing message UID {message[0]}: {str(e)}")
+                    errors[message[0]] = str(e)
+        return True, {"uidvalidity": current_validity, "emails": emails, "errors": errors}
+
+    def fetch_uid_range(self, mailbox, first_uid, last_uid):
+        """Fetch every message with a UID in ``first_uid..last_uid``.
+
+        Used to backfill mailbox history.  Returns ``(success, result)`` where
+        ``result`` carries the server's ``uidvalidity``/``uidnext`` and the
+        parsed ``emails``, each tagged with its ``uid``.
+        """
+        max_retries = 3
+        retry_delay = 2
+
+        for attempt in range(max_retries):
+            try:
+                with self.pool.connection(mailbox) as imap:
+                    uidvalidity, uidnext = self._mailbox_status(imap, mailbox)
+                    messages = []
+                    if first_uid < uidnext:
+                        messages = self._fetch_uid_range(imap, first_uid, min(last_uid, uidnext - 1))
+
+                emails = self._emails_from_fetched(messages)
+                return True, {"uidvalidity": uidvalidity, "uidnext": uidnext, "emails": emails}
 
             except Exception as e:
                 logger.error(f"Error on attempt {attempt + 1}: {str(e)}")
                 if attempt == max_retries - 1:
                     return False, {"error": str(e)}
                 time.sleep(retry_delay * (attempt + 1))
-                self._connect()  # Try reconnecting
 
-    def test_connection(self):
-        """Test IMAP connection with improved error reporting"""
-        try:
-            success, error = self._connect()
-            if not success:
-                return False, f"Connection failed: {error}"
-            
-            self._disconnect()
-            return True, "Successfully connected to email server"
-        except Exception as e:
-            logger.error(f"Error testing connection: {str(e)}")
-            return False, f"Error testing connection: {str(e)}"
+    def mailbox_status(self, mailbox="INBOX"):
+        """Return the server's (UIDVALIDITY, UIDNEXT) for a mailbox"""
+        with self.pool.connection(mailbox) as imap:
+            return self._mailbox_status(imap, mailbox)
+
+    def idle(self, mailbox="INBOX", timeout=IDLE_TIMEOUT, stop=None):
+        """Wait in IMAP IDLE until new mail arrives in ``mailbox``.
+
+        Returns True when the server reported new messages, False after
+        ``timeout`` seconds or once the ``stop`` event is set, and None if
+        the server does not support IDLE.
+        """
+        with self._idler_lock:
+            imap = self._idle_session(mailbox)
+            try:
+                changed = self._idle(imap, timeout, stop)
+                if changed is None:
+                    # Not used again, the caller polls instead
+                    self._close_idler()
+                return changed
+            except BaseException:
+                # Reconnected on the next call
+                self._close_idler()
+                raise
+
+    def _idle(self, imap, timeout, stop):
+        if 'IDLE' not in imap.capabilities:
+            return None
+
+        tag = imap._new_tag()
+        imap.send(tag + b' IDLE\r\n')
+        line = imap.readline()
+        if not line.startswith(b'+'):
+            raise imaplib.IMAP4.error(f"IDLE rejected: {line.decode(errors='replace').strip()}")
+
+        changed = False
+        deadline = time.monotonic() + timeout
+        sock = imap.sock
+        # Lines already read off the socket are invisible to select
+        buffered = getattr(imap.file, 'buffered', None)
+        while not changed and not (stop and stop.is_set()):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            # Wake up every second to notice the stop event
+            ready = buffered() if buffered is not None else isinstance(sock, ssl.SSLSocket) and sock.pending()
+            if ready or select.select([sock], [], [], min(remaining, 1))[0]:
+                line = imap.readline()
+                if not line:
+                    raise imaplib.IMAP4.abort("IMAP server closed the connection during IDLE")
+                changed = bool(_EXISTS.match(line))
+
+        imap.send(b'DONE\r\n')
+        while True:
+            line = imap.readline()
+            if not line:
+                raise imaplib.IMAP4.abort("IMAP server closed the connection during IDLE")
+            if line.startswith(tag + b' '):
+                if not line[len(tag) + 1:].upper().startswith(b'OK'):
+                    raise imaplib.IMAP4.error(f"IDLE failed: {line.decode(errors='replace').strip()}")
+                return changed
+            changed = changed or bool(_EXISTS.match(line))
+
@@ -0,0 +1,51 @@
+"""Encryption of secrets stored in the database.
+
+Mailbox passwords are stored as Fernet tokens (AES-128-CBC with an
+HMAC-SHA256) by the ``EncryptedString`` column type.  The key is derived
+from MAILBOX_ENCRYPTION_KEY, which should be a long random value.  To
+rotate it, put the new value first and keep the old one after a comma until
+``flask reencrypt-mailboxes`` has run: the first value encrypts, every value
+decrypts.
+"""
+import os
+import base64
+import hashlib
+
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
+from sqlalchemy.types import String, TypeDecorator
+
+KEY_VARIABLE = 'MAILBOX_ENCRYPTION_KEY'
+
+_fernets = {}
+
+def _fernet():
+    secrets = os.environ.get(KEY_VARIABLE, '')
+    fernet = _fernets.get(secrets)
+    if fernet is None:
+        keys = [secret.strip() for secret in secrets.split(',') if secret.strip()]
+        if not keys:
+            raise RuntimeError(f"{KEY_VARIABLE} must be set to store or read mailbox passwords")
+        fernet = _fernets[secrets] = MultiFernet([
+            Fernet(base64.urlsafe_b64encode(hashlib.sha256(key.encode()).digest())) for key in keys
+        ])
+    return fernet
+
+def encrypt(value):
+    return _fernet().encrypt(value.encode()).decode()
+
+def decrypt(token):
+    try:
+        return _fernet().decrypt(token.encode()).decode()
+    except InvalidToken:
+        raise ValueError(f"Cannot decrypt a stored secret; {KEY_VARIABLE} does not hold the key it was encrypted with")
+
+class EncryptedString(TypeDecorator):
+    """String column whose values are encrypted at rest"""
+    impl = String
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else encrypt(value)
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else decrypt(value)
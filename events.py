@@ -0,0 +1,135 @@
+"""New-mail notifications for the browser.
+
+Ingestion bumps the ``email`` TableVersion in the same transaction as the
+rows it stores.  Each web process runs one watcher thread, only while at
+least one /api/events stream is open, that wakes the streams when the
+version changes: on PostgreSQL through LISTEN/NOTIFY, elsewhere by reading
+the version row once per ``poll_interval``.  Open dashboards therefore cost
+nothing per tab, and nothing at all when no tab is open.
+
+Each stream does hold a web worker thread, so the stream is only served
+where EVENTS_STREAM enables it; elsewhere dashboards poll the versioned
+/api/events/version, which is answered with a 304 until the version changes.
+"""
+import select
+import logging
+import threading
+
+from sqlalchemy.sql import text
+
+from models.models import TableVersion
+
+logger = logging.getLogger(__name__)
+
+EMAIL_VERSION = 'email'
+NOTIFY_CHANNEL = 'email_events'
+
+def bump_email_version(session):
+    """Mark emails as changed; call before committing stored or deleted emails"""
+    TableVersion.bump(session, EMAIL_VERSION)
+    if session.connection().dialect.name == 'postgresql':
+        # Delivered to listeners when the transaction commits
+        session.execute(text("SELECT pg_notify(:channel, '')"), {'channel': NOTIFY_CHANNEL})
+
+class EmailEvents:
+    def __init__(self, app=None, db=None, poll_interval=1.0):
+        self.poll_interval = poll_interval
+        self._condition = threading.Condition()
+        self._subscribers = 0
+        self._version = None
+        self._thread = None
+        self.app = None
+        self.db = None
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        self.app = app
+        self.db = db
+
+    def _read_version(self):
+        with self.app.app_context():
+            try:
+                return TableVersion.get(self.db.session, EMAIL_VERSION)
+            finally:
+                self.db.session.remove()
+
+    def _set_version(self, version):
+        with self._condition:
+            if version != self._version:
+                self._version = version
+                self._condition.notify_all()
+
+    def version(self):
+        """Return the latest known email version"""
+        with self._condition:
+            version = self._version
+            running = self._thread is not None
+        if version is None or not running:
+            version = self._read_version()
+            self._set_version(version)
+        return version
+
+    def wait(self, version, timeout):
+        """Block until the email version differs from ``version``; returns the current version"""
+        with self._condition:
+            self._subscribers += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='email-events', daemon=True)
+                self._thread.start()
+            try:
+                self._condition.wait_for(lambda: self._version is not None and self._version != version, timeout)
+                return self._version if self._version is not None else version
+            finally:
+                self._subscribers -= 1
+
+    def _has_subscribers(self):
+        with self._condition:
+            if self._subscribers:
+                return True
+            self._thread = None
+            return False
+
+    def _run(self):
+        try:
+            with self.app.app_context():
+                postgresql = self.db.engine.dialect.name == 'postgresql'
+            if postgresql:
+                self._listen()
+            else:
+                self._poll()
+        except Exception as e:
+            logger.error(f"Email event watcher failed: {str(e)}")
+            with self._condition:
+                self._thread = None
+                self._condition.notify_all()
+
+    def _poll(self):
+        while True:
+            self._set_version(self._read_version())
+            with self._condition:
+                self._condition.wait(self.poll_interval)
+            if not self._has_subscribers():
+                return
+
+    def _listen(self):
+        with self.app.app_context():
+            connection = self.db.engine.raw_connection()
+        # Autocommit would leak into the pool; this connection is closed for good
+        connection.detach()
+        try:
+            dbapi_connection = connection.connection
+            dbapi_connection.autocommit = True
+            cursor = dbapi_connection.cursor()
+            cursor.execute(f"LISTEN {NOTIFY_CHANNEL}")
+            # Read after LISTEN so no notification falls in between
+            self._set_version(self._read_version())
+            while self._has_subscribers():
+                if select.select([dbapi_connection], [], [], 5)[0]:
+                    dbapi_connection.poll()
+                    if dbapi_connection.notifies:
+                        dbapi_connection.notifies.clear()
+                        self._set_version(self._read_version())
+            cursor.execute(f"UNLISTEN {NOTIFY_CHANNEL}")
+        finally:
+            connection.close()
@@ -0,0 +1,106 @@
+"""Conditional requests and compression for the JSON API.
+
+Routes decorated with ``versioned`` derive their ETag from TableVersion
+stamps, which writers bump in the same transaction as their changes.  A
+request whose If-None-Match still matches is answered with an empty 304
+after one primary-key lookup, without running the view.  Last-Modified is
+not used: HTTP dates have whole-second precision, so a change in the same
+second as the previous response would be reported as unmodified.  Responses are sent with
+``private, no-cache`` so browsers keep them but revalidate every time.
+Concurrent misses for the same tag, as when every open tab reloads after
+the same new-mail event, share one run of the view (see ``single_flight``).
+
+``HttpCache`` also compresses large JSON responses with gzip, or with
+brotli when the optional ``brotli`` package is installed, and marks
+unversioned API responses ``no-store``.
+"""
+import gzip
+import hashlib
+import logging
+from functools import wraps
+
+from flask import make_response, request
+
+from models.models import TableVersion, db
+from single_flight import render_shared
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Bodies smaller than this are not worth compressing
+COMPRESS_MIN_SIZE = 1024
+
+# Seconds a rendered response is shared with requests carrying the same tag
+SHARE_WINDOW = 1.0
+
+def versioned(*names):
+    """Make a GET view conditional on the given TableVersion stamps"""
+    def decorator(view):
+        @wraps(view)
+        def decorated(*args, **kwargs):
+            try:
+                stamps = TableVersion.get_many(db.session, names)
+            except Exception as e:
+                logger.error(f"Error reading table versions: {str(e)}")
+                return view(*args, **kwargs)
+
+            # The query string selects the page, so it is part of the tag
+            key = ':'.join([request.endpoint, request.full_path] + [str(stamps[name][0]) for name in names])
+            etag = hashlib.sha1(key.encode()).hexdigest()
+
+            if request.if_none_match.contains_weak(etag):
+                response = make_response('', 304)
+            else:
+                response = render_shared(('versioned', etag), lambda: view(*args, **kwargs), window=SHARE_WINDOW)
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag, weak=True)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return decorated
+    return decorator
+
+class HttpCache:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.after_request(self._after_request)
+
+    def _after_request(self, response):
+        if 'Cache-Control' not in response.headers and (
+                request.path.startswith('/api/') or request.path == '/check-latest'):
+            response.headers['Cache-Control'] = 'no-store'
+        return self._compress(response)
+
+    def _compress(self, response):
+        if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+                or 'Content-Encoding' in response.headers or response.mimetype != 'application/json'):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        data = response.get_data()
+        if len(data) < COMPRESS_MIN_SIZE:
+            return response
+
+        accepted = request.accept_encodings
+        if brotli is not None and accepted['br']:
+            response.set_data(brotli.compress(data))
+            response.headers['Content-Encoding'] = 'br'
+        elif accepted['gzip']:
+            response.set_data(gzip.compress(data, compresslevel=6))
+            response.headers['Content-Encoding'] = 'gzip'
+        else:
+            return response
+
+        # A strong ETag would claim byte equality with the uncompressed body
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
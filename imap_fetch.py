@@ -0,0 +1,213 @@
+"""Parsing helpers for partial IMAP FETCH responses.
+
+imaplib hands back FETCH responses as a flat list of byte strings and
+``(prefix, literal)`` tuples.  These helpers turn that into one dict per
+message, and walk BODYSTRUCTURE to find PDF attachments, so only their MIME
+parts have to be downloaded.
+"""
+import re
+import base64
+import quopri
+import logging
+from email.header import decode_header
+from email.utils import decode_rfc2231
+from urllib.parse import unquote
+
+logger = logging.getLogger(__name__)
+
+PDF_CONTENT_TYPES = ('application/pdf', 'application/x-pdf')
+
+_LITERAL_MARKER = re.compile(rb'\{\d+\}$')
+_ORIGIN = re.compile(r'<\d+>$')
+
+class _Literal(bytes):
+    """String data from a FETCH response; never equal to a '(' or ')' token"""
+
+def _tokenize(msg_data):
+    tokens = []
+    for item in msg_data:
+        if isinstance(item, tuple):
+            prefix, literal = item[0], item[1]
+            _tokenize_text(_LITERAL_MARKER.sub(b'', prefix.rstrip()), tokens)
+            tokens.append(_Literal(literal))
+        elif isinstance(item, bytes):
+            _tokenize_text(item, tokens)
+    return tokens
+
+def _tokenize_text(text, tokens):
+    i, length = 0, len(text)
+    while i < length:
+        char = text[i:i + 1]
+        if char in b' \t\r\n':
+            i += 1
+        elif char in b'()':
+            tokens.append(char.decode())
+            i += 1
+        elif char == b'"':
+            i += 1
+            value = bytearray()
+            while i < length and text[i:i + 1] != b'"':
+                if text[i:i + 1] == b'\\':
+                    i += 1
+                value += text[i:i + 1]
+                i += 1
+            tokens.append(_Literal(bytes(value)))
+            i += 1
+        else:
+            start = i
+            depth = 0
+            while i < length:
+                char = text[i:i + 1]
+                if char == b'[':
+                    depth += 1
+                elif char == b']':
+                    depth -= 1
+                elif depth == 0 and char in b' \t\r\n()':
+                    break
+                i += 1
+            atom = text[start:i].decode('utf-8', errors='replace')
+            tokens.append(None if atom.upper() == 'NIL' else atom)
+
+def _parse_list(tokens, index):
+    """Parse a parenthesized list starting after '('; returns (list, next index)"""
+    items = []
+    while index < len(tokens):
+        token = tokens[index]
+        if token == '(':
+            value, index = _parse_list(tokens, index + 1)
+            items.append(value)
+        elif token == ')':
+            return items, index + 1
+        else:
+            items.append(token)
+            index += 1
+    return items, index
+
+def parse_fetch_response(msg_data):
+    """Return one dict per message mapping FETCH item names to values.
+
+    Item names are upper-cased, e.g. ``UID``, ``BODYSTRUCTURE``,
+    ``BODY[HEADER.FIELDS (SUBJECT FROM)]`` or ``BODY[2]``.
+    """
+    tokens = _tokenize(msg_data)
+    messages = []
+    index = 0
+    while index < len(tokens):
+        if tokens[index] == '(':
+            items, index = _parse_list(tokens, index + 1)
+            message = {}
+            for position in range(0, len(items) - 1, 2):
+                name = items[position]
+                if isinstance(name, str):
+                    message[_ORIGIN.sub('', name.upper())] = items[position + 1]
+            messages.append(message)
+        else:
+            index += 1
+    return messages
+
+def fetch_item(message, prefix):
+    """Return the first item whose name starts with ``prefix``"""
+    for name, value in message.items():
+        if name.startswith(prefix):
+            return value
+    return None
+
+def _text(value):
+    if value is None:
+        return ''
+    if isinstance(value, bytes):
+        return value.decode('utf-8', errors='replace')
+    return str(value)
+
+def _params(value):
+    """Turn a BODYSTRUCTURE parameter list into a lower-cased dict"""
+    if not isinstance(value, list):
+        return {}
+    return {_text(value[i]).lower(): _text(value[i + 1]) for i in range(0, len(value) - 1, 2)}
+
+def _decode_filename(params):
+    if 'filename*' in params or 'name*' in params:
+        raw = params.get('filename*') or params.get('name*')
+        try:
+            # charset'language'percent-encoded value
+            charset, _, value = decode_rfc2231(raw)
+            return unquote(value, encoding=charset or 'utf-8', errors='replace')
+        except Exception:
+            return raw
+    raw = params.get('filename') or params.get('name') or ''
+    try:
+        return ''.join(
+            part.decode(encoding or 'utf-8', errors='replace') if isinstance(part, bytes) else part
+            for part, encoding in decode_header(raw)
+        )
+    except Exception:
+        return raw
+
+def find_pdf_parts(structure, prefix=''):
+    """Return ``(part_number, filename, encoding)`` for every PDF attachment.
+
+    Mirrors the RFC822 walk: a part counts when it has a Content-Disposition
+    and either a .pdf filename or a PDF content type.  Raises ValueError on
+    a structure that cannot be interpreted.
+    """
+    if not isinstance(structure, list) or not structure:
+        raise ValueError("Invalid BODYSTRUCTURE")
+
+    if isinstance(structure[0], list):
+        # multipart: child parts, then the subtype and extension data
+        parts = []
+        number = 0
+        for child in structure:
+            if not isinstance(child, list):
+                break
+            number += 1
+            parts.extend(find_pdf_parts(child, f"{prefix}{number}."))
+        return parts
+
+    part_number = prefix[:-1] if prefix else '1'
+    content_type = f"{_text(structure[0])}/{_text(structure[1])}".lower()
+    encoding = _text(structure[5]).lower() if len(structure) > 5 else ''
+
+    if content_type == 'message/rfc822' and len(structure) > 8 and isinstance(structure[8], list) and structure[8]:
+        # A forwarded message: a multipart body numbers its children n.1, n.2,
+        # a single-part body is n.1
+        body = structure[8]
+        return find_pdf_parts(body, f"{part_number}." if isinstance(body[0], list) else f"{part_number}.1.")
+
+    if content_type.startswith('text/'):
+        extension = 8
+    elif content_type == 'message/rfc822':
+        extension = 10
+    else:
+        extension = 7
+    disposition = structure[extension + 1] if len(structure) > extension + 1 else None
+    if not isinstance(disposition, list) or not disposition:
+        return []
+
+    params = _params(structure[2])
+    params.update(_params(disposition[1] if len(disposition) > 1 else None))
+    filename = _decode_filename(params)
+    if (filename and filename.lower().endswith('.pdf')) or content_type in PDF_CONTENT_TYPES:
+        return [(part_number, filename, encoding)]
+    return []
+
+def decode_part(data, encoding):
+    """Undo the Content-Transfer-Encoding of a fetched MIME part"""
+    if data is None:
+        return b''
+    data = bytes(data)
+    if encoding == 'base64':
+        return base64.b64decode(data)
+    if encoding == 'quoted-printable':
+        return quopri.decodestring(data)
+    return data
+
+def format_uid_set(uids):
+    """Format UIDs as an IMAP sequence set, collapsing runs: 1:3,7,9:10"""
+    ranges = []
+    for uid in sorted(set(uids)):
+        if ranges and uid == ranges[-1][1] + 1:
+            ranges[-1][1] = uid
+        else:
+            ranges.append([uid, uid])
+    return ','.join(str(first) if first == last else f"{first}:{last}" for first, last in ranges)
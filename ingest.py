@@ -0,0 +1,413 @@
+"""Background mailbox ingestion worker.
+
+Owns the EmailMonitor and writes new emails to the database so the web
+workers never talk to the IMAP server.  Run it next to the web process:
+
+    python ingest.py              # sync whenever IMAP IDLE reports new mail
+    python ingest.py --no-idle    # poll every INGEST_INTERVAL seconds instead
+    python ingest.py --once       # single sync, e.g. from a scheduled task
+
+Several workers may run for the same mailbox, on one host or many; the one
+holding the mailbox's lease (see ``leases``) queues its new messages and the
+others help store them (see ``ingest_queue``) while standing by to take over
+when it stops renewing.
+"""
+import os
+import sys
+import time
+import signal
+import logging
+import argparse
+import threading
+from datetime import datetime
+
+import pytz
+
+from app import app
+from company_resolver import company_resolver
+from email_utils import EmailMonitor, IDLE_TIMEOUT, PDF_MAX_BYTES, PDF_MAX_PAGES, PDF_TIME_BUDGET
+import ingest_queue
+from events import bump_email_version
+from leases import LEASE_TTL, LeaseKeeper
+from pdf_cache import PdfCache
+from pdf_pool import PdfExtractionPool
+from stats import count_emails, count_imap_pool
+from models.models import db, Email, EmailPdfAddress, MailboxSyncState
+
+logger = logging.getLogger(__name__)
+
+# Queued messages fetched and stored per transaction
+SYNC_BATCH_SIZE = 100
+
+def build_pdf_pool():
+    """Create the PDF extraction process pool, or None if PDF_WORKERS is 0"""
+    workers = int(os.environ.get('PDF_WORKERS', '2'))
+    if workers <= 0:
+        return None
+    return PdfExtractionPool(
+        max_workers=workers,
+        timeout=float(os.environ.get('PDF_JOB_TIMEOUT', '30'))
+    )
+
+def build_pdf_cache():
+    """Create the PDF extraction cache, or None if PDF_CACHE_MAX_ENTRIES is 0"""
+    max_entries = int(os.environ.get('PDF_CACHE_MAX_ENTRIES', '10000'))
+    if max_entries <= 0:
+        return None
+    return PdfCache(db.session, max_entries=max_entries)
+
+def build_email_monitor(pdf_pool=None, pdf_cache=None):
+    """Create the EmailMonitor from environment configuration"""
+    required_env_vars = ['EMAIL_USERNAME', 'EMAIL_PASSWORD', 'EMAIL_SERVER']
+    missing_vars = [var for var in required_env_vars if not os.environ.get(var)]
+
+    if missing_vars:
+        error_msg = f"Missing required environment variables: {', '.join(missing_vars)}"
+        logger.error(error_msg)
+        raise ValueError(error_msg)
+
+    return EmailMonitor(
+        username=os.environ.get('EMAIL_USERNAME'),
+        password=os.environ.get('EMAIL_PASSWORD'),
+        server=os.environ.get('EMAIL_SERVER'),
+        pool_size=int(os.environ.get('IMAP_POOL_SIZE', '2')),
+        pdf_max_pages=int(os.environ.get('PDF_MAX_PAGES', PDF_MAX_PAGES)),
+        pdf_max_bytes=int(os.environ.get('PDF_MAX_BYTES', PDF_MAX_BYTES)),
+        pdf_time_budget=float(os.environ.get('PDF_TIME_BUDGET', PDF_TIME_BUDGET)),
+        pdf_pool=pdf_pool,
+        pdf_cache=pdf_cache
+    )
+
+def email_values(session, data):
+    """Return the Email column values for fetched email data"""
+    values = {
+        'message_id': data.get('message_id'),
+        'sender': data['from'],
+        'subject': data.get('subject', ''),
+        'has_pdf': data.get('has_pdf', False),
+        'company_id': None
+    }
+
+    # Parse date with timezone handling
+    if data.get('date'):
+        try:
+            email_date = datetime.strptime(str(data['date']), '%a, %d %b %Y %H:%M:%S %z')
+            values['date'] = email_date.astimezone(pytz.UTC)
+        except (ValueError, TypeError) as e:
+            logger.error(f"Date parsing error: {str(e)}")
+            values['date'] = datetime.now(pytz.UTC)
+    else:
+        values['date'] = datetime.now(pytz.UTC)
+
+    # Match the sender and the addresses found in PDFs against the companies
+    values['company_id'] = company_resolver.match(session, data.get('from'), pdf_addresses(data))
+    return values
+
+def pdf_addresses(data):
+    """Return the distinct lower-cased PDF addresses of fetched email data"""
+    return list(dict.fromkeys(address.strip().lower() for address in data.get('pdf_emails') or []))
+
+def store_email(session, data):
+    """Add an Email record for fetched email data, skipping duplicates.
+
+    Returns the new record, or None if the email is already stored.  The
+    caller is responsible for committing.
+    """
+    if data.get('message_id'):
+        existing_email = session.query(Email).filter_by(message_id=data['message_id']).first()
+    else:
+        existing_email = session.query(Email).filter_by(
+            sender=data['from'],
+            subject=data.get('subject', '')
+        ).first()
+
+    if existing_email:
+        logger.info("Email already exists in database")
+        return None
+
+    email_record = Email(**email_values(session, data))
+    email_record.pdf_addresses = [EmailPdfAddress.for_address(address) for address in pdf_addresses(data)]
+    session.add(email_record)
+    count_emails(session, 1, with_pdf=1 if email_record.has_pdf else 0)
+    return email_record
+
+def pdf_extraction_failed(data):
+    """Whether a PDF job of fetched email data did not finish, e.g. timed out"""
+    return any(attachment.get('failed') for attachment in data.get('pdf_attachments') or [])
+
+def sync_mailbox(session, monitor, mailbox='INBOX', state_key=None, owner=None, batch_size=SYNC_BATCH_SIZE):
+    """Queue the messages that arrived since the last sync, then ingest a batch of due jobs.
+
+    ``state_key`` names the MailboxSyncState row and defaults to the mailbox
+    name.  Only the process holding the mailbox's lease should call this.
+    Returns ``(new_emails, has_more)``: the newly stored email data dicts,
+    and whether more queued messages are due.
+    """
+    state_key = state_key or mailbox
+    state = session.query(MailboxSyncState).filter_by(mailbox=state_key).first()
+    if not state:
+        state = MailboxSyncState(mailbox=state_key, last_uid=0, backfill_uid=0)
+        session.add(state)
+
+    now = datetime.utcnow()
+    try:
+        uidvalidity, last_uid, uids = monitor.search_new_uids(
+            mailbox,
+            uidvalidity=state.uidvalidity,
+            last_uid=state.last_uid or 0
+        )
+    except Exception as e:
+        logger.error(f"Failed to check new emails: {str(e)}")
+        state.last_checked_at = now
+        state.last_error = str(e)
+        session.commit()
+        return [], False
+
+    try:
+        # Advance the watermark in the same transaction as the new jobs
+        if state.uidvalidity != uidvalidity:
+            ingest_queue.discard_stale(session, state_key, uidvalidity)
+            state.backfill_uid = 0
+        ingest_queue.enqueue(session, state_key, uidvalidity, uids)
+        state.uidvalidity = uidvalidity
+        state.last_uid = last_uid
+        state.last_checked_at = now
+        state.last_error = None
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+
+    return process_jobs(session, monitor, mailbox, state_key, owner=owner, batch_size=batch_size)
+
+def _server_answers(monitor, mailbox):
+    """Whether the server still selects ``mailbox``"""
+    try:
+        monitor.mailbox_status(mailbox)
+        return True
+    except Exception as e:
+        logger.error(f"IMAP server does not answer for {mailbox}: {str(e)}")
+        return False
+
+def _bisect_fetch(monitor, mailbox, uids, uidvalidity, error):
+    """Fetch ``uids``, whose batch fetch failed with ``error``, in halves.
+
+    Halves that fail are split again, so only the UIDs that fail on their
+    own end up in the returned ``errors``.
+    """
+    if len(uids) == 1:
+        return {'emails': [], 'errors': {uids[0]: error}}
+    result = {'emails': [], 'errors': {}}
+    middle = len(uids) // 2
+    for half in (uids[:middle], uids[middle:]):
+        success, data = monitor.fetch_uids(mailbox, half, uidvalidity=uidvalidity)
+        if not success:
+            data = _bisect_fetch(monitor, mailbox, half, uidvalidity, data.get('error', 'Unknown error occurred'))
+        result['emails'].extend(data['emails'])
+        result['errors'].update(data['errors'])
+    return result
+
+def process_jobs(session, monitor, mailbox='INBOX', state_key=None, owner=None, batch_size=SYNC_BATCH_SIZE):
+    """Claim a batch of a mailbox's due jobs, fetch their messages and store them.
+
+    Any number of workers may run this at the same time.  Each message is
+    stored in its own savepoint, so one that fails is retried later without
+    holding up the rest.  A batch the server fails to fetch while it still
+    answers is bisected, so only the UIDs that break the fetch count an
+    attempt.  Returns ``(new_emails, has_more)`` like sync_mailbox().
+    """
+    state_key = state_key or mailbox
+    uidvalidity = session.query(MailboxSyncState.uidvalidity).filter_by(mailbox=state_key).scalar()
+    if uidvalidity is None:
+        return [], False
+    jobs = ingest_queue.claim(session, state_key, uidvalidity, owner or 'ingest', limit=batch_size)
+    if not jobs:
+        return [], False
+
+    uids = [job.uid for job in jobs]
+    success, data = monitor.fetch_uids(mailbox, uids, uidvalidity=uidvalidity)
+    if not success and _server_answers(monitor, mailbox):
+        # Some message breaks the fetch; releasing the batch would retry it forever
+        error = data.get('error', 'Unknown error occurred')
+        logger.warning(f"Fetching {len(uids)} message(s) of {state_key} failed, retrying them in smaller batches: {error}")
+        success, data = True, _bisect_fetch(monitor, mailbox, uids, uidvalidity, error)
+    try:
+        if not success:
+            # The server, not the messages, is the problem: try again later
+            ingest_queue.release(session, jobs, data.get('error', 'Unknown error occurred'))
+            session.commit()
+            return [], False
+
+        emails = {email_data['uid']: email_data for email_data in data['emails']}
+        new_emails = []
+        for job in jobs:
+            email_data = emails.get(job.uid)
+            if job.uid in data['errors']:
+                ingest_queue.fail(session, job, data['errors'][job.uid])
+                continue
+            if email_data is None:
+                # Expunged, or the mailbox was recreated; nothing left to store
+                ingest_queue.complete(session, job)
+                continue
+            if pdf_extraction_failed(email_data) and job.attempts + 1 < ingest_queue.MAX_ATTEMPTS:
+                # The last attempt stores the email with whatever was extracted
+                ingest_queue.fail(session, job, "PDF extraction did not finish")
+                continue
+            try:
+                with session.begin_nested():
+                    stored = store_email(session, email_data)
+            except Exception as e:
+                logger.error(f"Error storing UID {job.uid}: {str(e)}")
+                ingest_queue.fail(session, job, str(e))
+                continue
+            ingest_queue.complete(session, job)
+            if stored:
+                new_emails.append(email_data)
+
+        if new_emails:
+            session.query(MailboxSyncState).filter_by(mailbox=state_key).update(
+                {MailboxSyncState.last_ingested_at: datetime.utcnow()}, synchronize_session=False
+            )
+            bump_email_version(session)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+
+    if new_emails:
+        logger.info(f"Saved {len(new_emails)} new email record(s) from {state_key}")
+    return new_emails, len(jobs) >= batch_size
+
+def record_pool_stats(session, monitor):
+    """Add the monitor's IMAP pool counters since the last call to the /api/stats totals"""
+    try:
+        if count_imap_pool(session, monitor.unreported_pool_stats()):
+            session.commit()
+    except Exception as e:
+        # Like the PDF cache statistics, counts that cannot be written are dropped
+        session.rollback()
+        logger.error(f"Error recording IMAP pool statistics: {str(e)}")
+
+def wait_for_mail(monitor, mailbox, interval, stop, timeout=IDLE_TIMEOUT):
+    """Wait in IMAP IDLE until new mail arrives, for at most ``timeout`` seconds.
+
+    Sleeps ``interval`` seconds instead when IDLE fails, and returns False if
+    the server does not support IDLE at all.
+    """
+    try:
+        if monitor.idle(mailbox, timeout=timeout, stop=stop) is not None:
+            return True
+        logger.info("IMAP server does not support IDLE, polling instead")
+        stop.wait(interval)
+        return False
+    except Exception as e:
+        logger.error(f"Error during IMAP IDLE: {str(e)}")
+        stop.wait(interval)
+        return True
+
+def seconds_until_due(mailbox, limit):
+    """Seconds until a queued retry of the mailbox is due, at least one and at most ``limit``"""
+    try:
+        return max(1, ingest_queue.seconds_until_due(db.session, mailbox, limit))
+    except Exception as e:
+        logger.error(f"Error reading the ingestion queue: {str(e)}")
+        return limit
+    finally:
+        db.session.remove()
+
+def run(mailbox='INBOX', interval=10, once=False, use_idle=True, lease_ttl=LEASE_TTL):
+    """Sync the mailbox whenever IMAP IDLE reports new mail, or every ``interval`` seconds,
+    while this process holds the mailbox's lease.  Otherwise help drain its queue."""
+    pdf_pool = build_pdf_pool()
+    pdf_cache = build_pdf_cache()
+    monitor = build_email_monitor(pdf_pool, pdf_cache)
+    stop = threading.Event()
+    # Ends waits early on shutdown or when the lease is lost
+    interrupt = threading.Event()
+    keeper = LeaseKeeper(app, db, mailbox, ttl=lease_ttl, on_lost=interrupt.set)
+
+    def handle_signal(signum, frame):
+        logger.info(f"Received signal {signum}, stopping ingestion worker")
+        stop.set()
+        interrupt.set()
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+
+    logger.info(f"Ingestion worker started for {mailbox} ({'IDLE' if use_idle else f'interval: {interval}s'})")
+    keeper.start()
+    try:
+        # Give the first lease attempt time to finish
+        keeper.wait(timeout=lease_ttl / 3)
+        with app.app_context():
+            while not stop.is_set():
+                interrupt.clear()
+                if stop.is_set():
+                    break
+                leader = keeper.is_held()
+                if not leader and once:
+                    logger.info(f"Another worker holds the lease for {mailbox}, skipping sync")
+                    break
+
+                started = time.monotonic()
+                has_more = False
+                try:
+                    if leader:
+                        new_emails, has_more = sync_mailbox(db.session, monitor, mailbox, owner=keeper.owner)
+                    else:
+                        # Stand by for the lease, meanwhile draining the queue with the leader
+                        new_emails, has_more = process_jobs(db.session, monitor, mailbox, owner=keeper.owner)
+                    if new_emails and pdf_pool is not None:
+                        logger.info(f"PDF pool stats: {pdf_pool.stats()}")
+                    if pdf_cache is not None and pdf_cache.evict():
+                        db.session.commit()
+                except Exception as e:
+                    logger.error(f"Error during mailbox sync: {str(e)}")
+                    db.session.rollback()
+                finally:
+                    record_pool_stats(db.session, monitor)
+                    db.session.remove()
+
+                if has_more:
+                    continue
+                if once:
+                    break
+                # NOOP pooled sessions the server would otherwise drop while we wait
+                monitor.keepalive()
+                if not leader:
+                    keeper.wait(timeout=seconds_until_due(mailbox, interval))
+                elif use_idle:
+                    use_idle = wait_for_mail(monitor, mailbox, interval, interrupt,
+                                             timeout=seconds_until_due(mailbox, IDLE_TIMEOUT))
+                else:
+                    interrupt.wait(seconds_until_due(mailbox, max(0, interval - (time.monotonic() - started))))
+    finally:
+        keeper.stop()
+        monitor.close()
+        logger.info(f"IMAP pool stats: {monitor.pool_stats()}")
+        if pdf_pool is not None:
+            logger.info(f"PDF pool stats: {pdf_pool.stats()}")
+            pdf_pool.shutdown()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingest new emails from the IMAP mailbox")
+    parser.add_argument('--mailbox', default='INBOX', help="Mailbox to sync (default: INBOX)")
+    parser.add_argument('--interval', type=float,
+                        default=float(os.environ.get('INGEST_INTERVAL', '10')),
+                        help="Seconds between syncs without IDLE (default: INGEST_INTERVAL or 10)")
+    parser.add_argument('--once', action='store_true', help="Run a single sync and exit")
+    parser.add_argument('--no-idle', action='store_true',
+                        default=os.environ.get('INGEST_IDLE', 'true').lower() in ('0', 'false', 'no'),
+                        help="Poll every --interval seconds instead of waiting in IMAP IDLE")
+    parser.add_argument('--lease-ttl', type=float,
+                        default=float(os.environ.get('INGEST_LEASE_TTL', LEASE_TTL)),
+                        help=f"Seconds before another worker may take over the mailbox "
+                             f"(default: INGEST_LEASE_TTL or {LEASE_TTL})")
+    args = parser.parse_args(argv)
+
+    run(mailbox=args.mailbox, interval=args.interval, once=args.once, use_idle=not args.no_idle,
+        lease_ttl=args.lease_ttl)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,198 @@
+"""Durable queue of messages waiting to be ingested.
+
+The process holding a mailbox's lease records every new UID as an IngestJob
+in the same transaction that advances the sync watermark, so a message is
+never forgotten once it has been seen.  Workers then claim due jobs in
+batches: with ``SELECT ... FOR UPDATE SKIP LOCKED`` on PostgreSQL and MySQL,
+so several of them drain a mailbox in parallel without waiting on each
+other, and with guarded updates on SQLite, whose writers are serialized
+anyway.  A job that fails is retried with exponential backoff; after
+``MAX_ATTEMPTS`` it moves to the dead-letter table, from where
+``flask requeue-dead-letters`` puts it back.  Claims expire after
+``CLAIM_TIMEOUT`` seconds, so the jobs of a worker that died are retried.
+Jobs of an earlier UIDVALIDITY can never be fetched; they are discarded
+when the change is noticed and never count as due.
+"""
+import random
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, func, or_, select
+
+from models.models import IngestDeadLetter, IngestJob, MailboxSyncState
+
+logger = logging.getLogger(__name__)
+
+PENDING = 'pending'
+RUNNING = 'running'
+
+MAX_ATTEMPTS = 5
+BACKOFF_BASE = 30  # seconds before the first retry, doubled for each further one
+BACKOFF_MAX = 3600
+CLAIM_TIMEOUT = 300
+
+ENQUEUE_CHUNK = 500
+
+def backoff(attempts):
+    """Seconds to wait before retrying a job that failed ``attempts`` times"""
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempts - 1))
+    # Jitter keeps jobs that failed together from retrying together
+    return delay * random.uniform(0.75, 1.25)
+
+def _due(now):
+    return or_(
+        and_(IngestJob.state == PENDING, IngestJob.next_attempt_at <= now),
+        and_(IngestJob.state == RUNNING, IngestJob.locked_until < now)
+    )
+
+def _current_uidvalidity(mailbox):
+    """The UIDVALIDITY last seen for ``mailbox`` (a column or a value)"""
+    return select(MailboxSyncState.uidvalidity).where(MailboxSyncState.mailbox == mailbox).scalar_subquery()
+
+def enqueue(session, mailbox, uidvalidity, uids):
+    """Add jobs for the UIDs not queued yet; the caller commits"""
+    uids = sorted(set(uids))
+    for start in range(0, len(uids), ENQUEUE_CHUNK):
+        chunk = uids[start:start + ENQUEUE_CHUNK]
+        queued = {uid for (uid,) in session.query(IngestJob.uid).filter(
+            IngestJob.mailbox == mailbox,
+            IngestJob.uidvalidity == uidvalidity,
+            IngestJob.uid.in_(chunk)
+        )}
+        now = datetime.utcnow()
+        jobs = [
+            {'mailbox': mailbox, 'uidvalidity': uidvalidity, 'uid': uid, 'state': PENDING,
+             'attempts': 0, 'next_attempt_at': now, 'created_at': now}
+            for uid in chunk if uid not in queued
+        ]
+        if jobs:
+            session.bulk_insert_mappings(IngestJob, jobs)
+
+def discard_stale(session, mailbox, uidvalidity):
+    """Drop jobs whose UIDs belong to an earlier UIDVALIDITY; the caller commits"""
+    discarded = session.query(IngestJob).filter(
+        IngestJob.mailbox == mailbox,
+        IngestJob.uidvalidity != uidvalidity
+    ).delete(synchronize_session=False)
+    if discarded:
+        logger.info(f"Discarded {discarded} queued message(s) of {mailbox} after a UIDVALIDITY change")
+    return discarded
+
+def claim(session, mailbox, uidvalidity, owner, limit=100, timeout=CLAIM_TIMEOUT):
+    """Claim up to ``limit`` due jobs of a mailbox for ``owner``.
+
+    Commits the claim and returns the jobs in UID order.
+    """
+    now = datetime.utcnow()
+    query = session.query(IngestJob.id).filter(
+        IngestJob.mailbox == mailbox,
+        IngestJob.uidvalidity == uidvalidity,
+        _due(now)
+    ).order_by(IngestJob.uid).limit(limit)
+    values = {
+        IngestJob.state: RUNNING,
+        IngestJob.locked_by: owner,
+        IngestJob.locked_until: now + timedelta(seconds=timeout)
+    }
+
+    if session.connection().dialect.name in ('postgresql', 'mysql'):
+        # Rows locked by other workers' claims are skipped, not waited for
+        ids = [job_id for (job_id,) in query.with_for_update(skip_locked=True)]
+        if ids:
+            session.query(IngestJob).filter(IngestJob.id.in_(ids)).update(values, synchronize_session=False)
+    else:
+        # No row locks: re-check the job is still due while claiming it
+        candidates = [job_id for (job_id,) in query]
+        ids = [job_id for job_id in candidates
+               if session.query(IngestJob).filter(IngestJob.id == job_id, _due(now))
+               .update(values, synchronize_session=False)]
+    session.commit()
+
+    if not ids:
+        return []
+    return session.query(IngestJob).filter(IngestJob.id.in_(ids)).order_by(IngestJob.uid).all()
+
+def complete(session, job):
+    """Remove a finished job; the caller commits"""
+    session.delete(job)
+
+def fail(session, job, error):
+    """Schedule a retry of a failed job, or dead-letter it after MAX_ATTEMPTS.
+
+    Returns whether it will be retried; the caller commits.
+    """
+    job.attempts += 1
+    job.last_error = error
+    if job.attempts >= MAX_ATTEMPTS:
+        logger.error(f"Giving up on UID {job.uid} of {job.mailbox} after {job.attempts} attempts: {error}")
+        session.add(IngestDeadLetter(
+            mailbox=job.mailbox,
+            uidvalidity=job.uidvalidity,
+            uid=job.uid,
+            attempts=job.attempts,
+            last_error=error,
+            created_at=job.created_at
+        ))
+        session.delete(job)
+        return False
+
+    delay = backoff(job.attempts)
+    logger.warning(f"UID {job.uid} of {job.mailbox} failed (attempt {job.attempts}), retrying in {delay:.0f}s: {error}")
+    job.state = PENDING
+    job.locked_by = None
+    job.locked_until = None
+    job.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+    return True
+
+def release(session, jobs, error, delay=BACKOFF_BASE):
+    """Return claimed jobs to the queue without counting an attempt.
+
+    For failures that are not the messages' fault, such as the IMAP server
+    being unreachable.  The caller commits.
+    """
+    retry_at = datetime.utcnow() + timedelta(seconds=delay)
+    for job in jobs:
+        job.state = PENDING
+        job.locked_by = None
+        job.locked_until = None
+        job.last_error = error
+        job.next_attempt_at = retry_at
+
+def seconds_until_due(session, mailbox, limit):
+    """Seconds until the next queued job of a mailbox is due, at most ``limit``"""
+    due = session.query(func.min(func.coalesce(IngestJob.locked_until, IngestJob.next_attempt_at))).filter(
+        IngestJob.mailbox == mailbox,
+        IngestJob.uidvalidity == _current_uidvalidity(mailbox)
+    ).scalar()
+    if due is None:
+        return limit
+    return min(limit, max(0, (due - datetime.utcnow()).total_seconds()))
+
+def due_mailboxes(session, mailboxes):
+    """Return the mailboxes among ``mailboxes`` that have due jobs"""
+    return {mailbox for (mailbox,) in session.query(IngestJob.mailbox).filter(
+        IngestJob.mailbox.in_(list(mailboxes)),
+        IngestJob.uidvalidity == _current_uidvalidity(IngestJob.mailbox),
+        _due(datetime.utcnow())
+    ).distinct()}
+
+def requeue_dead_letters(session, mailbox=None):
+    """Move dead letters back to the queue with fresh attempts; the caller commits.
+
+    Letters of an earlier UIDVALIDITY are deleted instead.  Returns the
+    number requeued.
+    """
+    query = session.query(IngestDeadLetter, MailboxSyncState.uidvalidity).outerjoin(
+        MailboxSyncState, MailboxSyncState.mailbox == IngestDeadLetter.mailbox
+    )
+    if mailbox:
+        query = query.filter(IngestDeadLetter.mailbox == mailbox)
+    requeued = 0
+    for letter, uidvalidity in query.all():
+        if uidvalidity is not None and letter.uidvalidity != uidvalidity:
+            logger.info(f"Discarding dead letter UID {letter.uid} of {letter.mailbox} after a UIDVALIDITY change")
+        else:
+            enqueue(session, letter.mailbox, letter.uidvalidity, [letter.uid])
+            requeued += 1
+        session.delete(letter)
+    return requeued
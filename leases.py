@@ -0,0 +1,144 @@
+"""Leader election through lease rows in the database.
+
+Each mailbox is synced by whichever process holds the lease named after its
+sync key.  The holder renews it every ``ttl / 3`` seconds; when it dies or
+loses the database, the lease expires and another process takes it over on
+its next attempt.  Expiry times come from each host's clock, so hosts need
+roughly synchronized clocks (well within the TTL).
+
+    keeper = LeaseKeeper(app, db, 'INBOX', on_lost=interrupt.set)
+    keeper.start()
+    if keeper.is_held():
+        sync()
+"""
+import os
+import time
+import uuid
+import socket
+import logging
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import case, or_
+from sqlalchemy.exc import IntegrityError
+
+from models.models import Lease
+
+logger = logging.getLogger(__name__)
+
+LEASE_TTL = 30
+
+def lease_owner():
+    """Identify this process across hosts"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+def acquire_lease(session, name, owner, ttl=LEASE_TTL):
+    """Take the lease if it is free or expired, or renew it if ``owner`` holds it.
+
+    Commits and returns whether ``owner`` holds the lease afterwards.
+    """
+    now = datetime.utcnow()
+    values = {
+        Lease.owner: owner,
+        Lease.acquired_at: case((Lease.owner == owner, Lease.acquired_at), else_=now),
+        Lease.heartbeat_at: now,
+        Lease.expires_at: now + timedelta(seconds=ttl)
+    }
+    # The WHERE clause is re-checked under the row lock, so of several
+    # processes racing for an expired lease only the first one wins
+    updated = session.query(Lease).filter(
+        Lease.name == name,
+        or_(Lease.owner == owner, Lease.expires_at < now)
+    ).update(values, synchronize_session=False)
+    if not updated:
+        if session.query(Lease.name).filter_by(name=name).first() is not None:
+            session.rollback()
+            return False
+        session.add(Lease(name=name, owner=owner, acquired_at=now, heartbeat_at=now,
+                          expires_at=now + timedelta(seconds=ttl)))
+    try:
+        session.commit()
+    except IntegrityError:
+        session.rollback()
+        return False
+    return True
+
+def release_lease(session, name, owner):
+    """Expire the lease now if ``owner`` holds it, so another process can take over"""
+    session.query(Lease).filter_by(name=name, owner=owner).update(
+        {Lease.expires_at: datetime.utcnow()}, synchronize_session=False
+    )
+    session.commit()
+
+class LeaseKeeper:
+    """Keep trying to hold one lease from a background thread"""
+
+    def __init__(self, app, db, name, ttl=LEASE_TTL, owner=None, on_lost=None):
+        self.app = app
+        self.db = db
+        self.name = name
+        self.ttl = ttl
+        self.owner = owner or lease_owner()
+        self.on_lost = on_lost
+        self._acquired = threading.Event()
+        self._stopping = threading.Event()
+        self._expires = 0
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=f'lease-{self.name}', daemon=True)
+        self._thread.start()
+
+    def is_held(self):
+        """Whether the lease is held and has not expired by this process's clock"""
+        return self._acquired.is_set() and time.monotonic() < self._expires
+
+    def wait(self, timeout=None):
+        """Block until the lease is held; returns whether it is"""
+        self._acquired.wait(timeout)
+        return self.is_held()
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self._acquired.is_set():
+            self._acquired.clear()
+            with self.app.app_context():
+                try:
+                    release_lease(self.db.session, self.name, self.owner)
+                except Exception as e:
+                    logger.error(f"Error releasing lease {self.name}: {str(e)}")
+                finally:
+                    self.db.session.remove()
+
+    def _try_acquire(self):
+        with self.app.app_context():
+            try:
+                return acquire_lease(self.db.session, self.name, self.owner, self.ttl)
+            except Exception as e:
+                logger.error(f"Error renewing lease {self.name}: {str(e)}")
+                return False
+            finally:
+                self.db.session.remove()
+
+    def _run(self):
+        interval = self.ttl / 3
+        while not self._stopping.is_set():
+            started = time.monotonic()
+            if self._try_acquire():
+                self._expires = started + self.ttl
+                if not self._acquired.is_set():
+                    logger.info(f"Acquired lease {self.name} as {self.owner}")
+                    self._acquired.set()
+            elif self._acquired.is_set() and time.monotonic() >= self._expires:
+                logger.info(f"Lost lease {self.name}")
+                self._acquired.clear()
+                if self.on_lost is not None:
+                    self.on_lost()
+
+            timeout = interval
+            if self._acquired.is_set():
+                # Retry a failed renewal no later than the moment it expires
+                timeout = min(interval, max(0, self._expires - time.monotonic()))
+            self._stopping.wait(timeout)
@@ -0,0 +1,359 @@
+"""Watch every registered mailbox from a single process.
+
+Mailboxes are rows of the MailboxAccount table.  One asyncio event loop
+holds an IDLE connection per mailbox (servers without IDLE are checked with
+NOOP every ``poll_interval`` seconds).  Change notifications go to a
+bounded ingestion queue, at most one entry per mailbox; a fixed number of
+consumers sync the queued mailboxes in a thread pool using the regular
+EmailMonitor and ingestion code.  When the consumers fall behind, mailboxes
+that do not fit in the queue are set aside and queued as consumers free up
+or at the next registry refresh; the event loop, which also renews the
+leases, never waits on the queue.
+
+Hubs may run on several hosts at once: each mailbox is watched and synced
+only by the hub holding its lease (see ``leases``), renewed with every
+registry refresh, and a surviving hub picks up the mailboxes of one that
+stops renewing.
+
+    python mailbox_hub.py
+    python mailbox_hub.py --concurrency 8
+"""
+import os
+import sys
+import signal
+import asyncio
+import logging
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from aio_imap import AsyncIMAPClient
+from app import app
+from email_utils import EmailMonitor, PDF_MAX_BYTES, PDF_MAX_PAGES, PDF_TIME_BUDGET
+import ingest_queue
+from ingest import build_pdf_cache, build_pdf_pool, record_pool_stats, sync_mailbox
+from leases import LEASE_TTL, acquire_lease, lease_owner, release_lease
+from models.models import db, MailboxAccount
+
+logger = logging.getLogger(__name__)
+
+class MailboxHub:
+    def __init__(self, concurrency=4, queue_size=None, poll_interval=60, refresh_interval=60,
+                 lease_ttl=LEASE_TTL, pdf_pool=None, pdf_cache=None):
+        self.concurrency = concurrency
+        self.queue_size = queue_size or concurrency * 2
+        self.poll_interval = poll_interval
+        self.refresh_interval = refresh_interval
+        self.lease_ttl = lease_ttl
+        self.owner = lease_owner()
+        self.pdf_pool = pdf_pool
+        self.pdf_cache = pdf_cache
+        self.queue = None
+        self._queued = set()
+        self._syncing = set()
+        self._dirty = set()
+        self._overflow = {}  # account id -> account that did not fit in the queue
+        self._watchers = {}  # account id -> (account, task)
+        self._monitors = {}  # account id -> (updated_at, EmailMonitor)
+        self._monitors_lock = threading.Lock()
+        self._lease_expires = {}  # account id -> monotonic time its lease runs out
+        self._keepalive = None  # future of the running keepalive pass
+        self._stop = None
+
+    # Registry
+
+    def _load_accounts(self):
+        with app.app_context():
+            try:
+                return [
+                    {
+                        'id': account.id,
+                        'name': account.name,
+                        'server': account.server,
+                        'username': account.username,
+                        'password': account.password,
+                        'mailbox': account.mailbox,
+                        'sync_key': account.sync_key,
+                        'updated_at': account.updated_at
+                    }
+                    for account in db.session.query(MailboxAccount).filter_by(enabled=True)
+                ]
+            finally:
+                db.session.remove()
+
+    def _renew_leases(self, accounts):
+        """Take or renew the lease of every account; returns the ids held"""
+        held = set()
+        with app.app_context():
+            try:
+                for account in accounts:
+                    started = time.monotonic()
+                    try:
+                        acquired = acquire_lease(db.session, account['sync_key'], self.owner, self.lease_ttl)
+                    except Exception as e:
+                        logger.error(f"Error renewing lease for {account['name']}: {str(e)}")
+                        db.session.rollback()
+                        acquired = False
+                    if acquired:
+                        self._lease_expires[account['id']] = started + self.lease_ttl
+                    if time.monotonic() < self._lease_expires.get(account['id'], 0):
+                        held.add(account['id'])
+            finally:
+                db.session.remove()
+        return held
+
+    def _release_leases(self):
+        with app.app_context():
+            try:
+                for account, _ in self._watchers.values():
+                    release_lease(db.session, account['sync_key'], self.owner)
+            except Exception as e:
+                logger.error(f"Error releasing leases: {str(e)}")
+            finally:
+                db.session.remove()
+
+    def _due_accounts(self, accounts):
+        """Ids of the accounts whose queued retries are due"""
+        with app.app_context():
+            try:
+                due = ingest_queue.due_mailboxes(db.session, [account['sync_key'] for account in accounts])
+            except Exception as e:
+                logger.error(f"Error reading the ingestion queue: {str(e)}")
+                return set()
+            finally:
+                db.session.remove()
+        return {account['id'] for account in accounts if account['sync_key'] in due}
+
+    def _keep_monitors_alive(self):
+        """NOOP the pooled IMAP sessions of the sync threads between syncs"""
+        with self._monitors_lock:
+            monitors = [monitor for _, monitor in self._monitors.values()]
+        for monitor in monitors:
+            try:
+                monitor.keepalive()
+            except Exception as e:
+                logger.error(f"Error keeping IMAP sessions alive: {str(e)}")
+
+    def _load_registry(self):
+        accounts = self._load_accounts()
+        held = self._renew_leases(accounts)
+        return accounts, held, self._due_accounts([account for account in accounts if account['id'] in held])
+
+    def _holds_lease(self, account):
+        return time.monotonic() < self._lease_expires.get(account['id'], 0)
+
+    async def _refresh(self, executor, keepalive_executor):
+        """Start watchers for accounts this hub holds the lease of and stop the others"""
+        loop = asyncio.get_running_loop()
+        loaded, held, due = await loop.run_in_executor(executor, self._load_registry)
+        # In a thread of its own, so a slow IMAP server never delays the next lease renewal
+        if self._keepalive is None or self._keepalive.done():
+            self._keepalive = loop.run_in_executor(keepalive_executor, self._keep_monitors_alive)
+        accounts = {account['id']: account for account in loaded if account['id'] in held}
+
+        for account_id, (account, task) in list(self._watchers.items()):
+            current = accounts.get(account_id)
+            if current is None or current['updated_at'] != account['updated_at']:
+                logger.info(f"Stopping watcher for {account['name']}")
+                task.cancel()
+                del self._watchers[account_id]
+
+        # Set aside while the queue was full; accounts no longer held are dropped
+        self._overflow = {account_id: accounts[account_id] for account_id in self._overflow if account_id in accounts}
+        self._enqueue_overflow()
+
+        for account_id, account in accounts.items():
+            if account_id not in self._watchers:
+                logger.info(f"Starting watcher for {account['name']} ({account['mailbox']})")
+                self._watchers[account_id] = (account, asyncio.create_task(self._watch(account)))
+            elif account_id in due:
+                # Retries of failed messages, which no IDLE notification announces
+                self._enqueue(account)
+
+        logger.info(f"Watching {len(self._watchers)} of {len(loaded)} mailbox(es), "
+                    f"{self.queue.qsize()} queued, {len(self._overflow)} waiting, {len(self._syncing)} syncing")
+
+    # Watchers
+
+    def _enqueue(self, account):
+        """Queue a sync of the account without ever waiting for room"""
+        account_id = account['id']
+        if account_id in self._syncing:
+            # Picked up again once the running sync finishes
+            self._dirty.add(account_id)
+            return
+        if account_id in self._queued or account_id in self._overflow:
+            return
+        try:
+            self.queue.put_nowait(account)
+        except asyncio.QueueFull:
+            self._overflow[account_id] = account
+            return
+        self._queued.add(account_id)
+
+    def _enqueue_overflow(self):
+        """Move set-aside accounts into the queue while it has room"""
+        while self._overflow and not self.queue.full():
+            account_id = next(iter(self._overflow))
+            self._enqueue(self._overflow.pop(account_id))
+
+    async def _wait_for_change(self, client):
+        if 'IDLE' in client.capabilities:
+            return await client.idle()
+        await asyncio.sleep(self.poll_interval)
+        return any(b' EXISTS' in line.upper() for line in await client.command('NOOP'))
+
+    async def _watch(self, account):
+        delay = 1
+        while True:
+            client = AsyncIMAPClient(account['server'])
+            try:
+                await client.connect()
+                await client.login(account['username'], account['password'])
+                await client.select(account['mailbox'])
+                delay = 1
+                # Catch up on whatever arrived while we were not connected
+                self._enqueue(account)
+                while True:
+                    if await self._wait_for_change(client):
+                        self._enqueue(account)
+            except asyncio.CancelledError:
+                client.close()
+                raise
+            except Exception as e:
+                logger.error(f"Watcher for {account['name']} failed: {str(e)}, reconnecting in {delay}s")
+                client.close()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 300)
+
+    # Ingestion
+
+    def _monitor(self, account):
+        with self._monitors_lock:
+            updated_at, monitor = self._monitors.get(account['id'], (None, None))
+            if monitor is not None and updated_at == account['updated_at']:
+                return monitor
+            if monitor is not None:
+                monitor.close()
+            monitor = EmailMonitor(
+                username=account['username'],
+                password=account['password'],
+                server=account['server'],
+                pool_size=1,
+                pdf_max_pages=int(os.environ.get('PDF_MAX_PAGES', PDF_MAX_PAGES)),
+                pdf_max_bytes=int(os.environ.get('PDF_MAX_BYTES', PDF_MAX_BYTES)),
+                pdf_time_budget=float(os.environ.get('PDF_TIME_BUDGET', PDF_TIME_BUDGET)),
+                pdf_pool=self.pdf_pool,
+                pdf_cache=self.pdf_cache
+            )
+            self._monitors[account['id']] = (account['updated_at'], monitor)
+            return monitor
+
+    def _sync(self, account):
+        """Store everything new in one mailbox; runs in the thread pool"""
+        if not self._holds_lease(account):
+            logger.info(f"Lease for {account['name']} expired, skipping sync")
+            return
+        monitor = self._monitor(account)
+        with app.app_context():
+            try:
+                has_more = True
+                while has_more and self._holds_lease(account):
+                    _, has_more = sync_mailbox(db.session, monitor, account['mailbox'], account['sync_key'],
+                                                owner=self.owner)
+                if self.pdf_cache is not None and self.pdf_cache.evict():
+                    db.session.commit()
+            finally:
+                # Ends a transaction left open by a failed sync
+                db.session.rollback()
+                record_pool_stats(db.session, monitor)
+                db.session.remove()
+
+    async def _ingest(self, executor):
+        loop = asyncio.get_running_loop()
+        while True:
+            account = await self.queue.get()
+            self._queued.discard(account['id'])
+            self._syncing.add(account['id'])
+            try:
+                await loop.run_in_executor(executor, self._sync, account)
+            except Exception as e:
+                logger.error(f"Error syncing {account['name']}: {str(e)}")
+            finally:
+                self._syncing.discard(account['id'])
+                self.queue.task_done()
+            if account['id'] in self._dirty:
+                self._dirty.discard(account['id'])
+                self._enqueue(account)
+            self._enqueue_overflow()
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        self._stop = asyncio.Event()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(signum, self._stop.set)
+
+        # One extra thread keeps registry reloads from waiting behind syncs
+        with ThreadPoolExecutor(max_workers=self.concurrency + 1, thread_name_prefix='ingest') as executor, \
+                ThreadPoolExecutor(max_workers=1, thread_name_prefix='keepalive') as keepalive_executor:
+            consumers = [asyncio.create_task(self._ingest(executor)) for _ in range(self.concurrency)]
+            try:
+                while not self._stop.is_set():
+                    try:
+                        await self._refresh(executor, keepalive_executor)
+                    except Exception as e:
+                        logger.error(f"Error loading mailbox registry: {str(e)}")
+                    try:
+                        # Often enough to renew the leases well before they expire
+                        await asyncio.wait_for(self._stop.wait(), min(self.refresh_interval, self.lease_ttl / 3))
+                    except asyncio.TimeoutError:
+                        pass
+            finally:
+                logger.info("Stopping mailbox hub")
+                tasks = consumers + [task for _, task in self._watchers.values()]
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                self._release_leases()
+
+        for _, monitor in self._monitors.values():
+            monitor.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingest new emails from every registered mailbox")
+    parser.add_argument('--concurrency', type=int,
+                        default=int(os.environ.get('HUB_CONCURRENCY', '4')),
+                        help="Mailboxes synced at the same time (default: HUB_CONCURRENCY or 4)")
+    parser.add_argument('--queue-size', type=int,
+                        default=int(os.environ.get('HUB_QUEUE_SIZE', '0')) or None,
+                        help="Pending mailbox syncs before watchers wait (default: twice the concurrency)")
+    parser.add_argument('--poll-interval', type=float,
+                        default=float(os.environ.get('INGEST_INTERVAL', '60')),
+                        help="Seconds between checks of servers without IDLE (default: INGEST_INTERVAL or 60)")
+    parser.add_argument('--lease-ttl', type=float,
+                        default=float(os.environ.get('INGEST_LEASE_TTL', LEASE_TTL)),
+                        help=f"Seconds before another hub may take over a mailbox "
+                             f"(default: INGEST_LEASE_TTL or {LEASE_TTL})")
+    args = parser.parse_args(argv)
+
+    pdf_pool = build_pdf_pool()
+    hub = MailboxHub(
+        concurrency=args.concurrency,
+        queue_size=args.queue_size,
+        poll_interval=args.poll_interval,
+        lease_ttl=args.lease_ttl,
+        pdf_pool=pdf_pool,
+        pdf_cache=build_pdf_cache()
+    )
+    try:
+        asyncio.run(hub.run())
+    finally:
+        if pdf_pool is not None:
+            logger.info(f"PDF pool stats: {pdf_pool.stats()}")
+            pdf_pool.shutdown()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,80 @@
+"""Initial schema
+
+Databases created earlier with db.create_all() already have these tables;
+the existence checks let them upgrade through this revision unchanged.
+
+Revision ID: 1e7b38f5a3cb
+Revises: 
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1e7b38f5a3cb'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if 'company' not in existing:
+        op.create_table(
+            'company',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('name', sa.String(length=100), nullable=False),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+    if 'company_email' not in existing:
+        op.create_table(
+            'company_email',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('email', sa.String(length=120), nullable=False),
+            sa.Column('company_id', sa.Integer(), nullable=False),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['company_id'], ['company.id']),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+    if 'email' not in existing:
+        op.create_table(
+            'email',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('sender', sa.String(length=120), nullable=True),
+            sa.Column('subject', sa.String(length=200), nullable=True),
+            sa.Column('date', sa.DateTime(), nullable=True),
+            sa.Column('has_pdf', sa.Boolean(), nullable=True),
+            sa.Column('pdf_emails', sa.Text(), nullable=True),
+            sa.Column('company_id', sa.Integer(), nullable=True),
+            sa.ForeignKeyConstraint(['company_id'], ['company.id']),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+    if 'mailbox_sync_state' not in existing:
+        op.create_table(
+            'mailbox_sync_state',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('mailbox', sa.String(length=120), nullable=False),
+            sa.Column('uidvalidity', sa.BigInteger(), nullable=True),
+            sa.Column('last_uid', sa.BigInteger(), nullable=False),
+            sa.Column('last_checked_at', sa.DateTime(), nullable=True),
+            sa.Column('last_ingested_at', sa.DateTime(), nullable=True),
+            sa.Column('last_error', sa.Text(), nullable=True),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('mailbox')
+        )
+
+
+def downgrade():
+    op.drop_table('mailbox_sync_state')
+    op.drop_table('email')
+    op.drop_table('company_email')
+    op.drop_table('company')
@@ -0,0 +1,61 @@
+"""Add the ingestion queue and dead-letter tables
+
+Revision ID: 34d9a31df95a
+Revises: 9c2959d01066
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '34d9a31df95a'
+down_revision = '9c2959d01066'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    tables = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if 'ingest_job' not in tables:
+        op.create_table(
+            'ingest_job',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('mailbox', sa.String(length=120), nullable=False),
+            sa.Column('uidvalidity', sa.BigInteger(), nullable=False),
+            sa.Column('uid', sa.BigInteger(), nullable=False),
+            sa.Column('state', sa.String(length=20), nullable=False),
+            sa.Column('attempts', sa.Integer(), nullable=False),
+            sa.Column('next_attempt_at', sa.DateTime(), nullable=False),
+            sa.Column('locked_by', sa.String(length=255), nullable=True),
+            sa.Column('locked_until', sa.DateTime(), nullable=True),
+            sa.Column('last_error', sa.Text(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('mailbox', 'uidvalidity', 'uid', name='uq_ingest_job_message')
+        )
+        op.create_index('ix_ingest_job_due', 'ingest_job', ['mailbox', 'state', 'next_attempt_at'], unique=False)
+
+    if 'ingest_dead_letter' not in tables:
+        op.create_table(
+            'ingest_dead_letter',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('mailbox', sa.String(length=120), nullable=False),
+            sa.Column('uidvalidity', sa.BigInteger(), nullable=False),
+            sa.Column('uid', sa.BigInteger(), nullable=False),
+            sa.Column('attempts', sa.Integer(), nullable=False),
+            sa.Column('last_error', sa.Text(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('failed_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_ingest_dead_letter_mailbox'), 'ingest_dead_letter', ['mailbox'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_ingest_dead_letter_mailbox'), table_name='ingest_dead_letter')
+    op.drop_table('ingest_dead_letter')
+    op.drop_index('ix_ingest_job_due', table_name='ingest_job')
+    op.drop_table('ingest_job')
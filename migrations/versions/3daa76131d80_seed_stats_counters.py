@@ -0,0 +1,35 @@
+"""Seed the /api/stats counters
+
+Revision ID: 3daa76131d80
+Revises: e726e5e1a825
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3daa76131d80'
+down_revision = 'e726e5e1a825'
+branch_labels = None
+depends_on = None
+
+COUNTERS = {
+    'emails': "SELECT COUNT(*) FROM email",
+    'emails_with_pdf': "SELECT COUNT(*) FROM email WHERE has_pdf",
+    'companies': "SELECT COUNT(*) FROM company",
+}
+
+
+def upgrade():
+    bind = op.get_bind()
+    for name, query in COUNTERS.items():
+        value = bind.execute(sa.text(query)).scalar()
+        bind.execute(sa.text("DELETE FROM stat_counter WHERE name = :name"), {'name': name})
+        bind.execute(sa.text("INSERT INTO stat_counter (name, value) VALUES (:name, :value)"),
+                     {'name': name, 'value': value})
+
+
+def downgrade():
+    op.get_bind().execute(sa.text("DELETE FROM stat_counter WHERE name IN ('emails', 'emails_with_pdf', 'companies')"))
@@ -0,0 +1,65 @@
+"""Encrypt mailbox passwords and widen the sync key columns
+
+Revision ID: 5c1f0e7a9d42
+Revises: 9b3792f935ca
+Create Date: 2026-10-17 21:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from encryption import decrypt, encrypt
+
+
+# revision identifiers, used by Alembic.
+revision = '5c1f0e7a9d42'
+down_revision = '9b3792f935ca'
+branch_labels = None
+depends_on = None
+
+# Columns holding a MailboxAccount.sync_key, name(80) + '/' + mailbox(120)
+SYNC_KEY_COLUMNS = [('mailbox_sync_state', 'mailbox'), ('ingest_job', 'mailbox'), ('ingest_dead_letter', 'mailbox')]
+
+
+def _column_length(bind, table, column):
+    for info in sa.inspect(bind).get_columns(table):
+        if info['name'] == column:
+            return getattr(info['type'], 'length', None)
+
+
+def _alter_lengths(bind, columns, length):
+    for table, column in columns:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.alter_column(column, existing_type=sa.String(length=_column_length(bind, table, column)),
+                                  type_=sa.String(length=length), existing_nullable=False)
+
+
+def _converted_passwords(bind, convert):
+    rows = bind.execute(sa.text("SELECT id, password FROM mailbox_account")).fetchall()
+    return [{'id': account_id, 'password': convert(password)} for account_id, password in rows]
+
+
+def _store_passwords(bind, passwords):
+    for row in passwords:
+        bind.execute(sa.text("UPDATE mailbox_account SET password = :password WHERE id = :id"), row)
+
+
+def upgrade():
+    bind = op.get_bind()
+    # The column is widened only here, so its length tells whether the passwords are still plaintext
+    plaintext = _column_length(bind, 'mailbox_account', 'password') != 512
+    # Encrypted before any schema change: raises if rows exist and MAILBOX_ENCRYPTION_KEY is not set
+    passwords = _converted_passwords(bind, encrypt) if plaintext else []
+
+    _alter_lengths(bind, [(table, column) for table, column in SYNC_KEY_COLUMNS
+                          if (_column_length(bind, table, column) or 255) < 255], 255)
+    if plaintext:
+        _alter_lengths(bind, [('mailbox_account', 'password')], 512)
+        _store_passwords(bind, passwords)
+
+
+def downgrade():
+    bind = op.get_bind()
+    _store_passwords(bind, _converted_passwords(bind, decrypt))
+    _alter_lengths(bind, [('mailbox_account', 'password')], 255)
+    _alter_lengths(bind, SYNC_KEY_COLUMNS, 120)
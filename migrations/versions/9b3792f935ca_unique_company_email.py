@@ -0,0 +1,39 @@
+"""Make company addresses unique per company
+
+Revision ID: 9b3792f935ca
+Revises: 34d9a31df95a
+Create Date: 2026-10-17 19:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9b3792f935ca'
+down_revision = '34d9a31df95a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    if 'ux_company_email_company_email' in {index['name'] for index in sa.inspect(bind).get_indexes('company_email')}:
+        return
+
+    # Keep the oldest row of each duplicated (company_id, email) pair
+    duplicates = bind.execute(sa.text(
+        "SELECT id FROM company_email WHERE id NOT IN "
+        "(SELECT keep_id FROM (SELECT MIN(id) AS keep_id FROM company_email GROUP BY company_id, email) AS kept)"
+    )).fetchall()
+    ids = [row[0] for row in duplicates]
+    for start in range(0, len(ids), 500):
+        bind.execute(sa.text("DELETE FROM company_email WHERE id IN :ids").bindparams(
+            sa.bindparam('ids', expanding=True)
+        ), {'ids': ids[start:start + 500]})
+
+    op.create_index('ux_company_email_company_email', 'company_email', ['company_id', 'email'], unique=True)
+
+
+def downgrade():
+    op.drop_index('ux_company_email_company_email', table_name='company_email')
@@ -0,0 +1,34 @@
+"""Add the lease table for ingestion leader election
+
+Revision ID: 9c2959d01066
+Revises: bfa5949bf0ba
+Create Date: 2026-10-17 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c2959d01066'
+down_revision = 'bfa5949bf0ba'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if 'lease' in set(sa.inspect(op.get_bind()).get_table_names()):
+        return
+    op.create_table(
+        'lease',
+        sa.Column('name', sa.String(length=255), nullable=False),
+        sa.Column('owner', sa.String(length=255), nullable=False),
+        sa.Column('acquired_at', sa.DateTime(), nullable=False),
+        sa.Column('heartbeat_at', sa.DateTime(), nullable=False),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('lease')
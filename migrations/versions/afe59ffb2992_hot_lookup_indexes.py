@@ -0,0 +1,54 @@
+"""Indexes for ingestion dedup, company matching and email listing
+
+Adds email.message_id with a unique index as the ingestion dedup key,
+lower-cases company_email.email and indexes it, and indexes the columns
+used to sort and dedup emails.
+
+Revision ID: afe59ffb2992
+Revises: 1e7b38f5a3cb
+Create Date: 2026-10-17 09:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'afe59ffb2992'
+down_revision = '1e7b38f5a3cb'
+branch_labels = None
+depends_on = None
+
+
+def _existing_indexes(inspector, table):
+    return {index['name'] for index in inspector.get_indexes(table)}
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+
+    if 'message_id' not in {column['name'] for column in inspector.get_columns('email')}:
+        op.add_column('email', sa.Column('message_id', sa.String(length=255), nullable=True))
+
+    # Company addresses are matched case-insensitively against a plain index
+    op.execute("UPDATE company_email SET email = LOWER(TRIM(email))")
+
+    email_indexes = _existing_indexes(inspector, 'email')
+    if 'ux_email_message_id' not in email_indexes:
+        op.create_index('ux_email_message_id', 'email', ['message_id'], unique=True)
+    if 'ix_email_date_id' not in email_indexes:
+        op.create_index('ix_email_date_id', 'email', ['date', 'id'], unique=False)
+    if 'ix_email_sender_subject' not in email_indexes:
+        op.create_index('ix_email_sender_subject', 'email', ['sender', 'subject'], unique=False)
+
+    if 'ix_company_email_email' not in _existing_indexes(inspector, 'company_email'):
+        op.create_index('ix_company_email_email', 'company_email', ['email'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_company_email_email', table_name='company_email')
+    op.drop_index('ix_email_sender_subject', table_name='email')
+    op.drop_index('ix_email_date_id', table_name='email')
+    op.drop_index('ux_email_message_id', table_name='email')
+    with op.batch_alter_table('email') as batch_op:
+        batch_op.drop_column('message_id')
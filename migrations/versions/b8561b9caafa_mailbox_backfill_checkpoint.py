@@ -0,0 +1,28 @@
+"""Mailbox backfill checkpoint
+
+Revision ID: b8561b9caafa
+Revises: cdde2ef0abd0
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8561b9caafa'
+down_revision = 'cdde2ef0abd0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+
+    if 'backfill_uid' not in {column['name'] for column in inspector.get_columns('mailbox_sync_state')}:
+        op.add_column('mailbox_sync_state', sa.Column('backfill_uid', sa.BigInteger(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    with op.batch_alter_table('mailbox_sync_state') as batch_op:
+        batch_op.drop_column('backfill_uid')
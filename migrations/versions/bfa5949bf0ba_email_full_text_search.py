@@ -0,0 +1,30 @@
+"""Full-text search and company/date index for the email list
+
+Revision ID: bfa5949bf0ba
+Revises: fe34cf698125
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from search import create_search_index, drop_search_index
+
+
+# revision identifiers, used by Alembic.
+revision = 'bfa5949bf0ba'
+down_revision = 'fe34cf698125'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    if 'ix_email_company_date' not in {index['name'] for index in sa.inspect(bind).get_indexes('email')}:
+        op.create_index('ix_email_company_date', 'email', ['company_id', 'date', 'id'], unique=False)
+    create_search_index(bind)
+
+
+def downgrade():
+    drop_search_index(op.get_bind())
+    op.drop_index('ix_email_company_date', table_name='email')
@@ -0,0 +1,49 @@
+"""PDF extraction cache and stat counters
+
+Revision ID: cdde2ef0abd0
+Revises: ea00801a6b24
+Create Date: 2026-10-17 10:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'cdde2ef0abd0'
+down_revision = 'ea00801a6b24'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if 'stat_counter' not in existing:
+        op.create_table(
+            'stat_counter',
+            sa.Column('name', sa.String(length=50), nullable=False),
+            sa.Column('value', sa.BigInteger(), nullable=False),
+            sa.PrimaryKeyConstraint('name')
+        )
+
+    if 'pdf_extraction_cache' not in existing:
+        op.create_table(
+            'pdf_extraction_cache',
+            sa.Column('sha256', sa.String(length=64), nullable=False),
+            sa.Column('emails', sa.Text(), nullable=False),
+            sa.Column('pages', sa.Integer(), nullable=False),
+            sa.Column('size', sa.Integer(), nullable=False),
+            sa.Column('truncated', sa.Boolean(), nullable=False),
+            sa.Column('hits', sa.Integer(), nullable=False),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('last_used_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('sha256')
+        )
+        op.create_index('ix_pdf_extraction_cache_last_used_at', 'pdf_extraction_cache', ['last_used_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_pdf_extraction_cache_last_used_at', table_name='pdf_extraction_cache')
+    op.drop_table('pdf_extraction_cache')
+    op.drop_table('stat_counter')
@@ -0,0 +1,38 @@
+"""Mailbox account registry
+
+Revision ID: e726e5e1a825
+Revises: b8561b9caafa
+Create Date: 2026-10-17 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e726e5e1a825'
+down_revision = 'b8561b9caafa'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if 'mailbox_account' not in set(sa.inspect(op.get_bind()).get_table_names()):
+        op.create_table(
+            'mailbox_account',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('name', sa.String(length=80), nullable=False),
+            sa.Column('server', sa.String(length=255), nullable=False),
+            sa.Column('username', sa.String(length=255), nullable=False),
+            sa.Column('password', sa.String(length=255), nullable=False),
+            sa.Column('mailbox', sa.String(length=120), nullable=False),
+            sa.Column('enabled', sa.Boolean(), nullable=False),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('name')
+        )
+
+
+def downgrade():
+    op.drop_table('mailbox_account')
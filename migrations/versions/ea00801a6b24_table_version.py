@@ -0,0 +1,32 @@
+"""Table version stamps for cross-process cache invalidation
+
+Revision ID: ea00801a6b24
+Revises: afe59ffb2992
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'ea00801a6b24'
+down_revision = 'afe59ffb2992'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if 'table_version' in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table(
+        'table_version',
+        sa.Column('name', sa.String(length=50), nullable=False),
+        sa.Column('version', sa.BigInteger(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('table_version')
@@ -0,0 +1,85 @@
+"""Move PDF addresses into the email_pdf_address table
+
+Revision ID: fe34cf698125
+Revises: 3daa76131d80
+Create Date: 2026-10-17 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'fe34cf698125'
+down_revision = '3daa76131d80'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+email_pdf_address = sa.table(
+    'email_pdf_address',
+    sa.column('email_id', sa.Integer),
+    sa.column('address', sa.String),
+    sa.column('domain', sa.String),
+)
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+
+    if 'email_pdf_address' not in set(inspector.get_table_names()):
+        op.create_table(
+            'email_pdf_address',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('email_id', sa.Integer(), nullable=False),
+            sa.Column('address', sa.String(length=255), nullable=False),
+            sa.Column('domain', sa.String(length=255), nullable=False),
+            sa.ForeignKeyConstraint(['email_id'], ['email.id'], ondelete='CASCADE'),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('email_id', 'address', name='uq_email_pdf_address')
+        )
+        op.create_index('ix_email_pdf_address_address', 'email_pdf_address', ['address'], unique=False)
+        op.create_index('ix_email_pdf_address_domain', 'email_pdf_address', ['domain'], unique=False)
+
+    if 'pdf_emails' not in {column['name'] for column in inspector.get_columns('email')}:
+        return
+
+    # Split the comma-joined column in id order, one batch at a time
+    last_id = 0
+    while True:
+        rows = bind.execute(sa.text(
+            "SELECT id, pdf_emails FROM email WHERE id > :last_id AND pdf_emails IS NOT NULL "
+            "ORDER BY id LIMIT :limit"
+        ), {'last_id': last_id, 'limit': BATCH_SIZE}).fetchall()
+        if not rows:
+            break
+        addresses = []
+        for email_id, pdf_emails in rows:
+            for address in dict.fromkeys(a.strip().lower() for a in pdf_emails.split(',') if a.strip()):
+                addresses.append({'email_id': email_id, 'address': address, 'domain': address.rsplit('@', 1)[-1]})
+        if addresses:
+            bind.execute(email_pdf_address.insert(), addresses)
+        last_id = rows[-1][0]
+
+    with op.batch_alter_table('email') as batch_op:
+        batch_op.drop_column('pdf_emails')
+
+
+def downgrade():
+    bind = op.get_bind()
+    with op.batch_alter_table('email') as batch_op:
+        batch_op.add_column(sa.Column('pdf_emails', sa.Text(), nullable=True))
+
+    rows = bind.execute(sa.text("SELECT email_id, address FROM email_pdf_address ORDER BY email_id, id")).fetchall()
+    joined = {}
+    for email_id, address in rows:
+        joined.setdefault(email_id, []).append(address)
+    for email_id, addresses in joined.items():
+        bind.execute(sa.text("UPDATE email SET pdf_emails = :pdf_emails WHERE id = :id"),
+                     {'pdf_emails': ','.join(addresses), 'id': email_id})
+
+    op.drop_index('ix_email_pdf_address_domain', table_name='email_pdf_address')
+    op.drop_index('ix_email_pdf_address_address', table_name='email_pdf_address')
+    op.drop_table('email_pdf_address')
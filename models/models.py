@@ -1,27 +1,200 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 
+from encryption import EncryptedString
+
 db = SQLAlchemy()
 
 class Email(db.Model):
     id = db.Column(db.Integer, primary_key=True)
+    message_id = db.Column(db.String(255))
     sender = db.Column(db.String(120))
     subject = db.Column(db.String(200))
     date = db.Column(db.DateTime, default=datetime.utcnow)
     has_pdf = db.Column(db.Boolean, default=False)
-    pdf_emails = db.Column(db.Text)  # Store as comma-separated string
     company_id = db.Column(db.Integer, db.ForeignKey('company.id'), nullable=True)
     company = db.relationship('Company', backref=db.backref('company_emails', lazy=True))
+    pdf_addresses = db.relationship('EmailPdfAddress', backref='email', lazy=True,
+                                    cascade='all, delete-orphan', order_by='EmailPdfAddress.id')
+
+    @property
+    def pdf_emails(self):
+        """Addresses found in the email's PDF attachments, in extraction order"""
+        return [pdf_address.address for pdf_address in self.pdf_addresses]
+
+    __table_args__ = (
+        # Keyset pagination in /api/emails orders by (date, id)
+        db.Index('ix_email_date_id', 'date', 'id'),
+        # Same ordering within one company for the company filter
+        db.Index('ix_email_company_date', 'company_id', 'date', 'id'),
+        # Dedup key for ingestion; NULL for emails stored before Message-ID was recorded
+        db.Index('ux_email_message_id', 'message_id', unique=True),
+        db.Index('ix_email_sender_subject', 'sender', 'subject'),
+    )
+
+class EmailPdfAddress(db.Model):
+    """An address found in a PDF attachment of an email"""
+    id = db.Column(db.Integer, primary_key=True)
+    email_id = db.Column(db.Integer, db.ForeignKey('email.id', ondelete='CASCADE'), nullable=False)
+    address = db.Column(db.String(255), nullable=False)  # Stored lower-cased
+    # Part after the @, for matching wildcard company entries
+    domain = db.Column(db.String(255), nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint('email_id', 'address', name='uq_email_pdf_address'),
+        db.Index('ix_email_pdf_address_address', 'address'),
+        db.Index('ix_email_pdf_address_domain', 'domain'),
+    )
+
+    @classmethod
+    def for_address(cls, address):
+        address = address.strip().lower()
+        return cls(address=address, domain=address.rsplit('@', 1)[-1])
 
 class CompanyEmail(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    email = db.Column(db.String(120), nullable=False)
+    email = db.Column(db.String(120), nullable=False)  # Stored lower-cased
     company_id = db.Column(db.Integer, db.ForeignKey('company.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        db.Index('ix_company_email_email', 'email'),
+        # Also serves the per-company lookups of the diff in update_company
+        db.Index('ux_company_email_company_email', 'company_id', 'email', unique=True),
+    )
+
 class Company(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     emails = db.relationship('CompanyEmail', backref='company', lazy=True, cascade='all, delete-orphan')
+
+class MailboxAccount(db.Model):
+    """An IMAP mailbox watched by mailbox_hub.py"""
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(80), nullable=False, unique=True)
+    server = db.Column(db.String(255), nullable=False)
+    username = db.Column(db.String(255), nullable=False)
+    # Fernet token; room for a 255 character password
+    password = db.Column(EncryptedString(512), nullable=False)
+    mailbox = db.Column(db.String(120), nullable=False, default='INBOX')
+    enabled = db.Column(db.Boolean, nullable=False, default=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    @property
+    def sync_key(self):
+        """MailboxSyncState.mailbox value for this account"""
+        return f"{self.name}/{self.mailbox}"
+
+class MailboxSyncState(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    # Mailbox name, or MailboxAccount.sync_key (up to 201 characters)
+    mailbox = db.Column(db.String(255), nullable=False, unique=True)
+    uidvalidity = db.Column(db.BigInteger)
+    last_uid = db.Column(db.BigInteger, nullable=False, default=0)
+    # Highest UID imported by the history backfill
+    backfill_uid = db.Column(db.BigInteger, nullable=False, default=0)
+    last_checked_at = db.Column(db.DateTime)
+    last_ingested_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class IngestJob(db.Model):
+    """A message waiting to be fetched and stored, keyed by mailbox and UID"""
+    id = db.Column(db.Integer, primary_key=True)
+    # MailboxSyncState.mailbox of the mailbox the message is in
+    mailbox = db.Column(db.String(255), nullable=False)
+    uidvalidity = db.Column(db.BigInteger, nullable=False)
+    uid = db.Column(db.BigInteger, nullable=False)
+    state = db.Column(db.String(20), nullable=False, default='pending')  # pending, running
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_by = db.Column(db.String(255))
+    locked_until = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('mailbox', 'uidvalidity', 'uid', name='uq_ingest_job_message'),
+        # Workers claim due jobs of one mailbox in UID order
+        db.Index('ix_ingest_job_due', 'mailbox', 'state', 'next_attempt_at'),
+    )
+
+class IngestDeadLetter(db.Model):
+    """A message that could not be ingested within the allowed attempts"""
+    id = db.Column(db.Integer, primary_key=True)
+    mailbox = db.Column(db.String(255), nullable=False, index=True)
+    uidvalidity = db.Column(db.BigInteger, nullable=False)
+    uid = db.Column(db.BigInteger, nullable=False)
+    attempts = db.Column(db.Integer, nullable=False)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime)
+    failed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class Lease(db.Model):
+    """Time-limited ownership of a named job, e.g. syncing one mailbox"""
+    name = db.Column(db.String(255), primary_key=True)
+    owner = db.Column(db.String(255), nullable=False)
+    acquired_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    heartbeat_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+class TableVersion(db.Model):
+    """Version stamps that let processes detect changes made by others"""
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    @classmethod
+    def get(cls, session, name):
+        return session.query(cls.version).filter_by(name=name).scalar() or 0
+
+    @classmethod
+    def get_many(cls, session, names):
+        """Return ``{name: (version, updated_at)}``; missing names are ``(0, None)``"""
+        rows = {name: (version, updated_at) for name, version, updated_at in
+                session.query(cls.name, cls.version, cls.updated_at).filter(cls.name.in_(names))}
+        return {name: rows.get(name, (0, None)) for name in names}
+
+    @classmethod
+    def bump(cls, session, name):
+        """Increment a version in the caller's transaction"""
+        updated = session.query(cls).filter_by(name=name).update(
+            {cls.version: cls.version + 1, cls.updated_at: datetime.utcnow()},
+            synchronize_session=False
+        )
+        if not updated:
+            session.add(cls(name=name, version=1))
+
+class StatCounter(db.Model):
+    """Named counters maintained incrementally by writers"""
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.BigInteger, nullable=False, default=0)
+
+    @classmethod
+    def get_many(cls, session, names):
+        values = dict(session.query(cls.name, cls.value).filter(cls.name.in_(names)))
+        return {name: values.get(name, 0) for name in names}
+
+    @classmethod
+    def increment(cls, session, name, amount=1):
+        """Add to a counter in the caller's transaction"""
+        updated = session.query(cls).filter_by(name=name).update(
+            {cls.value: cls.value + amount},
+            synchronize_session=False
+        )
+        if not updated:
+            session.add(cls(name=name, value=amount))
+
+class PdfExtractionCache(db.Model):
+    """Extraction results keyed by the SHA-256 of the PDF bytes"""
+    sha256 = db.Column(db.String(64), primary_key=True)
+    emails = db.Column(db.Text, nullable=False)  # JSON list
+    pages = db.Column(db.Integer, nullable=False, default=0)
+    size = db.Column(db.Integer, nullable=False, default=0)
+    truncated = db.Column(db.Boolean, nullable=False, default=False)
+    hits = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_used_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
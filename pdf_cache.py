@@ -0,0 +1,129 @@
+"""Database-backed cache of PDF extraction results.
+
+The same invoices arrive again and again (resends, CCs, reminders).  Results
+are keyed by the SHA-256 of the attachment bytes, so a repeated attachment
+costs a hash and one primary-key lookup instead of a PyPDF2 parse.  The
+table is kept to ``max_entries`` rows by evicting the least recently used.
+
+Hit and miss totals are kept in StatCounter rows for /api/stats.  Lookups
+only read: hits and misses are counted in memory while the batch's PDFs are
+parsed and written by ``flush`` in a short transaction of their own, so
+the ingestion transaction never holds the counter rows (on PostgreSQL) or
+the database write lock (on SQLite) during parsing.
+"""
+import json
+import logging
+import threading
+from datetime import datetime
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from models.models import PdfExtractionCache, StatCounter, TableVersion
+
+logger = logging.getLogger(__name__)
+
+HITS_COUNTER = 'pdf_cache_hits'
+MISSES_COUNTER = 'pdf_cache_misses'
+
+# Bumped with the counters, so /api/stats revalidates when they change
+PDF_CACHE_VERSION = 'pdf_cache'
+
+class PdfCache:
+    def __init__(self, session, max_entries=10000):
+        """``session`` is a (scoped) SQLAlchemy session; stored results join its transaction"""
+        self.session = session
+        self.max_entries = max_entries
+        self._added = 0
+        self._lock = threading.Lock()
+        self._hits = {}  # digest -> hits since the last flush
+        self._misses = 0
+
+    def get(self, digest):
+        """Return the cached extraction result for a digest, or None"""
+        entry = self.session.query(PdfExtractionCache).get(digest)
+        with self._lock:
+            if entry is None:
+                self._misses += 1
+                return None
+            self._hits[digest] = self._hits.get(digest, 0) + 1
+        return {
+            'emails': json.loads(entry.emails),
+            'pages': entry.pages,
+            'size': entry.size,
+            'elapsed_ms': 0,
+            'truncated': entry.truncated,
+            'cached': True
+        }
+
+    def put(self, digest, result):
+        """Store an extraction result; timed out or failed jobs are not cached"""
+        if result.get('failed'):
+            return
+        try:
+            with self.session.begin_nested():
+                self.session.add(PdfExtractionCache(
+                    sha256=digest,
+                    emails=json.dumps(result['emails']),
+                    pages=result['pages'],
+                    size=result['size'],
+                    truncated=result['truncated']
+                ))
+        except IntegrityError:
+            # Stored meanwhile by another worker, or earlier in the same batch
+            return
+        self._added += 1
+
+    def flush(self):
+        """Write the hits and misses counted since the last flush.
+
+        Uses its own session and commits at once; call it after parsing and
+        before the ingestion session writes anything, so the two never wait
+        on each other.  Statistics that cannot be written are dropped.
+        """
+        with self._lock:
+            hits, self._hits = self._hits, {}
+            misses, self._misses = self._misses, 0
+        if not hits and not misses:
+            return
+
+        now = datetime.utcnow()
+        try:
+            with Session(self.session.bind) as session, session.begin():
+                # A fixed order keeps concurrent workers from deadlocking
+                for digest in sorted(hits):
+                    session.query(PdfExtractionCache).filter_by(sha256=digest).update(
+                        {PdfExtractionCache.hits: PdfExtractionCache.hits + hits[digest],
+                         PdfExtractionCache.last_used_at: now},
+                        synchronize_session=False
+                    )
+                if hits:
+                    StatCounter.increment(session, HITS_COUNTER, sum(hits.values()))
+                if misses:
+                    StatCounter.increment(session, MISSES_COUNTER, misses)
+                TableVersion.bump(session, PDF_CACHE_VERSION)
+        except Exception as e:
+            logger.error(f"Error recording PDF cache statistics: {str(e)}")
+
+    def evict(self):
+        """Drop least recently used entries beyond ``max_entries``"""
+        if not self._added:
+            return 0
+        self._added = 0
+
+        excess = self.session.query(PdfExtractionCache).count() - self.max_entries
+        if excess <= 0:
+            return 0
+
+        digests = [row.sha256 for row in self.session.query(PdfExtractionCache.sha256)
+                   .order_by(PdfExtractionCache.last_used_at).limit(excess)]
+        for start in range(0, len(digests), 500):
+            self.session.query(PdfExtractionCache).filter(
+                PdfExtractionCache.sha256.in_(digests[start:start + 500])
+            ).delete(synchronize_session=False)
+        logger.info(f"Evicted {len(digests)} PDF cache entries")
+        return len(digests)
+
+def pdf_cache_stats(session):
+    counters = StatCounter.get_many(session, [HITS_COUNTER, MISSES_COUNTER])
+    return {'hits': counters[HITS_COUNTER], 'misses': counters[MISSES_COUNTER]}
@@ -0,0 +1,151 @@
+"""Process pool for PDF text extraction.
+
+PyPDF2 is pure-Python CPU work; running it in worker processes keeps the
+ingestion loop responsive and lets several attachments parse in parallel.
+Every job has a timeout.  A job that overruns it is killed by terminating
+the pool's processes; other jobs that were running at the time are
+resubmitted once to a fresh pool.
+"""
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from email_utils import extract_pdf_emails
+
+logger = logging.getLogger(__name__)
+
+class PdfExtractionPool:
+    def __init__(self, max_workers=2, timeout=30, max_pending=None):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.max_pending = max_pending or max_workers * 4
+        self._lock = threading.Lock()
+        # Bounds queued + running jobs so callers feel backpressure
+        self._pending = threading.BoundedSemaphore(self.max_pending)
+        self._executor = None
+        self._started = time.monotonic()
+        self._stats = {'submitted': 0, 'completed': 0, 'timed_out': 0, 'failed': 0, 'restarts': 0, 'wait_ms': 0.0}
+        self._queued = 0
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            return self._executor
+
+    def _kill_executor(self, executor):
+        """Terminate every worker process of ``executor``"""
+        with self._lock:
+            if self._executor is not executor:
+                return
+            self._executor = None
+            self._stats['restarts'] += 1
+        for process in list((executor._processes or {}).values()):
+            try:
+                process.terminate()
+            except Exception:
+                pass
+        executor.shutdown(wait=False)
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self._stats[key] += amount
+
+    def submit(self, pdf_bytes, **limits):
+        """Queue a job; blocks while ``max_pending`` jobs are outstanding"""
+        self._pending.acquire()
+        with self._lock:
+            self._queued += 1
+            self._stats['submitted'] += 1
+        try:
+            executor = self._get_executor()
+            future = executor.submit(extract_pdf_emails, pdf_bytes, **limits)
+        except Exception:
+            self._release()
+            raise
+        return _Job(executor, future, pdf_bytes, limits)
+
+    def _release(self):
+        with self._lock:
+            self._queued -= 1
+        self._pending.release()
+
+    def result(self, job):
+        """Wait for a job and return its extract_pdf_emails() result dict"""
+        started = time.monotonic()
+        try:
+            for attempt in range(2):
+                try:
+                    result = job.future.result(timeout=self.timeout)
+                    self._count('completed')
+                    return result
+                except TimeoutError:
+                    logger.error(f"PDF extraction exceeded {self.timeout}s, killing worker processes")
+                    self._count('timed_out')
+                    self._kill_executor(job.executor)
+                    return _failed_result(job.pdf_bytes, timed_out=True)
+                except BrokenProcessPool:
+                    # Collateral of another job's kill; retry once on a new pool
+                    if attempt == 0:
+                        self._kill_executor(job.executor)
+                        job.executor = self._get_executor()
+                        job.future = job.executor.submit(extract_pdf_emails, job.pdf_bytes, **job.limits)
+                        continue
+                    raise
+        except Exception as e:
+            logger.error(f"PDF extraction failed: {str(e)}")
+            self._count('failed')
+            return _failed_result(job.pdf_bytes)
+        finally:
+            self._count('wait_ms', (time.monotonic() - started) * 1000)
+            self._release()
+
+    def map(self, pdf_payloads, **limits):
+        """Extract several PDFs in parallel, returning results in order"""
+        jobs = deque()
+        results = []
+        for pdf_bytes in pdf_payloads:
+            # Collect the oldest job first so submit() never waits on our own backlog
+            if len(jobs) >= self.max_pending:
+                results.append(self.result(jobs.popleft()))
+            jobs.append(self.submit(pdf_bytes, **limits))
+        results.extend(self.result(job) for job in jobs)
+        return results
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['queue_depth'] = self._queued
+        elapsed = time.monotonic() - self._started
+        stats['wait_ms'] = round(stats['wait_ms'], 1)
+        stats['workers'] = self.max_workers
+        stats['jobs_per_second'] = round(stats['completed'] / elapsed, 3) if elapsed > 0 else 0.0
+        return stats
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+class _Job:
+    def __init__(self, executor, future, pdf_bytes, limits):
+        self.executor = executor
+        self.future = future
+        self.pdf_bytes = pdf_bytes
+        self.limits = limits
+
+def _failed_result(pdf_bytes, timed_out=False):
+    return {
+        'emails': [],
+        'pages': 0,
+        'size': len(pdf_bytes or b''),
+        'elapsed_ms': 0,
+        'truncated': True,
+        'timed_out': timed_out,
+        # The job did not finish, so trying again may succeed
+        'failed': True
+    }
@@ -0,0 +1,126 @@
+"""Full-text search over email subjects and senders.
+
+Each database uses its own full-text index, created by the migration that
+introduced search (and by ``flask init-db``):
+
+* PostgreSQL: GIN indexes on ``to_tsvector('simple', ...)`` expressions
+* MySQL: FULLTEXT indexes, queried in boolean mode
+* SQLite: an external-content FTS5 table kept in sync by triggers
+
+Other databases, or a SQLite build without FTS5, fall back to LIKE, which
+scans the table.
+"""
+import re
+import logging
+
+from sqlalchemy import inspect, or_
+from sqlalchemy.sql import text
+
+from models.models import Email
+
+logger = logging.getLogger(__name__)
+
+_TOKEN = re.compile(r'\w+', re.UNICODE)
+
+_fts5_available = {}
+
+# SQLite: external-content FTS5 table plus the triggers that keep it current
+SQLITE_FTS_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS email_fts USING fts5("
+    "subject, sender, content='email', content_rowid='id')",
+    "CREATE TRIGGER IF NOT EXISTS email_fts_insert AFTER INSERT ON email BEGIN "
+    "INSERT INTO email_fts(rowid, subject, sender) VALUES (new.id, new.subject, new.sender); END",
+    "CREATE TRIGGER IF NOT EXISTS email_fts_delete AFTER DELETE ON email BEGIN "
+    "INSERT INTO email_fts(email_fts, rowid, subject, sender) VALUES ('delete', old.id, old.subject, old.sender); END",
+    "CREATE TRIGGER IF NOT EXISTS email_fts_update AFTER UPDATE OF subject, sender ON email BEGIN "
+    "INSERT INTO email_fts(email_fts, rowid, subject, sender) VALUES ('delete', old.id, old.subject, old.sender); "
+    "INSERT INTO email_fts(rowid, subject, sender) VALUES (new.id, new.subject, new.sender); END",
+]
+
+# Punctuation is blanked first so addresses split into words like the other
+# backends do, instead of becoming a single 'email' token
+POSTGRESQL_TEXT = ("to_tsvector('simple', regexp_replace(coalesce(subject, '') || ' ' || coalesce(sender, ''), "
+                   "'[^[:alnum:]_]+', ' ', 'g'))")
+POSTGRESQL_SENDER = "to_tsvector('simple', regexp_replace(coalesce(sender, ''), '[^[:alnum:]_]+', ' ', 'g'))"
+
+# InnoDB does not index words shorter than innodb_ft_min_token_size
+MYSQL_MIN_TOKEN = 3
+
+# Names of the objects created here rather than by the models
+SEARCH_TABLE_PREFIX = 'email_fts'
+SEARCH_INDEXES = ('ix_email_fts', 'ix_email_fts_sender')
+
+def is_search_object(name, type_):
+    """Whether a reflected table or index belongs to the full-text search"""
+    if type_ == 'table':
+        return name.startswith(SEARCH_TABLE_PREFIX)
+    return type_ == 'index' and name in SEARCH_INDEXES
+
+def create_search_index(connection):
+    """Create the full-text index for the connection's database if it is missing"""
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        try:
+            for statement in SQLITE_FTS_DDL:
+                connection.execute(text(statement))
+            connection.execute(text("INSERT INTO email_fts(email_fts) VALUES ('rebuild')"))
+        except Exception as e:
+            logger.error(f"SQLite FTS5 unavailable, search falls back to LIKE: {str(e)}")
+    elif dialect == 'postgresql':
+        connection.execute(text(f"CREATE INDEX IF NOT EXISTS ix_email_fts ON email USING gin ({POSTGRESQL_TEXT})"))
+        connection.execute(text(f"CREATE INDEX IF NOT EXISTS ix_email_fts_sender ON email USING gin ({POSTGRESQL_SENDER})"))
+    elif dialect == 'mysql':
+        existing = {index['name'] for index in inspect(connection).get_indexes('email')}
+        if 'ix_email_fts' not in existing:
+            connection.execute(text("CREATE FULLTEXT INDEX ix_email_fts ON email (subject, sender)"))
+        if 'ix_email_fts_sender' not in existing:
+            connection.execute(text("CREATE FULLTEXT INDEX ix_email_fts_sender ON email (sender)"))
+
+def drop_search_index(connection):
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        for name in ('email_fts_insert', 'email_fts_delete', 'email_fts_update'):
+            connection.execute(text(f"DROP TRIGGER IF EXISTS {name}"))
+        connection.execute(text("DROP TABLE IF EXISTS email_fts"))
+    elif dialect == 'postgresql':
+        connection.execute(text("DROP INDEX IF EXISTS ix_email_fts"))
+        connection.execute(text("DROP INDEX IF EXISTS ix_email_fts_sender"))
+    elif dialect == 'mysql':
+        connection.execute(text("DROP INDEX ix_email_fts ON email"))
+        connection.execute(text("DROP INDEX ix_email_fts_sender ON email"))
+
+def _has_fts5(connection):
+    key = str(connection.engine.url)
+    if key not in _fts5_available:
+        _fts5_available[key] = inspect(connection).has_table('email_fts')
+    return _fts5_available[key]
+
+def search_filter(session, query, sender_only=False):
+    """Return a filter clause matching emails whose words start with those of ``query``.
+
+    Every word must match.  Returns None if the query has no words.
+    """
+    tokens = _TOKEN.findall(query.lower())
+    if not tokens:
+        return None
+    connection = session.connection()
+    dialect = connection.dialect.name
+
+    if dialect == 'postgresql':
+        vector = POSTGRESQL_SENDER if sender_only else POSTGRESQL_TEXT
+        return text(f"{vector} @@ to_tsquery('simple', :tsquery)").bindparams(
+            tsquery=' & '.join(f"{token}:*" for token in tokens)
+        )
+    if dialect == 'mysql' and any(len(token) >= MYSQL_MIN_TOKEN for token in tokens):
+        columns = 'sender' if sender_only else 'subject, sender'
+        return text(f"MATCH ({columns}) AGAINST (:fulltext IN BOOLEAN MODE)").bindparams(
+            fulltext=' '.join(f"+{token}*" for token in tokens if len(token) >= MYSQL_MIN_TOKEN)
+        )
+    if dialect == 'sqlite' and _has_fts5(connection):
+        match = ' AND '.join(f'"{token}"*' for token in tokens)
+        if sender_only:
+            match = f"sender : ({match})"
+        return text("email.id IN (SELECT rowid FROM email_fts WHERE email_fts MATCH :match)").bindparams(match=match)
+
+    columns = [Email.sender] if sender_only else [Email.subject, Email.sender]
+    return or_(*[column.ilike(f"%{query.strip()}%") for column in columns])
@@ -0,0 +1,91 @@
+"""Coalesce concurrent identical requests within one process.
+
+When new mail arrives every open dashboard receives the same Server-Sent
+Event at once and reloads the same first page and stats, so each gunicorn
+thread would run identical queries side by side.  ``SingleFlight`` lets the
+first caller for a key do the work while concurrent callers wait for and
+share its result; with a ``window`` the result is also reused by callers
+arriving shortly afterwards.  Database load then stays proportional to the
+number of worker processes rather than to the number of open tabs.
+"""
+import threading
+import time
+from functools import wraps
+
+from flask import make_response, request
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.expires_at = None
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn, window=0):
+        """Run ``fn()`` once for all concurrent callers with the same ``key``.
+
+        A finished result is reused for ``window`` seconds.  Exceptions are
+        raised in every waiting caller but never reused.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._prune(now)
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            if call.error is not None or window <= 0:
+                with self._lock:
+                    self._calls.pop(key, None)
+            else:
+                call.expires_at = time.monotonic() + window
+            call.done.set()
+        return call.result
+
+    def _prune(self, now):
+        expired = [key for key, call in self._calls.items()
+                   if call.expires_at is not None and call.expires_at <= now]
+        for key in expired:
+            del self._calls[key]
+
+single_flight = SingleFlight()
+
+def render_shared(key, view, window=0):
+    """Run a Flask view through ``single_flight`` and give each caller its own response.
+
+    Only the body, status and headers are shared; responses are mutable and
+    later handlers (compression, ETags) modify them per request.
+    """
+    def render():
+        response = make_response(view())
+        return response.get_data(), response.status_code, list(response.headers.items())
+    body, status, headers = single_flight.do(key, render, window=window)
+    return make_response(body, status, headers)
+
+def coalesced(window=0):
+    """Share one execution of a GET view among concurrent identical requests"""
+    def decorator(view):
+        @wraps(view)
+        def decorated(*args, **kwargs):
+            key = (request.endpoint, request.full_path)
+            return render_shared(key, lambda: view(*args, **kwargs), window=window)
+        return decorated
+    return decorator
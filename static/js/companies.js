@@ -217,6 +217,12 @@ document.addEventListener('DOMContentLoaded', function() {
                 body: JSON.stringify(companyData)
             });
 
+            if (response.status === 400) {
+                // Rejected input, such as an invalid address
+                const result = await response.json();
+                showError(`${result.message || 'Érvénytelen adatok'}${result.error ? `: ${result.error}` : ''}`);
+                return;
+            }
             if (!response.ok) {
                 throw new Error(`HTTP error! status: ${response.status}`);
             }
@@ -69,13 +69,13 @@ document.addEventListener('DOMContentLoaded', function() {
         }, 5000);
     }
 
+    // GET responses carry ETags; the browser revalidates them and reuses its
+    // copy on 304, so no cache-busting headers or query parameters are sent
     async function fetchWithRetry(url, options = {}, retries = MAX_RETRIES) {
         const defaultOptions = {
             headers: {
                 'Accept': 'application/json',
-                'Content-Type': 'application/json',
-                'Cache-Control': 'no-cache',
-                'Pragma': 'no-cache'
+                'Content-Type': 'application/json'
             },
             credentials: 'same-origin'
         };
@@ -106,23 +106,44 @@ document.addEventListener('DOMContentLoaded', function() {
     // Search functionality
     const searchInput = document.querySelector('.search-input input');
     const statusFilter = document.querySelector('select');
+    const moreFilters = document.getElementById('moreFilters');
+    const dateFrom = document.getElementById('dateFrom');
+    const dateTo = document.getElementById('dateTo');
 
-    // Pagination state
-    let currentPage = 1;
-    let countdown = 10;
+    // Pagination state (keyset cursor for "load more")
+    const PAGE_SIZE = 10;
+    let nextCursor = null;
+    let loadedCount = 0;
+    let totalCount = 0;
+    let totalCapped = false;
+    let loadingMore = false;
 
+    let filterTimer = null;
+    let listRequest = 0;
+
+    // Query string for /api/emails with the current search and filters
+    function emailListParams(cursor = null) {
+        const params = new URLSearchParams({ per_page: PAGE_SIZE });
+        const query = (searchInput?.value || '').trim();
+        if (query) params.set('q', query);
+        if (statusFilter?.value) params.set('has_pdf', statusFilter.value);
+        if (dateFrom?.value) params.set('date_from', dateFrom.value);
+        if (dateTo?.value) params.set('date_to', dateTo.value);
+        if (cursor) {
+            params.set('cursor', cursor);
+        } else if (document.getElementById('pageInfo')) {
+            // Counting costs a query, so it is only asked for where it is shown
+            params.set('total', '1');
+        }
+        return params;
+    }
+
+    // Filtering runs on the server, so reload the first page when it changes
     function filterTable() {
-        if (!emailTable) return;
-        
-        const searchTerm = (searchInput?.value || '').toLowerCase();
-        const statusTerm = statusFilter?.value || 'Minden státusz';
-        const rows = emailTable.querySelectorAll('tr');
-
-        rows.forEach(row => {
-            const text = row.textContent.toLowerCase();
-            const matchesSearch = text.includes(searchTerm);
-            row.style.display = matchesSearch ? '' : 'none';
-        });
+        clearTimeout(filterTimer);
+        filterTimer = setTimeout(() => {
+            loadExistingEmails().catch(console.error);
+        }, 300);
     }
 
     if (searchInput) {
@@ -133,6 +154,12 @@ document.addEventListener('DOMContentLoaded', function() {
         statusFilter.addEventListener('change', filterTable);
     }
 
+    [dateFrom, dateTo].forEach(input => input?.addEventListener('change', filterTable));
+
+    moreFilters?.addEventListener('click', () => {
+        document.getElementById('dateFilters')?.classList.toggle('d-none');
+    });
+
     async function updateStats() {
         const progressIndicator = showProgress('Statisztikák frissítése...');
         try {
@@ -220,7 +247,7 @@ document.addEventListener('DOMContentLoaded', function() {
                 });
                 
                 if (result.success) {
-                    loadExistingEmails(currentPage);
+                    loadExistingEmails();
                     updateStats();
                 } else {
                     showError(result.message || 'Hiba történt az e-mail törlése közben');
@@ -234,35 +261,15 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
 
-    async function loadExistingEmails(page = 1) {
+    // Load the first page, or append the next one when a cursor is given
+    async function loadExistingEmails(cursor = null) {
+        // Only the latest first-page load may replace the table
+        const request = cursor ? listRequest : ++listRequest;
         try {
-            const timestamp = new Date().getTime();
-            const response = await fetch(`/api/emails?page=${page}&t=${timestamp}`, {
-                headers: {
-                    'Accept': 'application/json',
-                    'Cache-Control': 'no-cache'
-                }
-            });
+            const result = await fetchWithRetry(`/api/emails?${emailListParams(cursor)}`);
             
-            if (!response.ok) {
-                throw new Error(`HTTP error! status: ${response.status}`);
-            }
-            
-            const result = await response.json();
-            
-            if (result.success) {
-                if (emailTable) {
-                    emailTable.innerHTML = '';
-                    if (Array.isArray(result.data)) {
-                        result.data.forEach(email => {
-                            addEmailToTable(email);
-                        });
-                    }
-                    
-                    // Update pagination
-                    currentPage = result.pagination.page;
-                    updatePaginationControls(result.pagination);
-                }
+            if (result.success && request === listRequest) {
+                renderEmails(result, !cursor);
             }
         } catch (error) {
             console.error('Error loading emails:', error);
@@ -270,92 +277,128 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
 
-    async function checkLatestEmail() {
-        const progressIndicator = showProgress('Új e-mailek ellenőrzése...');
+    function renderEmails(result, replace) {
+        if (!emailTable) return;
+
+        if (replace) {
+            emailTable.innerHTML = '';
+            loadedCount = 0;
+        }
+        if (Array.isArray(result.data)) {
+            result.data.forEach(email => {
+                addEmailToTable(email);
+            });
+            loadedCount += result.data.length;
+        }
+
+        // Update pagination
+        if (result.pagination.total !== undefined) {
+            totalCount = result.pagination.total;
+            totalCapped = Boolean(result.pagination.total_capped);
+        }
+        nextCursor = result.pagination.next_cursor;
+        updatePaginationControls();
+    }
+
+    async function loadMoreEmails() {
+        if (!nextCursor || loadingMore) return;
+        loadingMore = true;
         try {
-            const result = await fetchWithRetry('/check-latest');
-            if (result.success) {
-                // Add timestamp to prevent caching
-                const timestamp = new Date().getTime();
-                const response = await fetchWithRetry(`/api/emails?page=1&t=${timestamp}`);
-                
-                if (response.success && emailTable) {
-                    emailTable.innerHTML = '';
-                    if (Array.isArray(response.data)) {
-                        response.data.forEach(email => {
-                            addEmailToTable(email);
-                        });
-                    }
-                    
-                    // Update pagination
-                    currentPage = response.pagination.page;
-                    updatePaginationControls(response.pagination);
-                }
-                
-                await updateStats();
-            }
-        } catch (error) {
-            console.error('Error checking latest email:', error.message);
-            showError('Nem sikerült ellenőrizni az új e-maileket. Újrapróbálkozás folyamatban...');
+            await loadExistingEmails(nextCursor);
         } finally {
-            progressIndicator.remove();
+            loadingMore = false;
         }
     }
 
-    function updatePaginationControls(pagination) {
+    // Reload the first page and the stats after new emails were stored
+    async function refreshEmails() {
+        try {
+            await loadExistingEmails();
+            await updateStats();
+        } catch (error) {
+            console.error('Error refreshing emails:', error.message);
+            showError('Nem sikerült frissíteni az e-maileket.');
+        }
+    }
+
+    function updatePaginationControls() {
         const pageInfo = document.getElementById('pageInfo');
-        const prevPageBtn = document.getElementById('prevPage');
-        const nextPageBtn = document.getElementById('nextPage');
+        const loadMoreBtn = document.getElementById('loadMore');
         
         if (pageInfo) {
-            const start = (pagination.page - 1) * 10 + 1;
-            const end = Math.min(pagination.page * 10, pagination.total);
-            pageInfo.textContent = `${start}-${end} / ${pagination.total} találat`;
+            const total = Math.max(totalCount, loadedCount);
+            pageInfo.textContent = `${loadedCount} / ${total}${totalCapped && total === totalCount ? '+' : ''} találat`;
         }
         
-        if (prevPageBtn) prevPageBtn.disabled = pagination.page <= 1;
-        if (nextPageBtn) nextPageBtn.disabled = pagination.page >= pagination.pages;
+        if (loadMoreBtn) loadMoreBtn.disabled = !nextCursor;
     }
 
-    // Add pagination event listeners
-    document.getElementById('prevPage')?.addEventListener('click', () => {
-        if (currentPage > 1) {
-            loadExistingEmails(currentPage - 1);
-        }
+    // "Load more" button, also triggered automatically when scrolled into view
+    const loadMoreBtn = document.getElementById('loadMore');
+    loadMoreBtn?.addEventListener('click', () => {
+        loadMoreEmails().catch(console.error);
     });
 
-    document.getElementById('nextPage')?.addEventListener('click', () => {
-        loadExistingEmails(currentPage + 1);
-    });
+    if (loadMoreBtn && 'IntersectionObserver' in window) {
+        const observer = new IntersectionObserver(entries => {
+            if (entries.some(entry => entry.isIntersecting)) {
+                loadMoreEmails().catch(console.error);
+            }
+        });
+        observer.observe(loadMoreBtn);
+    }
 
-    async function updateCountdown() {
-        if (lastCheck) {
-            lastCheck.textContent = `${countdown} mp`;
-            countdown--;
-            
-            if (countdown < 0) {
-                countdown = 10;
-                await checkLatestEmail();
+    // Where the server streams, new emails are pushed over Server-Sent Events;
+    // otherwise the email version is polled and answered with a 304 until it changes
+    function listenForEmails() {
+        if (document.body.dataset.eventsStream !== 'on' || !('EventSource' in window)) {
+            pollForEmails();
+            return;
+        }
+
+        const source = new EventSource('/api/events');
+        source.addEventListener('open', () => {
+            if (lastCheck) lastCheck.textContent = 'Élő';
+        });
+        source.addEventListener('emails', () => {
+            refreshEmails().catch(console.error);
+        });
+        source.addEventListener('error', () => {
+            // EventSource reconnects by itself and replays missed events via Last-Event-ID
+            if (lastCheck) lastCheck.textContent = 'Újracsatlakozás...';
+        });
+    }
+
+    function pollForEmails() {
+        const interval = (parseInt(document.body.dataset.eventsPollInterval, 10) || 30) * 1000;
+        let version = null;
+
+        async function poll() {
+            // Hidden tabs skip the check and catch up when shown again
+            if (document.hidden) return;
+            try {
+                const result = await fetchWithRetry('/api/events/version', {}, 0);
+                if (version !== null && result.version !== version) {
+                    await refreshEmails();
+                }
+                version = result.version;
+                if (lastCheck) lastCheck.textContent = new Date().toLocaleTimeString('hu-HU');
+            } catch (error) {
+                console.error('Error checking for new emails:', error.message);
             }
         }
+
+        poll();
+        setInterval(poll, interval);
+        document.addEventListener('visibilitychange', poll);
     }
 
-    // Start auto-refresh when page loads
+    // Initial load, then wait for server notifications
     function startAutoRefresh() {
         if (emailTable) {
-            // Initial load
-            loadExistingEmails(1)
+            loadExistingEmails()
                 .then(() => updateStats())
-                .then(() => {
-                    // Set up intervals with error handling
-                    setInterval(() => {
-                        updateCountdown().catch(console.error);
-                    }, 1000);
-                    
-                    setInterval(() => {
-                        updateStats().catch(console.error);
-                    }, 10000);
-                })
+                .then(() => listenForEmails())
                 .catch(error => {
                     console.error('Error during initialization:', error);
                     showError('Nem sikerült betölteni az adatokat. Újrapróbálkozás folyamatban...');
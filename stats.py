@@ -0,0 +1,69 @@
+"""Row counts for /api/stats, maintained incrementally.
+
+Counting the email table on every dashboard refresh gets slower as it
+grows.  Writers adjust StatCounter rows in the same transaction as the rows
+they add or remove instead, so reading the stats is one primary-key lookup.
+``recount_stats`` rebuilds the counters from the tables; the migration that
+introduced them runs it, and so does ``flask recount-stats``.
+
+The ingestion processes also add their IMAP connection pool counters here
+after each sync, so /api/stats shows them for every worker together.
+"""
+from sqlalchemy import func
+
+from models.models import Company, Email, StatCounter, TableVersion
+
+EMAILS_COUNTER = 'emails'
+PDF_EMAILS_COUNTER = 'emails_with_pdf'
+COMPANIES_COUNTER = 'companies'
+
+IMAP_POOL_COUNTERS = ('hits', 'misses', 'reconnects', 'evictions')
+# Bumped with the pool counters, so /api/stats revalidates when they change
+IMAP_POOL_VERSION = 'imap_pool'
+
+def count_emails(session, emails, with_pdf=0):
+    """Adjust the email counters in the caller's transaction"""
+    if emails:
+        StatCounter.increment(session, EMAILS_COUNTER, emails)
+    if with_pdf:
+        StatCounter.increment(session, PDF_EMAILS_COUNTER, with_pdf)
+
+def count_companies(session, companies):
+    """Adjust the company counter in the caller's transaction"""
+    StatCounter.increment(session, COMPANIES_COUNTER, companies)
+
+def recount_stats(session):
+    """Reset the counters to the current table counts; the caller commits"""
+    counts = {
+        EMAILS_COUNTER: session.query(func.count(Email.id)).scalar(),
+        PDF_EMAILS_COUNTER: session.query(func.count(Email.id)).filter(Email.has_pdf.is_(True)).scalar(),
+        COMPANIES_COUNTER: session.query(func.count(Company.id)).scalar()
+    }
+    for name, value in counts.items():
+        counter = session.query(StatCounter).get(name)
+        if counter is None:
+            session.add(StatCounter(name=name, value=value))
+        else:
+            counter.value = value
+    return counts
+
+def read_stats(session):
+    counters = StatCounter.get_many(session, [COMPANIES_COUNTER, PDF_EMAILS_COUNTER, EMAILS_COUNTER])
+    return {
+        'companies': counters[COMPANIES_COUNTER],
+        'pdfs': counters[PDF_EMAILS_COUNTER],
+        'emails': counters[EMAILS_COUNTER]
+    }
+
+def count_imap_pool(session, deltas):
+    """Add IMAP pool counter increases in the caller's transaction; returns whether any were added"""
+    deltas = {key: deltas.get(key, 0) for key in IMAP_POOL_COUNTERS if deltas.get(key)}
+    for key, amount in deltas.items():
+        StatCounter.increment(session, f'imap_pool_{key}', amount)
+    if deltas:
+        TableVersion.bump(session, IMAP_POOL_VERSION)
+    return bool(deltas)
+
+def imap_pool_stats(session):
+    counters = StatCounter.get_many(session, [f'imap_pool_{key}' for key in IMAP_POOL_COUNTERS])
+    return {key: counters[f'imap_pool_{key}'] for key in IMAP_POOL_COUNTERS}
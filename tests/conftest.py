@@ -0,0 +1,67 @@
+"""Shared fixtures.
+
+The app reads DATABASE_URL when it is imported, so it is pointed at a
+throwaway SQLite file before anything imports it.  Every test starts from
+empty tables.
+"""
+import os
+import tempfile
+
+_database_dir = tempfile.mkdtemp(prefix='email-monitor-tests-')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_database_dir, 'test.db')}"
+os.environ.pop('BASIC_AUTH_USERNAME', None)
+os.environ['MAILBOX_ENCRYPTION_KEY'] = 'test-mailbox-key'
+
+import pytest
+from sqlalchemy import event
+
+from app import app as flask_app
+from company_resolver import company_resolver
+from models.models import db
+from single_flight import single_flight
+
+@pytest.fixture
+def app():
+    with flask_app.app_context():
+        db.create_all()
+        try:
+            yield flask_app
+        finally:
+            db.session.remove()
+            db.drop_all()
+    # Per-process state that would otherwise outlive the tables
+    company_resolver.invalidate()
+    single_flight._calls.clear()
+
+@pytest.fixture
+def session(app):
+    return db.session
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+class QueryCounter:
+    """SQL statements sent to the database while counting"""
+
+    def __init__(self):
+        self.statements = []
+
+    def __len__(self):
+        return len(self.statements)
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def reset(self):
+        self.statements = []
+
+@pytest.fixture
+def count_queries(app):
+    """Count the statements executed on the app's engine"""
+    counter = QueryCounter()
+    event.listen(db.engine, 'before_cursor_execute', counter)
+    try:
+        yield counter
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', counter)
@@ -0,0 +1,22 @@
+import ingest_queue
+from backfill import backfill_mailbox
+from models.models import IngestJob, MailboxSyncState
+
+class FakeMonitor:
+    pdf_cache = None
+
+    def __init__(self, uidvalidity, uidnext):
+        self.status = (uidvalidity, uidnext)
+
+    def mailbox_status(self, mailbox):
+        return self.status
+
+def test_uidvalidity_change_discards_queued_jobs(session):
+    session.add(MailboxSyncState(mailbox='INBOX', uidvalidity=1, last_uid=10, backfill_uid=10))
+    ingest_queue.enqueue(session, 'INBOX', 1, [9, 10])
+    session.commit()
+
+    assert backfill_mailbox(session, FakeMonitor(uidvalidity=2, uidnext=1)) == (0, 0)
+    assert session.query(IngestJob).count() == 0
+    state = session.query(MailboxSyncState).one()
+    assert (state.uidvalidity, state.last_uid, state.backfill_uid) == (2, 0, 0)
@@ -0,0 +1,46 @@
+import pytest
+
+from app import normalize_company_emails, sync_company_emails
+from models.models import Company, CompanyEmail
+
+def create(client, emails):
+    return client.post('/api/companies', json={'name': 'Acme', 'emails': emails})
+
+def test_addresses_and_domains_are_accepted(client):
+    response = create(client, [' Billing@Acme.hu', '*@acme.hu', '@globex.hu', 'billing@acme.hu'])
+    assert response.status_code == 200
+    assert sorted(response.get_json()['data']['emails']) == ['*@acme.hu', '@globex.hu', 'billing@acme.hu']
+
+@pytest.mark.parametrize('emails', ['x@y.hu', None, {'x@y.hu': True}, ['foo bar'], ['foo'], [''], [42],
+                                    ['a@b'], ['Name <a@b.hu>'], ['a@b.hu', 'a b@c.hu']])
+def test_invalid_emails_are_rejected(session, client, emails):
+    assert create(client, emails).status_code == 400
+    assert session.query(Company).count() == 0
+
+def test_invalid_update_changes_nothing(session, client):
+    company_id = create(client, ['billing@acme.hu']).get_json()['data']['id']
+    response = client.put(f'/api/companies/{company_id}', json={'name': 'Renamed', 'emails': 'x@y.hu'})
+    assert response.status_code == 400
+    company = session.get(Company, company_id)
+    assert company.name == 'Acme'
+    assert [e.email for e in company.emails] == ['billing@acme.hu']
+
+def test_normalize_company_emails_does_not_rewrite_addresses():
+    with pytest.raises(ValueError):
+        normalize_company_emails(['foo bar@acme.hu'])
+    assert normalize_company_emails(['A@Acme.HU', 'a@acme.hu']) == ['a@acme.hu']
+
+def test_sync_touches_only_the_difference(session):
+    company = Company(name='Acme')
+    company.emails = [CompanyEmail(email='old@acme.hu'), CompanyEmail(email='kept@acme.hu')]
+    session.add(company)
+    session.commit()
+    kept_id = session.query(CompanyEmail.id).filter_by(email='kept@acme.hu').scalar()
+
+    assert sync_company_emails(session, company.id, ['kept@acme.hu', 'new@acme.hu', 'New@acme.hu']) == (1, 1)
+    session.commit()
+    rows = dict(session.query(CompanyEmail.email, CompanyEmail.id).filter_by(company_id=company.id))
+    assert set(rows) == {'kept@acme.hu', 'new@acme.hu'}
+    assert rows['kept@acme.hu'] == kept_id
+
+    assert sync_company_emails(session, company.id, ['kept@acme.hu', 'new@acme.hu']) == (0, 0)
@@ -0,0 +1,68 @@
+import pytest
+
+from aho_corasick import AhoCorasick
+from company_resolver import CompanyResolver, bump_company_version
+from models.models import Company, CompanyEmail
+
+def test_automaton_finds_overlapping_patterns():
+    matcher = AhoCorasick([('he', 1), ('she', 2), ('his', 3), ('hers', 4), ('', 5)])
+    assert sorted(matcher.finditer('ushers')) == [(1, 4, 2), (2, 4, 1), (2, 6, 4)]
+    assert list(AhoCorasick([]).finditer('anything')) == []
+
+def test_automaton_keeps_every_value_of_a_pattern():
+    matcher = AhoCorasick([('acme.hu', 'a'), ('acme.hu', 'b'), ('cme.hu', 'c')])
+    assert sorted(value for _, _, value in matcher.finditer('x@acme.hu')) == ['a', 'b', 'c']
+
+@pytest.fixture
+def companies(session):
+    """Company ids by name, with their addresses"""
+    entries = {
+        'exact': ['billing@acme.hu'],
+        'wildcard': ['*@acme.hu'],
+        'subdomain': ['*@eu.acme.hu'],
+        'globex': ['@globex.hu', 'office@initech.hu'],
+    }
+    ids = {}
+    for name, emails in entries.items():
+        company = Company(name=name)
+        company.emails = [CompanyEmail(email=email) for email in emails]
+        session.add(company)
+        session.flush()
+        ids[name] = company.id
+    bump_company_version(session)
+    session.commit()
+    return ids
+
+@pytest.fixture
+def match(session):
+    resolver = CompanyResolver(check_interval=0)
+    return lambda sender, pdf_addresses=(): resolver.match(session, sender, pdf_addresses)
+
+def test_exact_address_beats_wildcard_domain(companies, match):
+    assert match('Billing <billing@acme.hu>') == companies['exact']
+    assert match('sales@acme.hu') == companies['wildcard']
+
+def test_longest_domain_wins(companies, match):
+    assert match('sales@eu.acme.hu') == companies['subdomain']
+    assert match('sales@sub.eu.acme.hu') == companies['subdomain']
+    assert match('sales@us.acme.hu') == companies['wildcard']
+
+def test_domains_match_whole_labels_only(companies, match):
+    assert match('sales@notacme.hu') is None
+    assert match('sales@acme.hu.evil.com') is None
+    assert match('xbilling@acme.hu') == companies['wildcard']
+    assert match('office@initech.hu.example.com') is None
+
+def test_sender_outweighs_pdf_votes(companies, match):
+    pdf_addresses = ['a@globex.hu', 'b@globex.hu', 'office@initech.hu']
+    assert match('billing@acme.hu', pdf_addresses) == companies['exact']
+    # Without a sender match the PDF addresses decide, by votes
+    assert match('someone@gmail.com', pdf_addresses + ['billing@acme.hu']) == companies['globex']
+
+def test_changes_are_picked_up_after_a_version_bump(session, companies, match):
+    assert match('new@partner.hu') is None
+    company = session.get(Company, companies['globex'])
+    company.emails.append(CompanyEmail(email='new@partner.hu'))
+    bump_company_version(session)
+    session.commit()
+    assert match('new@partner.hu') == companies['globex']
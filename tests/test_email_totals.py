@@ -0,0 +1,31 @@
+from datetime import datetime, timedelta
+
+import app as app_module
+from events import bump_email_version
+from models.models import Email
+
+def add_emails(session, count):
+    started = datetime(2024, 1, 1)
+    for number in range(count):
+        session.add(Email(sender=f"sender{number}@example.com", subject=f"Invoice {number}",
+                          date=started + timedelta(minutes=number), has_pdf=number % 2 == 0))
+    bump_email_version(session)
+    session.commit()
+
+def total_of(client, url):
+    return client.get(url).get_json()['pagination']
+
+def test_totals_are_only_counted_on_request(session, client):
+    add_emails(session, 4)
+    assert 'total' not in total_of(client, '/api/emails?has_pdf=1')
+    assert total_of(client, '/api/emails?has_pdf=1&total=1')['total'] == 2
+
+def test_filtered_totals_are_capped(session, client, monkeypatch):
+    monkeypatch.setattr(app_module, 'EMAIL_TOTAL_CAP', 5)
+    add_emails(session, 8)
+    pagination = total_of(client, '/api/emails?has_pdf=1&total=1')
+    assert pagination['total'] == 4 and not pagination['total_capped']
+
+    add_emails(session, 12)
+    pagination = total_of(client, '/api/emails?has_pdf=1&total=1')
+    assert pagination['total'] == 5 and pagination['total_capped']
@@ -0,0 +1,41 @@
+import pytest
+from sqlalchemy import text
+
+from encryption import KEY_VARIABLE
+from models.models import MailboxAccount
+
+def add_account(session, password='s3cret'):
+    session.add(MailboxAccount(name='billing', server='imap.example.com', username='billing@example.com',
+                               password=password))
+    session.commit()
+
+def stored_password(session):
+    return session.execute(text("SELECT password FROM mailbox_account")).scalar()
+
+def test_passwords_are_encrypted_at_rest(session):
+    add_account(session)
+    assert 's3cret' not in stored_password(session)
+
+    session.expire_all()
+    assert MailboxAccount.query.one().password == 's3cret'
+
+def test_old_keys_still_decrypt_after_rotation(session, monkeypatch):
+    add_account(session)
+    token = stored_password(session)
+
+    monkeypatch.setenv(KEY_VARIABLE, 'new-mailbox-key,test-mailbox-key')
+    session.expire_all()
+    account = MailboxAccount.query.one()
+    assert account.password == 's3cret'
+
+    session.execute(text("UPDATE mailbox_account SET password = :password"), {'password': 's3cret'})
+    session.expire_all()
+    with pytest.raises(ValueError):
+        MailboxAccount.query.one().password
+    session.rollback()
+
+    monkeypatch.setenv(KEY_VARIABLE, 'new-mailbox-key')
+    session.execute(text("UPDATE mailbox_account SET password = :password"), {'password': token})
+    session.expire_all()
+    with pytest.raises(ValueError):
+        MailboxAccount.query.one().password
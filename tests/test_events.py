@@ -0,0 +1,24 @@
+import app as app_module
+from events import bump_email_version
+
+def test_stream_is_disabled_by_default(client):
+    assert client.get('/api/events').status_code == 404
+    assert b'data-events-stream="off"' in client.get('/').data
+
+def test_stream_can_be_enabled(client, monkeypatch):
+    monkeypatch.setattr(app_module, 'EVENTS_STREAM', True)
+    response = client.get('/api/events', buffered=False)
+    assert response.mimetype == 'text/event-stream'
+    response.close()
+
+def test_version_is_not_modified_until_emails_change(session, client):
+    response = client.get('/api/events/version')
+    etag = response.headers['ETag']
+    version = response.get_json()['version']
+    assert client.get('/api/events/version', headers={'If-None-Match': etag}).status_code == 304
+
+    bump_email_version(session)
+    session.commit()
+    response = client.get('/api/events/version', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.get_json()['version'] != version
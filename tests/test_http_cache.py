@@ -0,0 +1,23 @@
+from datetime import datetime
+
+from werkzeug.http import http_date
+
+from events import bump_email_version
+
+def test_if_modified_since_does_not_hide_changes_in_the_same_second(session, client):
+    response = client.get('/api/stats')
+    assert 'Last-Modified' not in response.headers
+
+    bump_email_version(session)
+    session.commit()
+    # A date at or after the change, as a client that fetched in the same second would send
+    response = client.get('/api/stats', headers={'If-Modified-Since': http_date(datetime.utcnow())})
+    assert response.status_code == 200
+
+def test_if_none_match_still_validates(session, client):
+    etag = client.get('/api/stats').headers['ETag']
+    assert client.get('/api/stats', headers={'If-None-Match': etag}).status_code == 304
+
+    bump_email_version(session)
+    session.commit()
+    assert client.get('/api/stats', headers={'If-None-Match': etag}).status_code == 200
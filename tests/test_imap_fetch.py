@@ -0,0 +1,67 @@
+import pytest
+
+from imap_fetch import find_pdf_parts, format_uid_set, parse_fetch_response
+
+def structure_of(*msg_data):
+    message, = parse_fetch_response(list(msg_data))
+    return message['BODYSTRUCTURE']
+
+NESTED = (
+    b'1 (UID 7 BODYSTRUCTURE ('
+    b'(("TEXT" "PLAIN" ("CHARSET" "utf-8") NIL NIL "7BIT" 10 1 NIL NIL NIL NIL)'
+    b'("TEXT" "HTML" ("CHARSET" "utf-8") NIL NIL "QUOTED-PRINTABLE" 20 1 NIL NIL NIL NIL)'
+    b' "ALTERNATIVE" ("BOUNDARY" "b2") NIL NIL NIL)'
+    b'("APPLICATION" "PDF" ("NAME" "invoice.pdf") NIL NIL "BASE64" 1000 NIL ("ATTACHMENT" ("FILENAME" "invoice.pdf")) NIL NIL)'
+    b'("APPLICATION" "OCTET-STREAM" ("NAME" "scan.PDF") NIL NIL "BASE64" 500 NIL ("ATTACHMENT" ("FILENAME" "scan.PDF")) NIL NIL)'
+    b'("IMAGE" "PNG" NIL NIL NIL "BASE64" 300 NIL ("INLINE" NIL) NIL NIL)'
+    b' "MIXED" ("BOUNDARY" "b1") NIL NIL NIL))'
+)
+
+def test_nested_multipart_with_extension_data():
+    assert find_pdf_parts(structure_of(NESTED)) == [('2', 'invoice.pdf', 'base64'), ('3', 'scan.PDF', 'base64')]
+
+def test_pdf_in_a_text_part_position_is_not_confused_by_the_line_count():
+    # The HTML part carries a disposition at the text-specific position
+    structure = structure_of(
+        b'1 (UID 8 BODYSTRUCTURE (("TEXT" "PLAIN" NIL NIL NIL "7BIT" 10 1 NIL NIL NIL NIL)'
+        b'("TEXT" "PLAIN" ("NAME" "notes.txt") NIL NIL "7BIT" 10 1 NIL ("ATTACHMENT" NIL) NIL NIL) "MIXED"))'
+    )
+    assert find_pdf_parts(structure) == []
+
+def test_forwarded_message_parts_are_numbered_inside_it():
+    structure = structure_of(
+        b'1 (UID 9 BODYSTRUCTURE (("TEXT" "PLAIN" NIL NIL NIL "7BIT" 5 1)'
+        b'("MESSAGE" "RFC822" NIL NIL NIL "7BIT" 900'
+        b' ("Mon, 1 Jan 2024 10:00:00 +0100" "Fw" NIL NIL NIL NIL NIL NIL NIL "<a@b>")'
+        b' (("TEXT" "PLAIN" NIL NIL NIL "7BIT" 5 1)'
+        b'("APPLICATION" "PDF" ("NAME" "fw.pdf") NIL NIL "BASE64" 100 NIL ("ATTACHMENT" NIL)) "MIXED")'
+        b' 20 NIL ("ATTACHMENT" NIL) NIL NIL) "MIXED"))'
+    )
+    assert find_pdf_parts(structure) == [('2.2', 'fw.pdf', 'base64')]
+
+def test_single_part_pdf_with_encoded_filename():
+    structure = structure_of(
+        b'1 (UID 10 BODYSTRUCTURE ("APPLICATION" "PDF" NIL NIL NIL "BASE64" 100 NIL'
+        b' ("ATTACHMENT" ("FILENAME*" "utf-8\'\'sz%C3%A1mla.pdf")) NIL NIL))'
+    )
+    assert find_pdf_parts(structure) == [('1', 'számla.pdf', 'base64')]
+
+def test_literal_filenames():
+    structure = structure_of(
+        (b'1 (UID 11 BODYSTRUCTURE ("APPLICATION" "PDF" ("NAME" {9}', b'a "b".pdf'),
+        b') NIL NIL "BASE64" 10 NIL ("ATTACHMENT" NIL) NIL NIL))'
+    )
+    assert find_pdf_parts(structure) == [('1', 'a "b".pdf', 'base64')]
+
+def test_parts_without_disposition_are_skipped():
+    structure = structure_of(b'1 (UID 12 BODYSTRUCTURE ("APPLICATION" "PDF" ("NAME" "x.pdf") NIL NIL "BASE64" 10))')
+    assert find_pdf_parts(structure) == []
+
+def test_invalid_structures_raise():
+    with pytest.raises(ValueError):
+        find_pdf_parts([])
+    with pytest.raises(ValueError):
+        find_pdf_parts(None)
+
+def test_format_uid_set():
+    assert format_uid_set([9, 1, 2, 3, 7, 10, 3]) == '1:3,7,9:10'
@@ -0,0 +1,101 @@
+import socket
+import threading
+import time
+
+import pytest
+
+from email_utils import EmailMonitor, _SocketReader
+
+class FakeIMAP:
+    """Client side of a socket pair, speaking through _SocketReader like the real sessions"""
+    capabilities = ('IMAP4REV1', 'IDLE')
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.file = _SocketReader(sock)
+        self.selected = []
+        self.logged_out = False
+
+    def _new_tag(self):
+        return b'A1'
+
+    def send(self, data):
+        self.sock.sendall(data)
+
+    def readline(self):
+        return self.file.readline(10001)
+
+    def select(self, mailbox):
+        self.selected.append(mailbox)
+        return 'OK', [b'1']
+
+    def logout(self):
+        self.logged_out = True
+
+@pytest.fixture
+def server():
+    client, server = socket.socketpair()
+    client.settimeout(5)
+    yield client, server
+    client.close()
+    server.close()
+
+def monitor_for(client):
+    monitor = EmailMonitor('user', 'secret', 'imap.example.com')
+    connections = []
+
+    def connect():
+        connections.append(FakeIMAP(client))
+        return connections[-1]
+
+    monitor._connect = connect
+    return monitor, connections
+
+def respond_to_done(server):
+    def run():
+        received = b''
+        while b'DONE' not in received:
+            received += server.recv(100)
+        server.sendall(b'A1 OK IDLE terminated\r\n')
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+def test_reader_lines_and_literals(server):
+    client, peer = server
+    reader = _SocketReader(client)
+    peer.sendall(b'* 1 FETCH (BODY[] {5}\r\nhello)\r\nA1 OK\r\n')
+    assert reader.readline() == b'* 1 FETCH (BODY[] {5}\r\n'
+    assert reader.read(5) == b'hello'
+    assert reader.readline() == b')\r\n'
+    assert reader.buffered()
+    assert reader.readline(2) == b'A1'
+    assert reader.readline() == b' OK\r\n'
+    assert not reader.buffered()
+
+def test_exists_read_together_with_another_line_ends_idle(server):
+    client, peer = server
+    monitor, connections = monitor_for(client)
+    # The continuation and both untagged lines arrive in one read
+    peer.sendall(b'+ idling\r\n* 3 EXPUNGE\r\n* 5 EXISTS\r\n')
+    done = respond_to_done(peer)
+
+    started = time.monotonic()
+    assert monitor.idle('INBOX', timeout=10) is True
+    assert time.monotonic() - started < 2
+    done.join()
+    assert connections[0].selected == ['INBOX']
+
+def test_idle_uses_one_session_outside_the_pool(server):
+    client, peer = server
+    monitor, connections = monitor_for(client)
+    for _ in range(2):
+        peer.sendall(b'+ idling\r\n')
+        done = respond_to_done(peer)
+        assert monitor.idle('INBOX', timeout=0.2) is False
+        done.join()
+    assert len(connections) == 1
+    assert monitor.pool_stats()['misses'] == 0
+
+    monitor.close()
+    assert connections[0].logged_out
@@ -0,0 +1,36 @@
+from email_utils import IMAPConnectionPool
+from ingest import record_pool_stats
+
+class Monitor:
+    """Just the pool of an EmailMonitor"""
+
+    def __init__(self):
+        self.pool = IMAPConnectionPool(lambda: None)
+
+    def unreported_pool_stats(self):
+        return self.pool.unreported_stats()
+
+def test_pool_counters_are_reported_once():
+    pool = IMAPConnectionPool(lambda: None)
+    pool._count('hits')
+    pool._count('misses')
+    assert pool.unreported_stats() == {'hits': 1, 'misses': 1, 'reconnects': 0, 'evictions': 0}
+
+    pool._count('hits')
+    assert pool.unreported_stats()['hits'] == 1
+    assert pool.stats()['hits'] == 2
+
+def test_recorded_pool_counters_show_in_stats(session, client):
+    etag = client.get('/api/stats').headers['ETag']
+    first, second = Monitor(), Monitor()
+    first.pool._count('hits')
+    first.pool._count('hits')
+    second.pool._count('evictions')
+
+    record_pool_stats(session, first)
+    record_pool_stats(session, second)
+    record_pool_stats(session, first)
+
+    response = client.get('/api/stats', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.get_json()['imap_pool'] == {'hits': 2, 'misses': 0, 'reconnects': 0, 'evictions': 1}
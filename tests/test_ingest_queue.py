@@ -0,0 +1,135 @@
+import os
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import Session
+
+import ingest_queue
+from models.models import IngestDeadLetter, IngestJob, MailboxSyncState, db
+
+MAILBOX = 'billing/INBOX'
+
+def queue_uids(session, uids, uidvalidity=1):
+    """Queue UIDs the way a sync does, recording ``uidvalidity`` as current"""
+    state = session.query(MailboxSyncState).filter_by(mailbox=MAILBOX).first()
+    if state is None:
+        state = MailboxSyncState(mailbox=MAILBOX, last_uid=0)
+        session.add(state)
+    state.uidvalidity = uidvalidity
+    ingest_queue.enqueue(session, MAILBOX, uidvalidity, uids)
+    session.commit()
+
+def test_enqueue_skips_queued_uids(session):
+    queue_uids(session, [1, 2])
+    queue_uids(session, [2, 3])
+    assert sorted(uid for (uid,) in session.query(IngestJob.uid)) == [1, 2, 3]
+
+def test_claims_do_not_overlap(session):
+    queue_uids(session, range(1, 6))
+    first = [job.uid for job in ingest_queue.claim(session, MAILBOX, 1, 'worker-a', limit=3)]
+    second = [job.uid for job in ingest_queue.claim(session, MAILBOX, 1, 'worker-b', limit=3)]
+    assert first == [1, 2, 3]
+    assert second == [4, 5]
+    assert ingest_queue.claim(session, MAILBOX, 1, 'worker-c') == []
+
+def test_guarded_update_skips_jobs_claimed_meanwhile(app, session):
+    """A worker claiming between another's candidate read and its update wins those jobs"""
+    queue_uids(session, [1, 2])
+    raced = []
+    started = []
+
+    def claim_first(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith('UPDATE ingest_job') and not started:
+            started.append(True)
+            with Session(db.engine) as other:
+                raced.extend(job.uid for job in ingest_queue.claim(other, MAILBOX, 1, 'worker-a', limit=1))
+
+    event.listen(db.engine, 'before_cursor_execute', claim_first)
+    try:
+        claimed = [job.uid for job in ingest_queue.claim(session, MAILBOX, 1, 'worker-b')]
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', claim_first)
+    assert raced == [1]
+    assert claimed == [2]
+
+def test_expired_claims_are_claimed_again(session):
+    queue_uids(session, [1])
+    assert ingest_queue.claim(session, MAILBOX, 1, 'worker-a', timeout=-1)
+    assert [job.locked_by for job in ingest_queue.claim(session, MAILBOX, 1, 'worker-b')] == ['worker-b']
+
+def test_failures_back_off_then_dead_letter(session):
+    queue_uids(session, [7])
+    for attempt in range(1, ingest_queue.MAX_ATTEMPTS):
+        job, = ingest_queue.claim(session, MAILBOX, 1, 'worker-a')
+        assert ingest_queue.fail(session, job, 'broken')
+        session.commit()
+        assert job.state == ingest_queue.PENDING and job.attempts == attempt
+        assert job.next_attempt_at > datetime.utcnow()
+        # Not due until the backoff has passed
+        assert ingest_queue.claim(session, MAILBOX, 1, 'worker-a') == []
+        job.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+        session.commit()
+
+    job, = ingest_queue.claim(session, MAILBOX, 1, 'worker-a')
+    assert not ingest_queue.fail(session, job, 'still broken')
+    session.commit()
+    assert session.query(IngestJob).count() == 0
+    letter = session.query(IngestDeadLetter).one()
+    assert (letter.uid, letter.attempts, letter.last_error) == (7, ingest_queue.MAX_ATTEMPTS, 'still broken')
+
+    assert ingest_queue.requeue_dead_letters(session) == 1
+    session.commit()
+    assert session.query(IngestDeadLetter).count() == 0
+    job, = ingest_queue.claim(session, MAILBOX, 1, 'worker-a')
+    assert (job.uid, job.attempts) == (7, 0)
+
+def test_release_does_not_count_an_attempt(session):
+    queue_uids(session, [1])
+    jobs = ingest_queue.claim(session, MAILBOX, 1, 'worker-a')
+    ingest_queue.release(session, jobs, 'server unreachable')
+    session.commit()
+    assert jobs[0].attempts == 0 and jobs[0].state == ingest_queue.PENDING
+    assert ingest_queue.due_mailboxes(session, [MAILBOX]) == set()
+    assert 0 < ingest_queue.seconds_until_due(session, MAILBOX, 600) < 600
+
+def test_jobs_of_an_earlier_uidvalidity_are_never_due(session):
+    queue_uids(session, [1], uidvalidity=1)
+    assert ingest_queue.due_mailboxes(session, [MAILBOX]) == {MAILBOX}
+    assert ingest_queue.seconds_until_due(session, MAILBOX, 60) == 0
+
+    # A new UIDVALIDITY recorded without the old job being discarded yet
+    session.query(MailboxSyncState).filter_by(mailbox=MAILBOX).update({MailboxSyncState.uidvalidity: 2})
+    session.commit()
+    assert ingest_queue.due_mailboxes(session, [MAILBOX]) == set()
+    assert ingest_queue.seconds_until_due(session, MAILBOX, 60) == 60
+
+def test_requeue_discards_dead_letters_of_an_earlier_uidvalidity(session):
+    queue_uids(session, [], uidvalidity=2)
+    session.add_all([
+        IngestDeadLetter(mailbox=MAILBOX, uidvalidity=1, uid=5, attempts=5, last_error='broken'),
+        IngestDeadLetter(mailbox=MAILBOX, uidvalidity=2, uid=6, attempts=5, last_error='broken'),
+    ])
+    session.commit()
+
+    assert ingest_queue.requeue_dead_letters(session) == 1
+    session.commit()
+    assert session.query(IngestDeadLetter).count() == 0
+    assert [(job.uidvalidity, job.uid) for job in session.query(IngestJob)] == [(2, 6)]
+
+@pytest.mark.skipif(not os.environ.get('TEST_POSTGRES_URL'), reason="TEST_POSTGRES_URL is not set")
+def test_skip_locked_claims_do_not_wait():
+    engine = create_engine(os.environ['TEST_POSTGRES_URL'])
+    tables = [IngestJob.__table__, MailboxSyncState.__table__]
+    db.metadata.create_all(engine, tables=tables)
+    try:
+        with Session(engine) as holder, Session(engine) as worker:
+            queue_uids(worker, [1, 2])
+            # Another worker's claim transaction still holds the row lock of UID 1
+            holder.query(IngestJob).filter_by(uid=1).with_for_update().one()
+            worker.execute(text("SET LOCAL lock_timeout = '1s'"))
+            assert [job.uid for job in ingest_queue.claim(worker, MAILBOX, 1, 'worker-b')] == [2]
+            holder.rollback()
+    finally:
+        db.metadata.drop_all(engine, tables=tables)
+        engine.dispose()
@@ -0,0 +1,20 @@
+from leases import acquire_lease, release_lease
+
+def test_only_one_owner_holds_a_lease(session):
+    assert acquire_lease(session, 'billing/INBOX', 'hub-a', ttl=30)
+    assert not acquire_lease(session, 'billing/INBOX', 'hub-b', ttl=30)
+    # Renewals by the holder succeed
+    assert acquire_lease(session, 'billing/INBOX', 'hub-a', ttl=30)
+
+def test_expired_leases_are_taken_over(session):
+    assert acquire_lease(session, 'billing/INBOX', 'hub-a', ttl=-1)
+    assert acquire_lease(session, 'billing/INBOX', 'hub-b', ttl=30)
+    assert not acquire_lease(session, 'billing/INBOX', 'hub-a', ttl=30)
+
+def test_released_leases_are_free(session):
+    assert acquire_lease(session, 'billing/INBOX', 'hub-a', ttl=30)
+    release_lease(session, 'billing/INBOX', 'hub-b')
+    assert not acquire_lease(session, 'billing/INBOX', 'hub-b', ttl=30)
+
+    release_lease(session, 'billing/INBOX', 'hub-a')
+    assert acquire_lease(session, 'billing/INBOX', 'hub-b', ttl=30)
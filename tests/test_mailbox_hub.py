@@ -0,0 +1,55 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from mailbox_hub import MailboxHub
+
+def account(account_id):
+    return {'id': account_id, 'name': f'mailbox{account_id}'}
+
+def test_enqueue_never_waits_for_a_full_queue():
+    async def scenario():
+        hub = MailboxHub(concurrency=1, queue_size=1)
+        hub.queue = asyncio.Queue(maxsize=hub.queue_size)
+
+        hub._enqueue(account(1))
+        hub._enqueue(account(2))
+        hub._enqueue(account(2))
+        assert hub.queue.qsize() == 1
+        assert list(hub._overflow) == [2]
+
+        assert (await hub.queue.get())['id'] == 1
+        hub._queued.discard(1)
+        hub._enqueue_overflow()
+        assert hub._overflow == {}
+        assert (await hub.queue.get())['id'] == 2
+
+    asyncio.run(scenario())
+
+def test_keepalive_never_delays_lease_renewal():
+    class SlowMonitor:
+        calls = 0
+
+        def keepalive(self):
+            SlowMonitor.calls += 1
+            release.wait(5)
+
+    release = threading.Event()
+
+    async def scenario():
+        hub = MailboxHub(concurrency=1)
+        hub.queue = asyncio.Queue()
+        renewals = []
+        hub._load_registry = lambda: renewals.append(1) or ([], set(), set())
+        hub._monitors[1] = (object(), SlowMonitor())
+
+        with ThreadPoolExecutor(max_workers=1) as executor, ThreadPoolExecutor(max_workers=1) as keepalive_executor:
+            await asyncio.wait_for(hub._refresh(executor, keepalive_executor), 1)
+            # The first pass is still blocked, so the next refresh renews without starting another
+            await asyncio.wait_for(hub._refresh(executor, keepalive_executor), 1)
+            assert len(renewals) == 2
+            assert SlowMonitor.calls == 1
+            release.set()
+            await hub._keepalive
+
+    asyncio.run(scenario())
@@ -0,0 +1,36 @@
+from models.models import PdfExtractionCache
+from pdf_cache import PdfCache, pdf_cache_stats
+
+RESULT = {'emails': ['billing@acme.hu'], 'pages': 1, 'size': 100, 'truncated': False}
+
+def test_lookups_write_nothing_until_flushed(session, count_queries):
+    cache = PdfCache(session)
+    cache.put('a' * 64, RESULT)
+    session.commit()
+
+    count_queries.reset()
+    assert cache.get('a' * 64)['emails'] == ['billing@acme.hu']
+    assert cache.get('a' * 64)['cached']
+    assert cache.get('b' * 64) is None
+    assert all(statement.lstrip().upper().startswith('SELECT') for statement in count_queries.statements)
+    assert pdf_cache_stats(session) == {'hits': 0, 'misses': 0}
+
+    cache.flush()
+    assert pdf_cache_stats(session) == {'hits': 2, 'misses': 1}
+    assert session.query(PdfExtractionCache.hits).scalar() == 2
+
+    # Counted once only
+    cache.flush()
+    assert pdf_cache_stats(session) == {'hits': 2, 'misses': 1}
+
+def test_flush_changes_the_stats_etag(session, client):
+    etag = client.get('/api/stats').headers['ETag']
+    assert client.get('/api/stats', headers={'If-None-Match': etag}).status_code == 304
+
+    cache = PdfCache(session)
+    cache.get('c' * 64)
+    cache.flush()
+
+    response = client.get('/api/stats', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.get_json()['pdf_cache'] == {'hits': 0, 'misses': 1}
@@ -0,0 +1,61 @@
+import ingest_queue
+from ingest import process_jobs
+from models.models import Email, IngestDeadLetter, IngestJob, MailboxSyncState
+
+MAILBOX = 'billing/INBOX'
+
+class FakeMonitor:
+    """Fails every fetch that includes a poison UID, or every fetch while the server is down"""
+
+    def __init__(self, poison=(), down=False):
+        self.poison = set(poison)
+        self.down = down
+        self.fetches = []
+
+    def mailbox_status(self, mailbox):
+        if self.down:
+            raise OSError("Connection refused")
+        return 1, 100
+
+    def fetch_uids(self, mailbox, uids, uidvalidity=None):
+        self.fetches.append(list(uids))
+        if self.down:
+            return False, {'error': "Connection refused"}
+        if self.poison & set(uids):
+            return False, {'error': "socket error: EOF"}
+        emails = [{'uid': uid, 'message_id': f'<{uid}@example.com>', 'from': f'sender{uid}@example.com'}
+                  for uid in uids]
+        return True, {'uidvalidity': 1, 'emails': emails, 'errors': {}}
+
+def queue_uids(session, uids):
+    session.add(MailboxSyncState(mailbox=MAILBOX, uidvalidity=1, last_uid=max(uids)))
+    ingest_queue.enqueue(session, MAILBOX, 1, uids)
+    session.commit()
+
+def test_only_the_message_breaking_the_fetch_counts_an_attempt(session):
+    queue_uids(session, range(1, 9))
+    new_emails, _ = process_jobs(session, FakeMonitor(poison=[6]), state_key=MAILBOX)
+
+    assert sorted(email['uid'] for email in new_emails) == [1, 2, 3, 4, 5, 7, 8]
+    assert session.query(Email).count() == 7
+    job = session.query(IngestJob).one()
+    assert (job.uid, job.attempts, job.state) == (6, 1, ingest_queue.PENDING)
+
+def test_a_poison_message_is_dead_lettered(session, monkeypatch):
+    monkeypatch.setattr(ingest_queue, 'backoff', lambda attempts: -1)
+    queue_uids(session, [1, 2])
+    monitor = FakeMonitor(poison=[2])
+    for _ in range(ingest_queue.MAX_ATTEMPTS):
+        process_jobs(session, monitor, state_key=MAILBOX)
+
+    assert session.query(IngestJob).count() == 0
+    assert [letter.uid for letter in session.query(IngestDeadLetter)] == [2]
+
+def test_batches_are_released_while_the_server_is_down(session):
+    queue_uids(session, range(1, 9))
+    monitor = FakeMonitor(down=True)
+    assert process_jobs(session, monitor, state_key=MAILBOX) == ([], False)
+
+    # Not bisected, and no attempt counted
+    assert monitor.fetches == [list(range(1, 9))]
+    assert {job.attempts for job in session.query(IngestJob)} == {0}
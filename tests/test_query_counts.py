@@ -0,0 +1,66 @@
+"""The list endpoints must issue the same number of queries however many rows they return."""
+from datetime import datetime, timedelta
+
+from company_resolver import bump_company_version
+from events import bump_email_version
+from models.models import Company, CompanyEmail, Email, EmailPdfAddress
+
+def add_companies(session, count, addresses=3, emails=2):
+    """Add companies with addresses, each with emails that have PDF addresses"""
+    started = datetime(2024, 1, 1)
+    for number in range(count):
+        company = Company(name=f"Company {number}")
+        company.emails = [CompanyEmail(email=f"user{index}@company{number}.hu") for index in range(addresses)]
+        session.add(company)
+        for index in range(emails):
+            email = Email(
+                sender=f"user0@company{number}.hu",
+                subject=f"Invoice {number}/{index}",
+                date=started + timedelta(minutes=number * emails + index),
+                has_pdf=True,
+                company=company
+            )
+            email.pdf_addresses = [EmailPdfAddress.for_address(f"billing{index}@company{number}.hu")]
+            session.add(email)
+    # New stamps, so the responses are not shared with the previous request's
+    bump_company_version(session)
+    bump_email_version(session)
+    session.commit()
+
+def queries_for(client, count_queries, url):
+    count_queries.reset()
+    response = client.get(url)
+    assert response.status_code == 200
+    return len(count_queries), response.get_json()
+
+def test_companies_query_count_is_constant(session, client, count_queries):
+    add_companies(session, 2)
+    small, data = queries_for(client, count_queries, '/api/companies')
+    assert len(data['data']) == 2
+
+    add_companies(session, 40)
+    large, data = queries_for(client, count_queries, '/api/companies')
+    assert len(data['data']) == 42
+    assert all(company['email_count'] == 3 for company in data['data'])
+    assert large == small
+
+def test_emails_query_count_is_constant(session, client, count_queries):
+    add_companies(session, 1)
+    small, data = queries_for(client, count_queries, '/api/emails?per_page=100')
+    assert len(data['data']) == 2
+
+    add_companies(session, 40)
+    large, data = queries_for(client, count_queries, '/api/emails?per_page=100')
+    assert len(data['data']) == 82
+    assert all(email['company']['emails'] and email['pdf_emails'] for email in data['data'])
+    assert large == small
+
+def test_email_pages_query_count_is_constant(session, client, count_queries):
+    add_companies(session, 30)
+    first, data = queries_for(client, count_queries, '/api/emails?per_page=10')
+    cursor = data['pagination']['next_cursor']
+    assert cursor
+
+    following, data = queries_for(client, count_queries, f'/api/emails?per_page=10&cursor={cursor}')
+    assert len(data['data']) == 10
+    assert following == first
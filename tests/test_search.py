@@ -0,0 +1,72 @@
+from datetime import datetime
+
+import pytest
+
+import search
+from models.models import Email
+from search import create_search_index, drop_search_index, is_search_object, search_filter
+
+EMAILS = [
+    ('billing@acme.hu', 'Invoice 2024/17'),
+    ('office@globex.hu', 'Acme invoice reminder'),
+    ('news@initech.hu', 'Newsletter'),
+]
+
+@pytest.fixture
+def emails(session):
+    for sender, subject in EMAILS:
+        session.add(Email(sender=sender, subject=subject, date=datetime(2024, 1, 1), has_pdf=False))
+    session.commit()
+    search._fts5_available.clear()
+
+@pytest.fixture
+def fts(session, emails):
+    create_search_index(session.connection())
+    session.commit()
+    search._fts5_available.clear()
+    yield
+    drop_search_index(session.connection())
+    session.commit()
+    search._fts5_available.clear()
+
+def senders(session, query, sender_only=False):
+    clause = search_filter(session, query, sender_only=sender_only)
+    return sorted(sender for (sender,) in session.query(Email.sender).filter(clause))
+
+def test_queries_without_words_do_not_filter(session, emails):
+    assert search_filter(session, ' - ') is None
+
+def test_like_fallback(session, emails):
+    assert senders(session, 'acme') == ['billing@acme.hu', 'office@globex.hu']
+    assert senders(session, 'acme', sender_only=True) == ['billing@acme.hu']
+    assert senders(session, 'invoice 2024') == ['billing@acme.hu']
+
+def test_fts5_matches_word_prefixes(session, fts):
+    assert search._has_fts5(session.connection())
+    assert senders(session, 'inv') == ['billing@acme.hu', 'office@globex.hu']
+    # Every word must match, in any order
+    assert senders(session, 'reminder acme') == ['office@globex.hu']
+    # Addresses are split into words
+    assert senders(session, 'billing') == ['billing@acme.hu']
+    assert senders(session, 'acme', sender_only=True) == ['billing@acme.hu']
+    # Only word prefixes, unlike LIKE
+    assert senders(session, 'voice') == []
+
+def test_fts5_follows_changes(session, fts):
+    email = session.query(Email).filter_by(sender='news@initech.hu').one()
+    email.subject = 'Invoice 99'
+    session.commit()
+    assert senders(session, 'newsletter') == []
+    assert 'news@initech.hu' in senders(session, 'invoice')
+
+    session.delete(email)
+    session.commit()
+    assert senders(session, 'invoice') == ['billing@acme.hu', 'office@globex.hu']
+
+def test_search_objects_are_recognised_for_autogenerate():
+    for table in ('email_fts', 'email_fts_data', 'email_fts_idx', 'email_fts_docsize', 'email_fts_config'):
+        assert is_search_object(table, 'table')
+    assert is_search_object('ix_email_fts_sender', 'index')
+    assert not is_search_object('email', 'table')
+    assert not is_search_object('ix_email_date_id', 'index')
+    assert not is_search_object('email_fts', 'column')
@@ -0,0 +1,92 @@
+import threading
+import time
+
+import pytest
+from flask import Flask, jsonify
+
+from single_flight import SingleFlight, coalesced, single_flight
+
+def run_concurrently(count, fn):
+    results = [None] * count
+    errors = [None] * count
+
+    def call(index):
+        try:
+            results[index] = fn()
+        except Exception as e:
+            errors[index] = e
+
+    threads = [threading.Thread(target=call, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    return results, errors
+
+def slow(calls, result=None, error=None):
+    def fn():
+        calls.append(1)
+        time.sleep(0.2)
+        if error is not None:
+            raise error
+        return result
+    return fn
+
+def test_concurrent_callers_share_one_call():
+    flight, calls = SingleFlight(), []
+    results, errors = run_concurrently(8, lambda: flight.do('key', slow(calls, result='page')))
+    assert calls == [1]
+    assert results == ['page'] * 8 and errors == [None] * 8
+    # Nothing is kept without a window
+    assert flight.do('key', slow(calls, result='again')) == 'again'
+
+def test_results_are_reused_within_the_window():
+    flight, calls = SingleFlight(), []
+    assert flight.do('key', slow(calls, result=1), window=0.3) == 1
+    assert flight.do('key', slow(calls, result=2), window=0.3) == 1
+    assert flight.do('other', slow(calls, result=3), window=0.3) == 3
+    time.sleep(0.35)
+    assert flight.do('key', slow(calls, result=4), window=0.3) == 4
+    assert len(calls) == 3
+
+def test_errors_reach_every_waiter_but_are_not_reused():
+    flight, calls = SingleFlight(), []
+    results, errors = run_concurrently(4, lambda: flight.do('key', slow(calls, error=RuntimeError('down')), window=10))
+    assert calls == [1]
+    assert all(isinstance(error, RuntimeError) for error in errors)
+    assert flight.do('key', slow(calls, result='up'), window=10) == 'up'
+
+@pytest.fixture
+def view_app():
+    app = Flask(__name__)
+    calls = []
+
+    @app.route('/latest')
+    @coalesced(window=5)
+    def latest():
+        calls.append(1)
+        response = jsonify({'calls': len(calls)})
+        response.headers['X-View'] = 'latest'
+        return response
+
+    yield app, calls
+    single_flight._calls.clear()
+
+def test_coalesced_views_share_responses_per_query_string(view_app):
+    app, calls = view_app
+    client = app.test_client()
+    first = client.get('/latest?mailbox=INBOX')
+    second = client.get('/latest?mailbox=INBOX')
+    assert first.get_json() == second.get_json() == {'calls': 1}
+    assert second.headers['X-View'] == 'latest'
+
+    assert client.get('/latest?mailbox=Archive').get_json() == {'calls': 2}
+
+def test_coalesced_responses_are_separate_objects(view_app):
+    app, _ = view_app
+    with app.test_request_context('/latest'):
+        first = app.view_functions['latest']()
+        first.headers['X-Changed'] = '1'
+        second = app.view_functions['latest']()
+    assert first is not second
+    assert 'X-Changed' not in second.headers
@@ -4,8 +4,6 @@ import logging
 from logging.handlers import RotatingFileHandler
 import pymysql
 from datetime import datetime
-import time
-from sqlalchemy import text
 
 # Configure logging
 handler = RotatingFileHandler('/home/Brandocs/brandocs_pythonanywhere_com.log', maxBytes=10000000, backupCount=5)
@@ -38,28 +36,9 @@ try:
     from app import app as application
     logger.info("Successfully imported Flask application")
 
-    # Initialize database with improved retry mechanism
-    max_retries = 3
-    retry_delay = 1
-
-    for attempt in range(max_retries):
-        try:
-            with application.app_context():
-                from models.models import db
-                db.create_all()
-                
-                # Test database connection
-                engine = db.get_engine()
-                with engine.connect() as conn:
-                    conn.execute(text('SELECT 1'))
-                
-                logger.info("Database initialized successfully")
-                break
-        except Exception as e:
-            logger.error(f"Database initialization attempt {attempt + 1} failed: {str(e)}")
-            if attempt == max_retries - 1:
-                raise
-            time.sleep(retry_delay * (attempt + 1))
+    # The database connection is opened on the first request; create the
+    # schema with `flask db upgrade` (or `flask init-db`) from a console
+    # instead of on every reload.
 
 except Exception as e:
     logger.error(f"Failed to initialize application: {str(e)}")